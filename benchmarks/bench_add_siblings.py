@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tracks how long it takes a processor to add many siblings ahead of itself
+with `CWTree.add_siblings_ahead()`, like `<autodoc-python
+include-children=true />` does for a big module, and how long it takes to
+insert many children with `CWTree.insert_subtrees()`. The order index is
+kept up to date, like it is when heading aliases or the table of contents
+are used.
+
+Usage: python3 benchmarks/bench_add_siblings.py [--siblings N]
+    [--existing N] [--runs N]
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.library import Library
+
+
+def make_symbol_nodes(num_siblings):
+    return [
+        CWTagNode('h3', {}, [CWTextNode('symbol_{}'.format(i))])
+        for i in range(num_siblings)]
+
+
+def make_library(num_siblings):
+    library = Library()
+    for name in ('Root', 'Document', 'Text', 'h3', 'p'):
+        library.processor(name, lambda tree, node: None)
+
+    @library.processor('add-siblings')
+    def add_siblings(tree, node):
+        tree.add_siblings_ahead(make_symbol_nodes(num_siblings))
+
+    @library.processor('add-children')
+    def add_children(tree, node):
+        tree.insert_subtrees(node, 0, make_symbol_nodes(num_siblings))
+
+    return library
+
+
+def make_tree(tag_name, num_existing):
+    children = [CWTagNode(tag_name, {})]
+    children.extend(
+        CWTagNode('p', {}, [CWTextNode('paragraph {}'.format(i))])
+        for i in range(num_existing))
+    tree = CWTree(CWRootNode([CWDocumentNode('doc', children)]))
+    tree.get_order_index()
+    return tree
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--siblings', default=5000, type=int)
+    p.add_argument('--existing', default=5000, type=int)
+    p.add_argument('--runs', default=3, type=int)
+    args = p.parse_args()
+
+    library = make_library(args.siblings)
+    for tag_name in ('add-siblings', 'add-children'):
+        timings = []
+        for _ in range(args.runs):
+            tree = make_tree(tag_name, args.existing)
+            start = time.perf_counter()
+            tree.apply_library(library)
+            timings.append(time.perf_counter() - start)
+        print("{:14} {:8.1f} ms".format(tag_name, min(timings) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compares parsing a big document from scratch with parsing it again after one
+paragraph changed, using a `BlockCache` so that only the changed section is
+parsed again.
+
+Usage: python3 benchmarks/bench_block_cache.py [--sections N] [--runs N]
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser.block_cache import BlockCache
+from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+
+
+def make_document(num_sections, edited_section=None):
+    parts = ['# Document\n']
+    for i in range(num_sections):
+        parts.append('# Section {}\n'.format(i))
+        parts.append(
+            'Some *text* with <link-to name="s{}">a link</link-to> and'
+            ' `code`.\n'.format(i))
+        if i == edited_section:
+            parts.append('An edited paragraph.\n')
+        parts.append(
+            '<callout kind=info>\nA callout with <link-to name=x /> in it\n'
+            '</callout>\n')
+        parts.append('* one\n* two\n')
+    return '\n'.join(parts)
+
+
+def time_fn(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--sections', default=1000, type=int)
+    p.add_argument('--runs', default=5, type=int)
+    args = p.parse_args()
+
+    config = CFMParserConfig(
+        allowed_tags={'callout', 'link-to'}, document_id=('doc.md',),
+        document_path='doc.md')
+    document = make_document(args.sections)
+    edited_documents = [
+        make_document(args.sections, edited_section=i % args.sections)
+        for i in range(args.runs)]
+
+    def reparse_edited():
+        block_cache = BlockCache()
+        cfm_to_cwdom(document, config, block_cache=block_cache)
+        block_cache.save()
+        start = time.perf_counter()
+        for edited_document in edited_documents:
+            cfm_to_cwdom(edited_document, config, block_cache=block_cache)
+            block_cache.save()
+        return (time.perf_counter() - start) / len(edited_documents)
+
+    block_cache = BlockCache()
+    cold = time_fn(
+        lambda: cfm_to_cwdom(document, config, block_cache=BlockCache()),
+        args.runs)
+    cfm_to_cwdom(document, config, block_cache=block_cache)
+    unchanged = time_fn(
+        lambda: cfm_to_cwdom(document, config, block_cache=block_cache),
+        args.runs)
+
+    print("{} sections, {:.1f} KB".format(args.sections, len(document) / 1e3))
+    print("no cache            {:8.1f} ms".format(
+        time_fn(lambda: cfm_to_cwdom(document, config), args.runs) * 1000))
+    print("empty cache         {:8.1f} ms".format(cold * 1000))
+    print("one section edited  {:8.1f} ms".format(reparse_edited() * 1000))
+    print("nothing edited      {:8.1f} ms".format(unchanged * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tracks how long it takes to resolve heading aliases and links in a big site,
+built directly as a CWDOM tree so that parsing isn't included.
+
+Each document has a few headings with aliases, an alias that never resolves,
+links to aliases in other documents, a link to an alias that doesn't exist,
+and a heading generated by a processor that runs after aliases are resolved,
+like a plugin that adds headings late would. `--paragraphs` adds text
+after each heading, to see how long documents affect the time.
+
+Usage: python3 benchmarks/bench_heading_aliases.py [--documents N]
+    [--headings N] [--paragraphs N] [--runs N]
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.library import Library
+from computerwords.plugins.heading_aliases import HeadingAliasesPlugin
+from computerwords.stdlib.basics import add_basics
+from computerwords.stdlib.html import add_html
+from computerwords.stdlib.links import add_links
+from computerwords.stdlib.table_of_contents import add_table_of_contents
+
+
+def make_library():
+    library = Library()
+    add_basics(library)
+    add_html(library)
+    add_links(library)
+    add_table_of_contents(library)
+    HeadingAliasesPlugin().add_processors(library)
+
+    @library.processor('generated-heading', consumes=['heading_alias'])
+    def process_generated_heading(tree, node):
+        tree.replace_subtree(node, CWTagNode('h2', {}, [
+            CWTextNode(node.kwargs['title'])]))
+
+    return library
+
+
+def make_document(i, num_documents, num_headings, num_paragraphs):
+    children = []
+    for j in range(num_headings):
+        children.append(CWTagNode(
+            'heading-alias', {'name': 'doc{}-{}'.format(i, j)}))
+        children.append(CWTagNode('h2', {}, [
+            CWTextNode('Document {} heading {}'.format(i, j))]))
+        target = (i * 7 + j) % num_documents
+        children.append(CWTagNode('p', {}, [
+            CWTextNode('See '),
+            CWTagNode('heading-link', {'name': 'doc{}-{}'.format(target, j)}),
+        ]))
+        for _ in range(num_paragraphs):
+            children.append(CWTagNode('p', {}, [CWTextNode('Lorem ipsum')]))
+    children.append(CWTagNode('p', {}, [
+        CWTagNode('heading-link', {'name': 'missing{}'.format(i)})]))
+    children.append(CWTagNode('heading-alias', {'name': 'dangling{}'.format(i)}))
+    children.append(CWTagNode(
+        'generated-heading', {'title': 'Document {} appendix'.format(i)}))
+    return CWDocumentNode(('doc{}.md'.format(i),), children)
+
+
+def time_site(num_documents, num_headings, num_paragraphs, runs):
+    timings = []
+    for _ in range(runs):
+        library = make_library()
+        tree = CWTree(CWRootNode([
+            make_document(i, num_documents, num_headings, num_paragraphs)
+            for i in range(num_documents)]))
+        start = time.perf_counter()
+        tree.apply_library(library, {'config': {}})
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--documents', default=[250, 1000, 2000], type=int,
+                   nargs='+')
+    p.add_argument('--headings', default=3, type=int)
+    p.add_argument('--paragraphs', default=0, type=int)
+    p.add_argument('--runs', default=3, type=int)
+    args = p.parse_args()
+
+    for num_documents in args.documents:
+        timings = time_site(
+            num_documents, args.headings, args.paragraphs, args.runs)
+        print("{:>5} documents, {:>5} aliases   min {:7.1f} ms".format(
+            num_documents, num_documents * (args.headings + 1),
+            min(timings) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tracks how fast a big HTML block full of custom tags is parsed into CWDOM
+nodes, using `parse_html_to_cwdom()` and, for comparison, the recursive
+grammar in `html_parser` followed by `parse_tree_to_cwdom()`. Lexing is
+timed separately. Text is turned into plain text nodes, not Markdown, so
+that CommonMark isn't included.
+
+The grammar recurses once per statement, so it fails with `RecursionError`
+on big blocks unless the recursion limit is raised.
+
+Usage: python3 benchmarks/bench_html_parser.py [--tags N ...] [--runs N]
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser.html_lexer import lex_html
+from computerwords.markdown_parser.html_parser import parse_html
+from computerwords.markdown_parser.html_to_cwdom import parse_html_to_cwdom
+from computerwords.markdown_parser.parse_tree_to_cwdom import (
+    parse_tree_to_cwdom,
+)
+
+
+def make_block(num_tags):
+    # about half of the tags are nested inside another one
+    parts = []
+    for i in range(num_tags // 2):
+        parts.append(
+            '<callout kind=info id="c{}">Text {} <link name=x{} /> more'
+            ' text</callout>\n'.format(i, i, i))
+    return ''.join(parts)
+
+
+def time_fn(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            fn()
+        except RecursionError:
+            return None
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--tags', default=[100, 1000, 10000], type=int,
+                   nargs='+')
+    p.add_argument('--runs', default=5, type=int)
+    args = p.parse_args()
+
+    config = CFMParserConfig(
+        allowed_tags={'callout', 'link'}, document_id=('doc',),
+        document_path='doc.md')
+    for num_tags in args.tags:
+        block = make_block(num_tags)
+        tokens = list(lex_html(config, block))
+        results = [
+            ('lex', time_fn(lambda: list(lex_html(config, block)), args.runs)),
+            ('flat', time_fn(
+                lambda: parse_html_to_cwdom(tokens, config), args.runs)),
+            ('grammar', time_fn(
+                lambda: parse_tree_to_cwdom(parse_html(tokens, config)),
+                args.runs)),
+        ]
+        print("{:6} tags  ".format(num_tags) + "  ".join(
+            "{} {}".format(
+                name,
+                'RecursionError' if best is None
+                else '{:8.1f} ms'.format(best * 1000))
+            for name, best in results))
+
+
+if __name__ == '__main__':
+    main()
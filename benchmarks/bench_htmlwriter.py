@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tracks how fast the HTML writer serializes an already-processed tree of
+about a million nodes: lists, paragraphs with attributes, and text that
+needs escaping.
+
+Usage: python3 benchmarks/bench_htmlwriter.py [--nodes N] [--runs N]
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.htmlwriter import _get_subtree_html
+from computerwords.htmlwriter.util import HTMLWriterOptions
+from computerwords.stdlib import stdlib
+
+
+NODES_PER_SECTION = 10
+
+
+def make_section(i):
+    return CWTagNode('section', {'class': 'section', 'id': 's{}'.format(i)}, [
+        CWTagNode('p', {'class': 'para'}, [
+            CWTextNode('Paragraph {} with <markup> & "quotes"'.format(i)),
+            CWTagNode('code', {}, [CWTextNode('x < y')]),
+        ]),
+        CWTagNode('ul', {'class': 'items'}, [
+            CWTagNode('li', {}, [CWTextNode('one')]),
+            CWTagNode('li', {}, [CWTextNode('two')]),
+            CWTagNode('li', {'data-n': str(i % 7)}, [CWTextNode('three')]),
+        ]),
+    ])
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--nodes', default=1000000, type=int)
+    p.add_argument('--runs', default=5, type=int)
+    args = p.parse_args()
+
+    document = CWDocumentNode('doc', [
+        make_section(i) for i in range(args.nodes // NODES_PER_SECTION)])
+    document.deep_set_document_id(('doc',))
+    tree = CWTree(CWRootNode([document]))
+    tree.processor_data = {}
+    options = HTMLWriterOptions(
+        single_page=False, static_dir=None, files_to_copy=[],
+        stylesheet_tag_strings=[], site_url='/', meta_description='')
+
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        html = _get_subtree_html({}, options, stdlib, tree, document)
+        timings.append(time.perf_counter() - start)
+    num_nodes = (args.nodes // NODES_PER_SECTION) * NODES_PER_SECTION + 1
+    best = min(timings)
+    template = "{} nodes, {:.1f} MB of HTML   min {:7.1f} ms   {:,.0f} nodes/s"
+    print(template.format(
+        num_nodes, len(html) / 1e6, best * 1000, num_nodes / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tracks how much memory the parsed documents of a prose-heavy site take,
+with and without `"memory_mapped_text": true`, and how long parsing takes.
+
+Each document has paragraphs written one per line, like a lot of prose is,
+a few shorter lines, and a code block. Memory is measured with
+`tracemalloc` after parsing, so it only counts what the parsed nodes keep.
+
+Usage: python3 benchmarks/bench_memory_mapped_text.py [--documents N]
+    [--paragraphs N]
+"""
+
+import argparse
+import gc
+import pathlib
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+from computerwords.markdown_parser.source_arena import SourceArena
+
+
+SENTENCE = "The quick brown fox documents the lazy dog's API in detail. "
+
+
+def make_document(i, num_paragraphs):
+    parts = ['# Document {}\n'.format(i)]
+    for j in range(num_paragraphs):
+        parts.append('## Section {}\n'.format(j))
+        parts.append(SENTENCE * 8 + 'Paragraph {}.\n'.format(j))
+        parts.append('Short line.\nAnother *short* line.\n')
+    parts.append('```python\n' + 'print("{}")\n'.format(SENTENCE) * 10 + '```\n')
+    return '\n'.join(parts)
+
+
+def parse_site(documents, source_arena):
+    nodes = []
+    for i, text in enumerate(documents):
+        config = CFMParserConfig(
+            allowed_tags=set(), document_id=('doc{}.md'.format(i),),
+            document_path='doc{}.md'.format(i), source_arena=source_arena)
+        nodes.append(cfm_to_cwdom(text, config))
+    return nodes
+
+
+def measure(documents, use_arena):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    source_arena = SourceArena() if use_arena else None
+    nodes = parse_site(documents, source_arena)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del nodes
+    if source_arena is not None:
+        source_arena.close()
+    return retained, seconds
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--documents', default=200, type=int)
+    p.add_argument('--paragraphs', default=30, type=int)
+    args = p.parse_args()
+
+    documents = [
+        make_document(i, args.paragraphs) for i in range(args.documents)]
+    source_mb = sum(len(d) for d in documents) / 1e6
+    print("{} documents, {:.1f} MB of source".format(
+        args.documents, source_mb))
+    for use_arena in (False, True):
+        retained, seconds = measure(documents, use_arena)
+        print("memory_mapped_text={!s:5}  retained {:6.1f} MB   {:6.2f} s".format(
+            use_arena, retained / 1e6, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tracks how long one big generated reference page takes to parse in one
+piece and split into chunks that are parsed in a process pool (see
+`cfm_to_cwdom()` and `"parallel_parse_chunk_size"`), and checks that both
+give the same nodes.
+
+Usage: python3 benchmarks/bench_parallel_parse.py [--sections N]
+    [--chunk-size N] [--jobs N ...]
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.cwdom.jobs import JobRunner
+from computerwords.cwdom.nodes import CWRootNode
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+
+
+def make_document(num_sections):
+    parts = ['# Reference\n']
+    for i in range(num_sections):
+        parts.append('## `module.function_{}(a, b=None)`\n'.format(i))
+        parts.append(
+            'Does *thing* number {} with `a`. See <link-to name="s{}">the'
+            ' other one</link-to> for details.\n'.format(i, i + 1))
+        parts.append('* `a`: the first thing\n* `b`: the second thing\n')
+        parts.append('```python\nmodule.function_{}(1, b=2)\n```\n'.format(i))
+    return '\n'.join(parts)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--sections', default=5000, type=int)
+    p.add_argument('--chunk-size', default=100000, type=int)
+    p.add_argument('--jobs', default=[2, 4], type=int, nargs='+')
+    args = p.parse_args()
+
+    text = make_document(args.sections)
+    config = CFMParserConfig(
+        allowed_tags={'link-to'}, document_id=('reference',),
+        document_path='reference.md')
+    print("{:.1f} MB".format(len(text) / 1e6))
+
+    start = time.perf_counter()
+    expected = CWRootNode(cfm_to_cwdom(text, config))
+    print("one piece:      {:6.2f} s".format(time.perf_counter() - start))
+    expected = expected.get_string_for_test_comparison()
+
+    for jobs in args.jobs:
+        job_runner = JobRunner(max_workers=jobs)
+        start = time.perf_counter()
+        root = CWRootNode(cfm_to_cwdom(
+            text, config, job_runner=job_runner, chunk_size=args.chunk_size))
+        seconds = time.perf_counter() - start
+        job_runner.shutdown()
+        print("{:2} processes:   {:6.2f} s{}".format(
+            jobs, seconds,
+            '' if root.get_string_for_test_comparison() == expected
+            else '  DIFFERENT OUTPUT'))
+
+
+if __name__ == '__main__':
+    main()
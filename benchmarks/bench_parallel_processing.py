@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Compares processing a site of documents full of code blocks with
+`CWTree.apply_library()`, with `apply_library_in_parallel()`, which runs
+the document-local processors (including syntax highlighting) of each
+document in a process pool, and with `apply_library_in_threads()`, which
+runs them in a thread pool, for each number of workers in `--workers`.
+
+Threads only scale on a free-threaded build of Python, like
+`python3.13t -X gil=0 benchmarks/bench_parallel_processing.py`.
+
+Usage: python3 benchmarks/bench_parallel_processing.py [--documents N]
+    [--blocks N] [--workers 1,2,4] [--runs N]
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.jobs import JobRunner
+from computerwords.cwdom.nodes import CWDocumentNode, CWRootNode
+from computerwords.cwdom.parallel import (
+    apply_library_in_parallel,
+    apply_library_in_threads,
+    get_is_gil_enabled,
+)
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+from computerwords.plugins.pygments import PygmentsPlugin
+from computerwords.stdlib import make_stdlib
+
+
+CODE = '\n'.join(
+    'def function_{0}(a, b={0}):\n    return [x * b for x in a if x]'.format(i)
+    for i in range(10))
+
+
+def make_library(env=None):
+    library = make_stdlib()
+    PygmentsPlugin().add_processors(library)
+    return library
+
+
+def make_document(i, num_blocks):
+    parts = ['# Document {}\n'.format(i)]
+    for j in range(num_blocks):
+        parts.append('## Example {}.{}\n'.format(i, j))
+        parts.append('```python\n{}\n```\n'.format(CODE))
+    return '\n'.join(parts)
+
+
+def make_tree(library, num_documents, num_blocks):
+    documents = []
+    for i in range(num_documents):
+        document_id = ('doc{}'.format(i),)
+        config = CFMParserConfig(
+            allowed_tags=library.get_allowed_tags(), document_id=document_id,
+            document_path='doc{}.md'.format(i))
+        document = CWDocumentNode(
+            'doc{}.md'.format(i),
+            cfm_to_cwdom(make_document(i, num_blocks), config))
+        document.deep_set_document_id(document_id)
+        documents.append(document)
+    return CWTree(CWRootNode(documents), {'config': {}})
+
+
+def time_fn(fn, library, args):
+    timings = []
+    for _ in range(args.runs):
+        tree = make_tree(library, args.documents, args.blocks)
+        start = time.perf_counter()
+        fn(tree)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--documents', default=40, type=int)
+    p.add_argument('--blocks', default=20, type=int)
+    p.add_argument('--workers', default='1,2,4')
+    p.add_argument('--runs', default=3, type=int)
+    args = p.parse_args()
+
+    library = make_library()
+    print("GIL {}".format("enabled" if get_is_gil_enabled() else "disabled"))
+    serial = time_fn(lambda tree: tree.apply_library(library), library, args)
+    print("serial                {:8.1f} ms".format(serial * 1000))
+
+    for workers in [int(n) for n in args.workers.split(',')]:
+        job_runner = JobRunner(max_workers=workers)
+
+        def processes(tree):
+            apply_library_in_parallel(tree, library, job_runner, make_library)
+
+        def threads(tree):
+            apply_library_in_threads(tree, library, workers)
+
+        # start the worker processes and import pygments in them
+        processes(make_tree(library, workers, 1))
+        for name, fn in (('processes', processes), ('threads', threads)):
+            seconds = time_fn(fn, library, args)
+            print("{:9} x {:<2}        {:8.1f} ms   {:4.2f}x".format(
+                name, workers, seconds * 1000, serial / seconds))
+        job_runner.shutdown()
+
+
+if __name__ == '__main__':
+    main()
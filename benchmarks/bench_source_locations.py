@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tracks how many source locations are made while parsing, which should be
+close to none now that tokens keep character offsets and CommonMark nodes
+keep their `sourcepos` until an error needs a line and column.
+
+For a Markdown document with lots of custom tags, this reports how many
+`SourceLocation`s and `SourceRange`s parsing creates, how much memory the
+lexed tokens of its HTML keep (measured with `tracemalloc`), and how long
+lexing and parsing take.
+
+Usage: python3 benchmarks/bench_source_locations.py [--sections N] [--runs N]
+"""
+
+import argparse
+import gc
+import pathlib
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser import src_loc
+from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+from computerwords.markdown_parser.html_lexer import lex_html
+
+
+def make_document(num_sections):
+    parts = ['# Document\n']
+    for i in range(num_sections):
+        parts.append('## Section {}\n'.format(i))
+        parts.append(
+            'Some *text* with <link-to name="s{}">a link</link-to> and'
+            ' `code`.\n'.format(i))
+        parts.append(
+            '<callout kind=info>\nA callout with <link-to name=x /> in it\n'
+            '</callout>\n')
+        parts.append('* one\n* two\n')
+    return '\n'.join(parts)
+
+
+def count_locations(fn):
+    """Returns how many SourceLocations and SourceRanges `fn()` creates"""
+    counts = {src_loc.SourceLocation: 0, src_loc.SourceRange: 0}
+    originals = {}
+    for cls in counts:
+        originals[cls] = cls.__new__
+
+        def counting_new(cls, *args, _original=cls.__new__, **kwargs):
+            counts[cls] += 1
+            return _original(cls, *args, **kwargs)
+        cls.__new__ = counting_new
+    try:
+        fn()
+    finally:
+        for cls, original in originals.items():
+            cls.__new__ = original
+    return counts[src_loc.SourceLocation], counts[src_loc.SourceRange]
+
+
+def retained_by(fn):
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def time_fn(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--sections', default=1000, type=int)
+    p.add_argument('--runs', default=5, type=int)
+    args = p.parse_args()
+
+    document = make_document(args.sections)
+    config = CFMParserConfig(
+        allowed_tags={'callout', 'link-to'}, document_id=('doc.md',),
+        document_path='doc.md')
+    # just the HTML, as one string, for the lexer
+    html = ''.join(
+        '<callout kind=info>\nA callout with <link-to name=x /> in it\n'
+        '</callout>\n' for _ in range(args.sections))
+
+    parse = lambda: cfm_to_cwdom(document, config)
+    lex = lambda: list(lex_html(config, html))
+
+    locations, ranges = count_locations(parse)
+    print("parse: {:8} SourceLocations {:8} SourceRanges".format(
+        locations, ranges))
+    locations, ranges = count_locations(lex)
+    print("lex:   {:8} SourceLocations {:8} SourceRanges".format(
+        locations, ranges))
+    print("lexed tokens retain {:.2f} MB".format(retained_by(lex) / 1e6))
+    print("lex {:.1f} ms   parse {:.1f} ms".format(
+        time_fn(lex, args.runs) * 1000, time_fn(parse, args.runs) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compares the peak memory of parsing, processing, and writing the HTML of a
+site with all of its documents in memory, and with `"spill_documents":
+true`, which keeps each processed document in a temporary file until it is
+written.
+
+Memory is measured with `tracemalloc`, so it is what Python allocates, not
+the process's RSS. The HTML of each document is rendered and thrown away.
+
+Usage: python3 benchmarks/bench_spill_documents.py [--documents N]
+    [--sections N]
+"""
+
+import argparse
+import gc
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import CWDocumentNode, CWRootNode
+from computerwords.cwdom.spill import DocumentSpill
+from computerwords.htmlwriter import _get_subtree_html
+from computerwords.htmlwriter.util import HTMLWriterOptions
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+from computerwords.stdlib import stdlib
+
+
+SENTENCE = "The quick brown fox documents the lazy dog's API in detail. "
+OPTIONS = HTMLWriterOptions(
+    single_page=False, static_dir=None, files_to_copy=[],
+    stylesheet_tag_strings=[], site_url='/', meta_description='')
+
+
+def make_document(i, num_sections):
+    parts = ['# Document {}\n'.format(i), '<table-of-contents maxdepth=1 />\n']
+    for j in range(num_sections):
+        parts.append('## Section {}.{}\n'.format(i, j))
+        parts.append((SENTENCE * 6 + '\n') * 3)
+        parts.append('* a *list*\n* with `code`\n')
+    return '\n'.join(parts)
+
+
+def iterate_documents(num_documents, num_sections):
+    for i in range(num_documents):
+        document_id = ('doc{}'.format(i),)
+        config = CFMParserConfig(
+            allowed_tags=stdlib.get_allowed_tags(), document_id=document_id,
+            document_path='doc{}.md'.format(i))
+        document = CWDocumentNode(
+            'doc{}.md'.format(i),
+            cfm_to_cwdom(make_document(i, num_sections), config))
+        document.deep_set_document_id(document_id)
+        yield document
+
+
+def build(num_documents, num_sections, spill):
+    env = {'config': {}}
+    documents = iterate_documents(num_documents, num_sections)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if spill:
+            document_spill = DocumentSpill(
+                stdlib, env, pathlib.Path(temp_dir))
+            for document in documents:
+                document_spill.add_document(document)
+            tree = document_spill.apply_library()
+        else:
+            tree = CWTree(CWRootNode(list(documents)), env)
+            tree.apply_library(stdlib)
+        for document in tree.root.children:
+            _get_subtree_html({}, OPTIONS, stdlib, tree, document)
+
+
+def measure(num_documents, num_sections, spill):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    build(num_documents, num_sections, spill)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, seconds
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--documents', default=100, type=int)
+    p.add_argument('--sections', default=20, type=int)
+    args = p.parse_args()
+
+    for spill in (False, True):
+        peak, seconds = measure(args.documents, args.sections, spill)
+        print("spill_documents={!s:5}  peak {:7.1f} MB   {:6.2f} s".format(
+            spill, peak / 1e6, seconds))
+
+
+if __name__ == '__main__':
+    main()
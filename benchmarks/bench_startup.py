@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tracks how long it takes to start Computer Words, by timing
+`python -m computerwords --help` and a full build of a tiny three-page site.
+
+Usage: python3 benchmarks/bench_startup.py [--runs N]
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+TINY_SITE = {
+    'index.md': '# Tiny site\n\n<table-of-contents />\n\nHello.\n',
+    'about.md': '# About\n\nSome *text* about <heading-link name="index" />.\n',
+    'usage.md': (
+        '<heading-alias name="index" />\n\n# Usage\n\n'
+        '```python\nprint("hi")\n```\n'),
+}
+
+
+def time_command(args, cwd, runs):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [str(REPO_ROOT)] + [p for p in [env.get('PYTHONPATH')] if p])
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            args, cwd=str(cwd), env=env, check=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print("{:<24} min {:7.1f} ms   median {:7.1f} ms".format(
+        name, min(timings) * 1000, statistics.median(timings) * 1000))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--runs', default=10, type=int)
+    args = p.parse_args()
+
+    report('--help', time_command(
+        [sys.executable, '-m', 'computerwords', '--help'],
+        REPO_ROOT, args.runs))
+
+    with tempfile.TemporaryDirectory() as site_dir:
+        site_dir = pathlib.Path(site_dir)
+        for name, text in TINY_SITE.items():
+            (site_dir / name).write_text(text)
+        (site_dir / 'conf.json').write_text(json.dumps({
+            'file_hierarchy': ['index.md', 'about.md', 'usage.md'],
+        }))
+        report('tiny site build', time_command(
+            [sys.executable, '-m', 'computerwords', '--conf', 'conf.json'],
+            site_dir, args.runs))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,94 @@
 import argparse
-import importlib
+import functools
 import json
 import logging
 import pathlib
 import sys
+import tempfile
+import time
 
 logging.basicConfig(level=logging.DEBUG)
 
-from computerwords.htmlwriter import write as write_html
 from computerwords.config import DictCascade, DEFAULT_CONFIG
-from computerwords.cwdom.nodes import CWRootNode
-from computerwords.cwdom.CWTree import CWTree
-from computerwords.plugin import CWPlugin
-from computerwords.markdown_parser import CFMParserConfig
-from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
-from computerwords.read_doc_tree import read_doc_tree
-from computerwords.stdlib import stdlib
+from computerwords.plugin_registry import PluginLoader
 
 log = logging.getLogger(__name__)
 
 
-def _get_plugins(plugin_names):
-    for import_path in plugin_names:
-        module = importlib.import_module(import_path)
-        for maybe_cls in module.__dict__.values():
-            try:
-                if issubclass(maybe_cls, CWPlugin):
-                    yield maybe_cls()
-            except TypeError:
-                pass
+# The parser, the processing engine, and the plugins are imported inside the
+# functions that use them so that `--help` and argument errors are fast, and
+# so that plugins are only imported if a document needs them.
 
 
-def _get_cfm_reader(lib):
+def _get_cfm_reader(lib, config, job_runner, block_cache):
+    """
+    Returns a function that parses a document. Documents longer than
+    `"parallel_parse_chunk_size"` characters are split and parsed in
+    `job_runner`'s process pool. If `block_cache` isn't `None`, only blocks
+    that aren't in it are parsed.
+    """
+    from computerwords.markdown_parser import CFMParserConfig
+    from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+    from computerwords.markdown_parser.source_arena import SourceArena
+
+    source_arena = SourceArena() if config['memory_mapped_text'] else None
+    chunk_size = config['parallel_parse_chunk_size']
+
     def _read_doc_tree(toc_entry, doc_id, doc_path):
         config = CFMParserConfig(
             allowed_tags=lib.get_allowed_tags(),
             document_id=doc_id,
-            document_path=doc_path)
+            document_path=doc_path,
+            source_arena=source_arena)
         with toc_entry.root_path.open() as f:
-            return cfm_to_cwdom(f.read(), config)
+            return cfm_to_cwdom(
+                f.read(), config, job_runner=job_runner,
+                chunk_size=chunk_size, block_cache=block_cache)
     return _read_doc_tree
 
 
+def _make_library(plugin_entries, env):
+    """
+    Returns a new standard library with the plugins in `plugin_entries`
+    loaded and configured with `env['config']`, the full config. Used by
+    worker processes with `"parallel_processing": true`.
+    """
+    from computerwords.stdlib import make_stdlib
+    library = make_stdlib()
+    plugin_loader = PluginLoader(plugin_entries)
+    plugin_loader.load_eager_plugins()
+    plugin_loader.configure(env['config'], library)
+    return library
+
+
 def run():
     p = argparse.ArgumentParser()
     p.add_argument('--conf', default="conf.json", type=argparse.FileType('r'))
     p.add_argument('--debug', default=False, action='store_true')
-    p.add_argument('--writer', default='html', action='store')
+    p.add_argument(
+        '--writer', default=None, action='append',
+        help="Name of a writer to use. May be given more than once to write"
+             " several formats from the same processed tree. Default: html")
+    p.add_argument(
+        '--profile', default=False, action='store_true',
+        help="Log how long each stage takes and how many traversals of the"
+             " tree each processing phase needed")
     args = p.parse_args()
 
+    from computerwords.cwdom.nodes import CWRootNode
+    from computerwords.cwdom.CWTree import CWTree
+    from computerwords.read_doc_tree import (
+        get_doc_tree,
+        iterate_document_nodes,
+    )
+    from computerwords.stdlib import stdlib
+
     config_json = json.load(args.conf)
-    plugin_names = DEFAULT_CONFIG['plugins'] + config_json.get('plugins', [])
-    plugins = list(_get_plugins(plugin_names))
+    plugin_entries = DEFAULT_CONFIG['plugins'] + config_json.get('plugins', [])
+    plugin_loader = PluginLoader(plugin_entries)
     more_defaults = [
         {plugin.CONFIG_NAMESPACE: plugin.get_default_config()}
-        for plugin in plugins
+        for plugin in plugin_loader.load_eager_plugins()
         if plugin.CONFIG_NAMESPACE is not None
     ]
 
@@ -67,26 +101,125 @@ def run():
     if not output_root.exists():
         output_root.mkdir()
 
-    for plugin in plugins:
-        plugin.postprocess_config(config)
-
-    for plugin in plugins:
-        plugin.add_processors(stdlib)
-
-    doc_tree, document_nodes = read_doc_tree(
-        files_root, config['file_hierarchy'], _get_cfm_reader(stdlib))
-    tree = CWTree(CWRootNode(document_nodes), {
+    plugin_loader.configure(config, stdlib)
+
+    from computerwords.cwdom.jobs import JobRunner
+    from computerwords.markdown_parser.block_cache import BlockCache
+
+    timings = [('parse', time.perf_counter())]
+    # only starts processes if a document is big enough to split, or for
+    # "parallel_processing"
+    parse_job_runner = JobRunner(max_workers=config['max_jobs'])
+    block_cache = None
+    if config['parse_cache_dir'] is not None:
+        block_cache = BlockCache(files_root / config['parse_cache_dir'])
+    doc_tree = get_doc_tree(files_root, config['file_hierarchy'])
+    document_nodes = iterate_document_nodes(
+        doc_tree,
+        _get_cfm_reader(stdlib, config, parse_job_runner, block_cache))
+    env = {
         'doc_tree': doc_tree,
         'output_dir': output_root,
         'config': config
-    })
-    if args.debug:
-        print(tree.root.get_string_for_test_comparison())
-    tree.apply_library(stdlib)
-
-    writers = {
-        plugin.WRITER_NAME: plugin
-        for plugin in plugins
-        if plugin.WRITER_NAME is not None
     }
-    writers[args.writer].write(config, files_root, output_root, stdlib, tree)
+
+    spill_dir = None
+    # removed even if processing or writing fails
+    try:
+        if config['spill_documents']:
+            from computerwords.cwdom.spill import DocumentSpill
+            # documents are parsed, processed as far as they can be on their
+            # own, and written to disk one at a time
+            spill_dir = tempfile.TemporaryDirectory()
+            spill = DocumentSpill(stdlib, env, pathlib.Path(spill_dir.name))
+            for document_node in document_nodes:
+                if args.debug:
+                    print(document_node.get_string_for_test_comparison())
+                spill.add_document(document_node)
+        else:
+            document_nodes = list(document_nodes)
+        if block_cache is not None:
+            block_cache.save()
+
+        timings.append(('process', time.perf_counter()))
+        if spill_dir is not None:
+            tree = spill.apply_library()
+        else:
+            tree = CWTree(CWRootNode(document_nodes), env)
+            if args.debug:
+                print(tree.root.get_string_for_test_comparison())
+            parallel_processing = config['parallel_processing']
+            if parallel_processing == 'threads':
+                from computerwords.cwdom.parallel import (
+                    apply_library_in_threads,
+                    get_is_gil_enabled,
+                )
+                if get_is_gil_enabled():
+                    log.warning(
+                        "\"parallel_processing\": \"threads\" is only faster"
+                        " on a free-threaded build of Python")
+                apply_library_in_threads(tree, stdlib, config['max_jobs'])
+            elif parallel_processing:  # true or "processes"
+                from computerwords.cwdom.parallel import (
+                    apply_library_in_parallel,
+                )
+                apply_library_in_parallel(
+                    tree, stdlib, parse_job_runner,
+                    functools.partial(_make_library, plugin_entries))
+            else:
+                tree.apply_library(stdlib)
+        parse_job_runner.shutdown()
+        timings.append(('write', time.perf_counter()))
+
+        writers = []
+        for writer_name in args.writer or ['html']:
+            writer = plugin_loader.get_writer(writer_name)
+            if writer is None:
+                log.error("No plugin provides a writer called {!r}".format(
+                    writer_name))
+                sys.exit(1)
+            writers.append((writer_name, writer))
+        writer_timings = _run_writers(
+            writers, config, files_root, output_root, stdlib, tree)
+        timings.append((None, time.perf_counter()))
+    finally:
+        if spill_dir is not None:
+            spill_dir.cleanup()
+
+    if args.profile or len(writers) > 1:
+        for writer_name, seconds in writer_timings:
+            log.info("writer {}: {:.3f}s".format(writer_name, seconds))
+    if args.profile:
+        _log_profile(timings, tree)
+
+
+def _run_writers(writers, config, files_root, output_root, library, tree):
+    """
+    Run each `(name, writer plugin)` in `writers` on the processed tree.
+    Writers must not modify the tree, so if there is more than one, they run
+    at the same time in separate threads. Returns a list of
+    `(name, seconds)`.
+    """
+    def run_writer(writer):
+        start = time.perf_counter()
+        writer.write(config, files_root, output_root, library, tree)
+        return time.perf_counter() - start
+
+    if len(writers) == 1:
+        name, writer = writers[0]
+        return [(name, run_writer(writer))]
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(writers)) as executor:
+        futures = [
+            (name, executor.submit(run_writer, writer))
+            for name, writer in writers
+        ]
+        return [(name, future.result()) for name, future in futures]
+
+
+def _log_profile(timings, tree):
+    for (stage, start), (_, end) in zip(timings, timings[1:]):
+        log.info("{}: {:.3f}s".format(stage, end - start))
+    for phase, rounds in enumerate(tree.rounds_per_phase):
+        log.info("phase {}: {} traversal(s)".format(phase, rounds))
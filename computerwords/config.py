@@ -10,10 +10,34 @@ DEFAULT_CONFIG = {
     "project_version": None,
     "author": "Docs McGee",
     "output_dir": "./build",
+    # maximum number of background jobs (such as Graphviz renders) to run at
+    # once. null means "let Python decide based on the number of CPUs."
+    "max_jobs": None,
+    # if true, long runs of text are kept in a memory-mapped temporary file
+    # instead of in memory, which helps with very big sites
+    "memory_mapped_text": False,
+    # documents longer than this many characters are split at top-level
+    # headings into chunks of about this size, which are parsed in parallel.
+    # null means "never split documents."
+    "parallel_parse_chunk_size": 1000000,
+    # directory, relative to the config file, in which to remember the parsed
+    # blocks of each document so that rebuilds only parse changed blocks.
+    # null means "don't remember anything."
+    "parse_cache_dir": None,
+    # if true, keep each processed document in a temporary file instead of
+    # in memory until it is written, so memory doesn't grow with the size of
+    # the site
+    "spill_documents": False,
+    # if true or "processes", the document-local processors run on each
+    # document in a separate process. If "threads", they run in threads,
+    # which is only faster on a free-threaded build of Python. Ignored if
+    # spill_documents is true.
+    "parallel_processing": False,
     "plugins": [
         "computerwords.plugins.callouts",
         "computerwords.plugins.heading_aliases",
         "computerwords.plugins.htmlwriter",
+        "computerwords.plugins.searchwriter",
         "computerwords.plugins.graphviz",
         "computerwords.plugins.pygments",
         "computerwords.plugins.python35",
@@ -0,0 +1,69 @@
+"""
+Runs slow work for processors (external tools, image optimizers, renderers)
+without blocking the rest of processing.
+
+You probably want `CWTree.submit_job()` or `CWTree.submit_subprocess()`
+instead of using this module directly.
+"""
+
+import logging
+import subprocess
+
+
+log = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """
+    Lazily creates a thread pool (for subprocesses and I/O-bound callables)
+    and a process pool (for CPU-bound callables), both limited to
+    `max_workers` workers.
+    """
+
+    def __init__(self, max_workers=None):
+        super().__init__()
+        self.max_workers = max_workers
+        self._thread_executor = None
+        self._process_executor = None
+
+    def submit(self, fn, *args, use_processes=False):
+        """Returns a `concurrent.futures.Future` for `fn(*args)`. If
+        `use_processes` is `True`, `fn`, its arguments, and its return value
+        must be picklable."""
+        # concurrent.futures is imported here because most builds never
+        # submit a job, and importing it slows down startup.
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        if use_processes:
+            if self._process_executor is None:
+                self._process_executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers)
+            return self._process_executor.submit(fn, *args)
+        else:
+            if self._thread_executor is None:
+                self._thread_executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers)
+            return self._thread_executor.submit(fn, *args)
+
+    def submit_subprocess(self, args, input=None, timeout=None):
+        """Returns a `concurrent.futures.Future` whose result is the
+        `subprocess.CompletedProcess` of running `args`. `input` is passed to
+        stdin; stdout and stderr are captured."""
+        return self.submit(_run_subprocess, args, input, timeout)
+
+    def wait_for_any(self, futures):
+        """Block until at least one of `futures` is done."""
+        from concurrent.futures import FIRST_COMPLETED, wait
+        wait(futures, return_when=FIRST_COMPLETED)
+
+    def shutdown(self):
+        for executor in (self._thread_executor, self._process_executor):
+            if executor is not None:
+                executor.shutdown()
+        self._thread_executor = None
+        self._process_executor = None
+
+
+def _run_subprocess(args, input, timeout):
+    return subprocess.run(
+        args, input=input, timeout=timeout,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
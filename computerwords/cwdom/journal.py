@@ -0,0 +1,194 @@
+"""
+A record of the changes processors make to a `CWTree`.
+
+```python
+from computerwords.cwdom.journal import MutationJournal
+
+tree.journal = MutationJournal()
+tree.apply_library(library)
+changed_document_ids = tree.journal.get_changed_document_ids()
+```
+
+Changes made through `CWTree` methods (`wrap_node()`, `replace_subtree()`,
+`insert_subtree()`, `insert_subtrees()`, `add_siblings_ahead()`,
+`replace_node()`, and `unshare()`, which uses them) are recorded as they
+are made. Changes processors make to a node's own attributes, like
+`node.data`, `node.kwargs`, or `node.text`, are found by comparing each
+node with how it was when `apply_library()` started or when it was added,
+and are recorded when `apply_library()` returns. Changing an object stored
+in an attribute in place, like appending to a list in `node.data`, is not
+noticed; assign a new value instead.
+"""
+
+from collections import namedtuple
+
+from .traversal import preorder_traversal
+
+
+JournalEntry = namedtuple(
+    'JournalEntry',
+    ['operation', 'document_id', 'target_id', 'index', 'nodes'])
+JournalEntry.__doc__ = """
+One recorded change.
+
+* `operation`: `'wrap_node'`, `'replace_subtree'`, `'insert_subtree'`,
+  `'add_siblings_ahead'`, `'replace_node'`, or `'set_attributes'`
+* `document_id`: document ID of the document that changed
+* `target_id`: ID of the node that was wrapped, replaced, inserted into, or
+  changed, or of the active node for `'add_siblings_ahead'`
+* `index`: child index of the first inserted node for `'insert_subtree'`,
+  otherwise `None`
+* `nodes`: copies of the added nodes as they were when they were added. The
+  copies have the same IDs as the originals. The outer node of `'wrap_node'`
+  and the new node of `'replace_node'` are copied without children. For
+  `'set_attributes'`, a copy of the changed node without children.
+"""
+
+
+class MutationJournalReplayError(Exception):
+    """
+    Error thrown by `MutationJournal.replay()` if the tree does not contain a
+    node the journal refers to.
+    """
+
+
+class MutationJournal:
+    """
+    Assign an instance to `CWTree.journal` to record the changes made to the
+    tree while it is being processed.
+
+    Properties:
+
+    * `entries`: list of `JournalEntry`, oldest first
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.entries = []
+        # node ID -> attributes when processing started or when it was added
+        self._initial_attributes = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def record(self, operation, document_id, target_node, nodes, index=None,
+               with_children=True):
+        """Called by `CWTree` after each change"""
+        self.entries.append(JournalEntry(
+            operation, document_id, target_node.id, index,
+            [_clone(node, with_children) for node in nodes]))
+        for node in nodes:
+            added_nodes = preorder_traversal(node) if with_children else [node]
+            for added_node in added_nodes:
+                self._initial_attributes[added_node.id] = _get_attributes(
+                    added_node)
+
+    def record_initial_attributes(self, node):
+        """Called by `CWTree` before processing the subtree of `node`"""
+        for descendant in preorder_traversal(node):
+            self._initial_attributes[descendant.id] = _get_attributes(
+                descendant)
+
+    def record_attribute_changes(self, node):
+        """Called by `CWTree` after processing the subtree of `node`. Adds a
+        `'set_attributes'` entry for each node in it whose attributes
+        changed."""
+        for descendant in preorder_traversal(node):
+            attributes = _get_attributes(descendant)
+            initial_attributes = self._initial_attributes.get(descendant.id)
+            if (initial_attributes is not None and
+                    attributes != initial_attributes):
+                self.entries.append(JournalEntry(
+                    'set_attributes', descendant.document_id, descendant.id,
+                    None, [_clone(descendant, False)]))
+                self._initial_attributes[descendant.id] = attributes
+
+    def get_changed_document_ids(self):
+        """Returns the set of document IDs of the documents that were
+        changed"""
+        return {
+            entry.document_id for entry in self.entries
+            if entry.document_id is not None
+        }
+
+    def replay(self, tree):
+        """
+        Make the recorded changes to `tree`, which should contain nodes with
+        the same IDs as the tree they were recorded from before it was
+        processed, like a copy of it saved before processing. Processors are
+        not run.
+
+        The same journal may be replayed onto any number of trees.
+        """
+        id_to_node = {node.id: node for node in tree.preorder_traversal()}
+
+        def get_node(node_id):
+            try:
+                return id_to_node[node_id]
+            except KeyError:
+                raise MutationJournalReplayError(
+                    "Node {} is not in the tree".format(node_id))
+
+        def add(node):
+            for descendant in tree.preorder_traversal(node):
+                id_to_node[descendant.id] = descendant
+            return node
+
+        for entry in self.entries:
+            target = get_node(entry.target_id)
+            operation = entry.operation
+            if operation == 'set_attributes':
+                target.__dict__.update(_get_attributes(entry.nodes[0]))
+                continue
+            nodes = [add(_clone(node, True)) for node in entry.nodes]
+            if operation == 'wrap_node':
+                parent = target.get_parent()
+                parent.replace_child(parent.index_of_child(target), nodes[0])
+                nodes[0].set_children([target])
+            elif operation == 'replace_subtree':
+                parent = target.get_parent()
+                parent.replace_child(parent.index_of_child(target), nodes[0])
+            elif operation == 'insert_subtree':
+                target.children[entry.index:entry.index] = nodes
+                for node in nodes:
+                    node.set_parent(target)
+            elif operation == 'add_siblings_ahead':
+                parent = target.get_parent()
+                child_i = parent.index_of_child(target)
+                parent.children[child_i + 1:child_i + 1] = nodes
+                for node in nodes:
+                    node.set_parent(parent)
+            elif operation == 'replace_node':
+                parent = target.get_parent()
+                parent.replace_child(parent.index_of_child(target), nodes[0])
+                nodes[0].set_children(target.children)
+            else:
+                raise ValueError(
+                    "Unknown journal operation {!r}".format(operation))
+
+
+def _clone(node, with_children):
+    """Copy a node, keeping its ID"""
+    node_copy = type(node).__new__(type(node))
+    node_copy.__dict__.update(_get_attributes(node))
+    node_copy.children = []
+    node_copy.set_parent(None)
+    if with_children:
+        node_copy.set_children(
+            [_clone(child, True) for child in node.children])
+    return node_copy
+
+
+def _get_attributes(node):
+    """Returns a copy of the attributes of `node` other than its children and
+    parent"""
+    attributes = dict(node.__dict__)
+    del attributes['children']
+    del attributes['parent_weakref']
+    for name in ('data', 'kwargs'):
+        if attributes.get(name) is not None:
+            attributes[name] = dict(attributes[name])
+    return attributes
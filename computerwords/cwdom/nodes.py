@@ -9,6 +9,7 @@ This module contains the nodes that make up the document tree.
 """
 
 import logging
+import threading
 import weakref
 
 
@@ -16,13 +17,28 @@ log = logging.getLogger(__name__)
 
 
 class _IDGenerator:
+    # nodes may be created by several threads at once, and without the GIL,
+    # `self.next_id += 1` could give two of them the same ID
     def __init__(self):
         self.next_id = 1
+        self._lock = threading.Lock()
 
     def get_id(self):
-        i = self.next_id
-        self.next_id += 1
-        return i
+        with self._lock:
+            i = self.next_id
+            self.next_id += 1
+            return i
+
+    def reserve(self, node_id):
+        """Make sure `node_id`, which may come from another process, is never
+        given to a new node"""
+        try:
+            i = int(node_id.rsplit(':', 1)[1])
+        except (IndexError, ValueError):
+            return
+        with self._lock:
+            if i >= self.next_id:
+                self.next_id = i + 1
 
 
 _id_generator = _IDGenerator()
@@ -110,6 +126,14 @@ class CWNode:
         self.children[i] = child
         child.set_parent(self)
 
+    def index_of_child(self, child):
+        """Returns the index of `child` in `self.children`. Faster than
+        `self.children.index(child)`, which compares nodes with `==`."""
+        for i, node in enumerate(self.children):
+            if node is child:
+                return i
+        raise ValueError("{} is not a child of {}".format(child, self))
+
     def get_string_for_test_comparison(self, inner_indentation=2):
         """Returns a string that is very convenient to compare using
         `unittest.TestCase.assertMultiLineEqual()`
@@ -144,6 +168,16 @@ class CWNode:
     def __hash__(self):
         return hash(self.id)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['parent_weakref'] = None  # weakrefs can't be pickled
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.claim_children()
+        _id_generator.reserve(self.id)
+
 
 class CWRootNode(CWNode):
     """
@@ -284,6 +318,47 @@ class CWTextNode(CWNode):
         return "{}(text={!r})".format(self.name, self.text)
 
 
+class CWSpanTextNode(CWTextNode):
+    """
+    name: `Text`
+
+    A `CWTextNode` whose text stays in a `SourceArena`
+    (`computerwords.markdown_parser.source_arena`) instead of in memory. The
+    text is read from the arena every time `text` is accessed. If you assign
+    to `text`, the new value is kept on the node like any other
+    `CWTextNode`.
+    """
+
+    def __init__(self, arena, start, end, document_id=None, escape=True):
+        """
+        * `arena`: the `SourceArena` that contains the text
+        * `start`, `end`: byte offsets of the text in `arena`
+        """
+        super().__init__(None, document_id=document_id, escape=escape)
+        self.arena = arena
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self):
+        if self.arena is None:
+            return self._text
+        return self.arena.get_text(self.start, self.end)
+
+    @text.setter
+    def text(self, text):
+        self.arena = None
+        self._text = text
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        if state['arena'] is not None:
+            # arenas can't be pickled, and may not exist where this is loaded
+            state['_text'] = self.text
+            state['arena'] = None
+        return state
+
+
 class CWAnchorNode(CWTagNode):
     """
     name: `Anchor`
@@ -370,3 +445,77 @@ class CWDocumentLinkNode(CWNode):
     def shallow_repr(self):
         return "{}(target_document_id={!r})".format(
             self.name, self.target_document_id)
+
+
+class CWJobNode(CWNode):
+    """
+    name: `Job`
+
+    A placeholder for the result of work running in the background. Created
+    by `CWTree.submit_job()` and `CWTree.submit_subprocess()`, and replaced
+    with the job's result before processing finishes, so writers never see
+    it.
+    """
+
+    def __init__(self, future, on_complete=None, children=None,
+                 document_id=None):
+        """
+        * `future`: `concurrent.futures.Future` of the job
+        * `on_complete`: function `on_complete(result) -> CWNode`. If `None`,
+          the job's result must itself be a node.
+        """
+        super().__init__('Job', children, document_id=document_id)
+        self.future = future
+        self.on_complete = on_complete
+
+    def get_replacement(self):
+        """Returns the node that should take this one's place. Re-raises any
+        exception raised by the job."""
+        result = self.future.result()
+        if self.on_complete is None:
+            return result
+        else:
+            return self.on_complete(result)
+
+    def copy(self):
+        return CWJobNode(
+            self.future, self.on_complete, document_id=self.document_id)
+
+
+class CWSharedNode(CWNode):
+    """
+    name: `Shared`
+
+    Embeds a list of nodes that may be embedded in many places at once, like a
+    table of contents that appears on every page, without copying them.
+
+    The shared nodes are *not* this node's children: processors never see
+    them, and their parents and document IDs are left alone, so they should
+    already be in their final form. Writers output them as if they were this
+    node's children, resolving links relative to this node's document.
+
+    To change the contents of one embedding, use `CWTree.unshare()` to
+    replace it with a copy first.
+    """
+
+    def __init__(self, shared_children, document_id=None):
+        """
+        * `shared_children`: list of nodes to embed. Treat it as immutable.
+        """
+        super().__init__('Shared', [], document_id=document_id)
+        self.shared_children = shared_children
+
+    def get_string_for_test_comparison(self, inner_indentation=2):
+        elements = [super().get_string_for_test_comparison(inner_indentation)]
+        for child in self.shared_children:
+            inner_str = child.get_string_for_test_comparison(
+                inner_indentation + 2)
+            elements.append(' ' * inner_indentation + inner_str)
+        return '\n'.join(elements)
+
+    def copy(self):
+        return CWSharedNode(self.shared_children, document_id=self.document_id)
+
+    def __repr__(self):
+        return "{}(shared_children={!r})".format(
+            self.name, self.shared_children)
@@ -0,0 +1,375 @@
+"""
+The "shadow tree": an index of the order in which nodes appear in a
+`CWTree`, for answering questions like "which heading comes next?" without
+walking the tree.
+
+```python
+index = tree.get_order_index()
+index.precedes(node_a, node_b)
+index.find_next(node, names={'h1', 'h2'}, within=document_node)
+index.get_nodes_between('h2', node_a, node_b)
+```
+
+Every node gets an integer *label* that increases in document (preorder)
+order. Labels are spaced far apart, so new nodes can usually be given labels
+between their neighbors' without changing anything else. When there is no
+room left, everything is relabeled.
+
+For each node name, the index keeps a list of nodes sorted by label, so
+lookups by name are binary searches. Adding or removing a node is a binary
+search plus an insertion into or deletion from those Python lists, which
+moves every later entry, so updates take time linear in the size of the
+document. Moving the entries is a `memmove`, so even in a document with
+tens of thousands of nodes it is a small part of the cost of processing
+the node.
+
+Each child of the root (usually a document) has its own labels, which are
+only computed the first time a question is asked about a node inside it.
+Changes to a document only need to update that document's labels, and
+changes to documents nobody has asked about cost nothing.
+
+`CWTree` keeps its index up to date as long as the tree is only changed
+through its methods (`wrap_node()`, `replace_subtree()`, etc.).
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right
+
+from .traversal import preorder_traversal
+
+
+# distance between the labels of adjacent nodes after relabeling
+_GAP = 1 << 64
+
+
+def _get_last_descendant(node):
+    while node.children:
+        node = node.children[-1]
+    return node
+
+
+class _SortedNodes:
+    """Parallel lists of labels and nodes, sorted by label. Finding a label
+    is a binary search, but `add()` and `remove()` shift the later
+    entries."""
+
+    def __init__(self):
+        super().__init__()
+        self.labels = []
+        self.nodes = []
+
+    def add(self, label, node):
+        i = bisect_left(self.labels, label)
+        self.labels.insert(i, label)
+        self.nodes.insert(i, node)
+
+    def remove(self, label):
+        i = bisect_left(self.labels, label)
+        if i < len(self.labels) and self.labels[i] == label:
+            del self.labels[i]
+            del self.nodes[i]
+
+    def iterate_range(self, low, high):
+        """Yields `(label, node)` for labels in `(low, high]`. `None` means
+        no limit."""
+        i = 0 if low is None else bisect_right(self.labels, low)
+        j = (len(self.labels) if high is None
+             else bisect_right(self.labels, high))
+        for k in range(i, j):
+            yield self.labels[k], self.nodes[k]
+
+
+class _TopLevelOrder:
+    """Labels of one child of the root and its descendants"""
+
+    def __init__(self, top_node):
+        super().__init__()
+        self._relabel(list(preorder_traversal(top_node)))
+
+    def _relabel(self, nodes):
+        """Give every node in `nodes`, which is in document order, a new
+        label"""
+        # node ID -> label
+        self.labels = {}
+        self.all = _SortedNodes()
+        # node name -> _SortedNodes
+        self.by_name = {}
+        for i, node in enumerate(nodes):
+            label = (i + 1) * _GAP
+            self.labels[node.id] = label
+            self.all.labels.append(label)
+            self.all.nodes.append(node)
+            if node.name not in self.by_name:
+                self.by_name[node.name] = _SortedNodes()
+            by_name = self.by_name[node.name]
+            by_name.labels.append(label)
+            by_name.nodes.append(node)
+
+    def _remove(self, node):
+        label = self.labels.pop(node.id, None)
+        if label is not None:
+            self.all.remove(label)
+            self.by_name[node.name].remove(label)
+
+    def add_run(self, predecessor, nodes):
+        """Add `nodes`, which are in document order, immediately after
+        `predecessor`"""
+        for node in nodes:
+            if node.id in self.labels:
+                self._remove(node)
+        low = self.labels[predecessor.id]
+        i = bisect_right(self.all.labels, low)
+        if i < len(self.all.labels):
+            high = self.all.labels[i]
+        else:
+            high = low + _GAP * (len(nodes) + 1)
+        step = (high - low) // (len(nodes) + 1)
+        if step == 0:
+            self._relabel(self.all.nodes[:i] + nodes + self.all.nodes[i:])
+            return
+
+        labels = [low + step * (j + 1) for j in range(len(nodes))]
+        self.all.labels[i:i] = labels
+        self.all.nodes[i:i] = nodes
+        for label, node in zip(labels, nodes):
+            self.labels[node.id] = label
+            if node.name not in self.by_name:
+                self.by_name[node.name] = _SortedNodes()
+            self.by_name[node.name].add(label, node)
+
+    def remove_subtree(self, node):
+        # a subtree's labels are contiguous, so this needs no traversal
+        i = bisect_left(self.all.labels, self.labels[node.id])
+        j = bisect_right(
+            self.all.labels, self.labels[_get_last_descendant(node).id])
+        removed_nodes = self.all.nodes[i:j]
+        del self.all.labels[i:j]
+        del self.all.nodes[i:j]
+        for removed_node in removed_nodes:
+            label = self.labels.pop(removed_node.id)
+            self.by_name[removed_node.name].remove(label)
+
+    def replace_node(self, old_node, new_node):
+        label = self.labels.pop(old_node.id)
+        i = bisect_left(self.all.labels, label)
+        self.all.nodes[i] = new_node
+        self.by_name[old_node.name].remove(label)
+        self.labels[new_node.id] = label
+        if new_node.name not in self.by_name:
+            self.by_name[new_node.name] = _SortedNodes()
+        self.by_name[new_node.name].add(label, new_node)
+
+    def iterate_range(self, low, high, names):
+        """Yields nodes with labels in `(low, high]` in document order, only
+        those with the given names if `names` is not `None`"""
+        if names is None:
+            for _, node in self.all.iterate_range(low, high):
+                yield node
+        else:
+            for _, node in heapq.merge(*[
+                    self.by_name[name].iterate_range(low, high)
+                    for name in names if name in self.by_name]):
+                yield node
+
+
+class OrderIndex:
+    """
+    Keeps track of the document order of every node under `root`. Get one
+    from `CWTree.get_order_index()` rather than creating it yourself, so it
+    is kept up to date.
+
+    Nodes passed to the query methods must be in the tree.
+    """
+
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+        # ID of child of root -> _TopLevelOrder
+        self._top_level_orders = {}
+
+    def _get_top_level_node(self, node):
+        """Returns the child of the root that `node` is or is inside of, or
+        `None` if `node` is the root"""
+        if node is self.root:
+            return None
+        parent = node.get_parent()
+        while parent is not self.root:
+            if parent is None:
+                raise ValueError("{} is not in the tree".format(node))
+            node = parent
+            parent = node.get_parent()
+        return node
+
+    def _get_order(self, top_node):
+        order = self._top_level_orders.get(top_node.id)
+        if order is None:
+            order = _TopLevelOrder(top_node)
+            self._top_level_orders[top_node.id] = order
+        return order
+
+    def _get_existing_order(self, node):
+        """Returns the `_TopLevelOrder` that `node` belongs in, or `None` if
+        it hasn't been created yet"""
+        return self._top_level_orders.get(self._get_top_level_node(node).id)
+
+    ### keeping up to date ###
+
+    def _get_predecessor(self, node):
+        """Returns the node immediately before `node` in document order"""
+        parent = node.get_parent()
+        i = parent.index_of_child(node)
+        if i == 0:
+            return parent
+        return _get_last_descendant(parent.children[i - 1])
+
+    def add_node(self, node):
+        """Add `node`, but not its descendants, which must already be in the
+        index (used for `CWTree.wrap_node()`)"""
+        if node.get_parent() is self.root:
+            # its only child used to be a child of the root
+            self._top_level_orders.pop(node.children[0].id, None)
+            return
+        order = self._get_existing_order(node)
+        if order is not None:
+            order.add_run(self._get_predecessor(node), [node])
+
+    def add_subtree(self, node):
+        """Add `node` and its descendants, which must be in the tree"""
+        if node.get_parent() is self.root:
+            return
+        order = self._get_existing_order(node)
+        if order is not None:
+            order.add_run(
+                self._get_predecessor(node), list(preorder_traversal(node)))
+
+    def add_subtrees(self, nodes):
+        """Add `nodes`, which must be adjacent siblings in the tree, and
+        their descendants, all at once"""
+        if not nodes or nodes[0].get_parent() is self.root:
+            return
+        order = self._get_existing_order(nodes[0])
+        if order is not None:
+            order.add_run(
+                self._get_predecessor(nodes[0]),
+                [descendant
+                 for node in nodes for descendant in preorder_traversal(node)])
+
+    def replace_subtree(self, old_node, new_node):
+        """`new_node` and its descendants took `old_node`'s place"""
+        if new_node.get_parent() is self.root:
+            self._top_level_orders.pop(old_node.id, None)
+            return
+        order = self._get_existing_order(new_node)
+        if order is not None:
+            order.remove_subtree(old_node)
+            order.add_run(
+                self._get_predecessor(new_node),
+                list(preorder_traversal(new_node)))
+
+    def replace_node(self, old_node, new_node):
+        """`new_node` took `old_node`'s place and children"""
+        if new_node.get_parent() is self.root:
+            self._top_level_orders.pop(old_node.id, None)
+            return
+        order = self._get_existing_order(new_node)
+        if order is not None:
+            order.replace_node(old_node, new_node)
+
+    ### queries ###
+
+    def __contains__(self, node):
+        try:
+            top_node = self._get_top_level_node(node)
+        except ValueError:
+            return False
+        if top_node is None:
+            return True
+        try:
+            self.root.index_of_child(top_node)
+        except ValueError:
+            # removed from the tree
+            return False
+        return node.id in self._get_order(top_node).labels
+
+    def precedes(self, node_a, node_b):
+        """Returns `True` if `node_a` comes before `node_b` in document
+        order. Ancestors come before their descendants."""
+        if node_a is node_b:
+            return False
+        top_a = self._get_top_level_node(node_a)
+        top_b = self._get_top_level_node(node_b)
+        if top_a is None or top_b is None:
+            return top_a is None
+        if top_a is top_b:
+            labels = self._get_order(top_a).labels
+            return labels[node_a.id] < labels[node_b.id]
+        return (self.root.index_of_child(top_a) <
+                self.root.index_of_child(top_b))
+
+    def _iterate_after(self, node, names, end_node):
+        """Yields the nodes after `node`, up to and including `end_node` if
+        it is not `None`"""
+        if end_node is self.root:
+            return
+        start_top = self._get_top_level_node(node)
+        end_top = (
+            None if end_node is None
+            else self._get_top_level_node(end_node))
+        low = (
+            None if start_top is None
+            else self._get_order(start_top).labels[node.id])
+        high = (
+            None if end_top is None
+            else self._get_order(end_top).labels[end_node.id])
+        if start_top is not None and start_top is end_top:
+            # the usual case, which doesn't need to look at the other
+            # children of the root
+            yield from self._get_order(start_top).iterate_range(
+                low, high, names)
+            return
+
+        top_nodes = self.root.children
+        start_i = (
+            0 if start_top is None else self.root.index_of_child(start_top))
+        end_i = (
+            len(top_nodes) - 1 if end_top is None
+            else self.root.index_of_child(end_top))
+        for i in range(start_i, end_i + 1):
+            yield from self._get_order(top_nodes[i]).iterate_range(
+                low if i == start_i else None,
+                high if i == end_i else None,
+                names)
+
+    def iterate_after(self, node, names=None, within=None):
+        """
+        Yields the nodes after `node` in document order, including its
+        descendants.
+
+        * `names`: if not `None`, only yield nodes with these names
+        * `within`: if not `None`, stop after the last descendant of this
+          node
+        """
+        return self._iterate_after(
+            node, names,
+            None if within is None else _get_last_descendant(within))
+
+    def find_next(self, node, names=None, predicate=None, within=None):
+        """Returns the first node after `node` (see `iterate_after()`) for
+        which `predicate(node)` is true, or `None`"""
+        for found_node in self.iterate_after(node, names, within):
+            if predicate is None or predicate(found_node):
+                return found_node
+        return None
+
+    def get_descendants(self, node, names=None):
+        """Returns the descendants of `node` in document order, optionally
+        only those with the given names"""
+        return list(self.iterate_after(node, names, within=node))
+
+    def get_nodes_between(self, name, start_node, end_node):
+        """Returns the nodes named `name` after `start_node` and before
+        `end_node`, in document order"""
+        return [
+            node for node in self._iterate_after(start_node, [name], end_node)
+            if node is not end_node
+        ]
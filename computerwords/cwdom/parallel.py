@@ -0,0 +1,111 @@
+"""
+Process the documents of a tree in parallel, for `"parallel_processing"` in
+the config.
+
+```python
+apply_library_in_parallel(tree, library, job_runner, get_library)
+# or, on a free-threaded build of Python:
+apply_library_in_threads(tree, library, max_workers)
+```
+
+The processors declared with `document_local=True` (see
+`Library.processor()`) run on each document in `job_runner`'s process pool.
+Then the rest of the processors run on the whole tree in this process, with
+`CWTree.apply_library(scope='global')`. Nodes added by those get every
+processor, in this process.
+
+The output is the same as `tree.apply_library(library)`, as long as the
+document-local processors really only depend on their own document.
+
+`get_library(env)` must return a library with the same processors as
+`library`, configured with `env['config']`, and be picklable, like a
+module-level function or a `functools.partial` of one. Each worker process
+calls it once, with its own copy of `tree.env`, and keeps one
+`processor_data` for every document it processes. So document-local
+processors can use `processor_data` as a cache, but anything they put there
+isn't seen by other processes or by the rest of the processors.
+
+`apply_library_in_threads()` does the same with threads that process the
+documents in place, without copying them. Each thread has its own
+`processor_data`, like each process. Threads only run at the same time on a
+free-threaded build of Python (see `get_is_gil_enabled()`); otherwise,
+this is slower than `tree.apply_library()`.
+"""
+
+import pickle
+import sys
+import threading
+
+from .CWTree import CWTree
+from .nodes import CWRootNode
+from .serialization import dumps_tree, loads_tree
+
+
+# pickled (get_library, env) -> (library, env, processor_data), in worker
+# processes
+_worker_states = {}
+
+
+def apply_library_in_parallel(
+        tree, library, job_runner, get_library, initial_data=None):
+    """Like `tree.apply_library(library, initial_data)`, but runs the
+    document-local processors of each document in `job_runner`'s process
+    pool"""
+    # the env is sent with the library, and only unpickled once per process
+    state_key = pickle.dumps((get_library, tree.env), pickle.HIGHEST_PROTOCOL)
+    futures = [
+        job_runner.submit(
+            _process_document, state_key,
+            dumps_tree(CWTree(document_node)), use_processes=True)
+        for document_node in tree.root.children]
+    tree.root.set_children([
+        loads_tree(future.result(), new_ids=True).root
+        for future in futures])
+    tree.apply_library(library, initial_data, scope='global')
+
+
+def _process_document(state_key, data):
+    """Runs in a worker process"""
+    if state_key not in _worker_states:
+        get_library, env = pickle.loads(state_key)
+        _worker_states[state_key] = (get_library(env), env, {})
+    library, env, processor_data = _worker_states[state_key]
+
+    document_node = loads_tree(data).root
+    CWTree(CWRootNode([document_node]), env).apply_library(
+        library, processor_data, scope='document_local')
+    return dumps_tree(CWTree(document_node))
+
+
+def apply_library_in_threads(
+        tree, library, max_workers=None, initial_data=None):
+    """Like `tree.apply_library(library, initial_data)`, but runs the
+    document-local processors of each document in a pool of `max_workers`
+    threads"""
+    # concurrent.futures is imported here for the same reason as in
+    # computerwords.cwdom.jobs
+    from concurrent.futures import ThreadPoolExecutor
+
+    thread_data = threading.local()
+
+    def process_document(document_node):
+        if not hasattr(thread_data, 'processor_data'):
+            thread_data.processor_data = {}
+        tree.apply_library(
+            library, thread_data.processor_data, scope='document_local',
+            node=document_node)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(process_document, document_node)
+            for document_node in list(tree.root.children)]
+        for future in futures:
+            future.result()
+    tree.apply_library(library, initial_data, scope='global')
+
+
+def get_is_gil_enabled():
+    """Returns `False` if this is a free-threaded build of Python with the
+    GIL turned off, so threads can run Python code at the same time"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is None or is_gil_enabled()
@@ -0,0 +1,154 @@
+"""
+Save and load processed `CWTree`s, so that processing and writing can happen
+in different processes or different builds.
+
+```python
+from computerwords.cwdom.serialization import dump_tree, load_tree
+
+tree.apply_library(library)
+dump_tree(tree, 'tree.cwt')
+# later, maybe somewhere else
+tree = load_tree('tree.cwt')
+```
+
+The tree is stored with its node classes, node IDs, `kwargs`, `data`, and
+`processor_data`, so writers can use it as if it had just been processed.
+Values in `data` and `processor_data` that can't be pickled, like open
+files, are left out. Node classes must be importable where the tree is
+loaded.
+
+The format is `b'CWT1'` followed by zlib-compressed pickles. Only load trees
+you created yourself; like any pickle, a malicious file can run code.
+"""
+
+import io
+import logging
+import pickle
+import zlib
+
+from .CWTree import CWTree
+from .nodes import _id_generator
+
+
+log = logging.getLogger(__name__)
+
+
+MAGIC = b'CWT1'
+
+_PICKLE_ERRORS = (pickle.PicklingError, TypeError, AttributeError)
+
+
+class CWTreeSerializationError(Exception):
+    """Error thrown when data can't be loaded as a `CWTree`"""
+
+
+def dumps_tree(tree):
+    """Returns `tree` as `bytes`"""
+    nodes = list(tree.preorder_traversal())
+    node_indices = {id(node): i for i, node in enumerate(nodes)}
+    processor_data = getattr(tree, 'processor_data', {})
+
+    def get_node_states(filter_data):
+        for node in nodes:
+            # __getstate__() turns memory-mapped text into plain text
+            state = node.__getstate__()
+            del state['parent_weakref']
+            if filter_data and node.data:
+                state['data'] = _get_picklable_dict(
+                    node.data, node_indices, node.id)
+            yield state
+
+    try:
+        return _dumps(
+            nodes, node_indices, list(get_node_states(False)),
+            processor_data)
+    except _PICKLE_ERRORS:
+        # try again without the values that can't be pickled
+        return _dumps(
+            nodes, node_indices, list(get_node_states(True)),
+            _get_picklable_dict(processor_data, node_indices, 'tree'))
+
+
+def loads_tree(data, env=None, new_ids=False):
+    """
+    Returns the `CWTree` stored in `data` by `dumps_tree()`. If `new_ids` is
+    `True`, the nodes get new IDs, which you need if the tree was changed in
+    another process, where new nodes may have gotten the same IDs as nodes
+    in this one.
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise CWTreeSerializationError("Not a serialized CWTree")
+    stream = io.BytesIO(zlib.decompress(data[len(MAGIC):]))
+
+    # create every node first so the states can refer to each other. nodes
+    # get their IDs right away so they can be hashed.
+    nodes = []
+    for cls, node_id in pickle.Unpickler(stream).load():
+        node = cls.__new__(cls)
+        if new_ids:
+            node_id = node_id.rsplit(':', 1)[0] + ':' + str(
+                _id_generator.get_id())
+        node.id = node_id
+        nodes.append(node)
+
+    # node states and processor_data are separate pickles so the nodes are
+    # complete before processor_data is loaded, but share a memo so objects
+    # referred to by both are still shared
+    unpickler = pickle.Unpickler(stream)
+    unpickler.persistent_load = nodes.__getitem__
+    for node, state in zip(nodes, unpickler.load()):
+        if new_ids:
+            del state['id']
+        node.__dict__.update(state)
+        node.parent_weakref = None
+    for node in nodes:
+        node.claim_children()
+        _id_generator.reserve(node.id)
+    processor_data = unpickler.load()
+
+    tree = CWTree(nodes[0], env=env)
+    tree.processor_data = processor_data
+    return tree
+
+
+def dump_tree(tree, path):
+    """Write `tree` to the file at `path`"""
+    with open(str(path), 'wb') as f:
+        f.write(dumps_tree(tree))
+
+
+def load_tree(path, env=None):
+    """Returns the `CWTree` in the file at `path`"""
+    with open(str(path), 'rb') as f:
+        return loads_tree(f.read(), env=env)
+
+
+def _get_pickler(stream, node_indices):
+    pickler = pickle.Pickler(stream, pickle.HIGHEST_PROTOCOL)
+    # nodes in the tree are stored once, in the node table, and referred to
+    # by index everywhere else
+    pickler.persistent_id = lambda obj: node_indices.get(id(obj))
+    return pickler
+
+
+def _dumps(nodes, node_indices, node_states, processor_data):
+    stream = io.BytesIO()
+    pickle.Pickler(stream, pickle.HIGHEST_PROTOCOL).dump(
+        [(type(node), node.id) for node in nodes])
+    pickler = _get_pickler(stream, node_indices)
+    pickler.dump(node_states)
+    pickler.dump(processor_data)
+    return MAGIC + zlib.compress(stream.getvalue())
+
+
+def _get_picklable_dict(d, node_indices, owner):
+    result = {}
+    for k, v in d.items():
+        try:
+            _get_pickler(io.BytesIO(), node_indices).dump((k, v))
+        except _PICKLE_ERRORS as e:
+            log.debug("Not saving {!r} of {}: {}".format(k, owner, e))
+        else:
+            result[k] = v
+    return result
+
@@ -0,0 +1,230 @@
+"""
+Process and write a site without keeping every document in memory at once,
+for `"spill_documents": true` in the config.
+
+```python
+spill = DocumentSpill(library, env, pathlib.Path(temp_dir))
+for document_node in document_nodes:  # can be a generator that parses them
+    spill.add_document(document_node)
+tree = spill.apply_library()
+for document_node in tree.root.children:
+    # each document is read back from disk when it is needed
+    ...
+```
+
+Only the document that was read most recently is kept, so iterate over
+`tree.root.children` once rather than indexing it repeatedly.
+`tree.get_document_path()` and `tree.root.index_of_child()` are answered
+from the skeletons (see below) without reading any documents, but order
+index queries that cross documents read each document they cross.
+
+Processing is split in two:
+
+1. `add_document()` runs the processors declared with `document_local=True`
+   (see `Library.processor()`) on the document by itself. Then it keeps a
+   *skeleton* of the document and writes the rest to a file with
+   `computerwords.cwdom.serialization`. The skeleton is the `Document` node,
+   the whole subtree of each node that has a processor that isn't
+   document-local, like headings, anchors, and `table-of-contents`, and the
+   nodes in between.
+2. `apply_library()` runs the other processors on a tree of the
+   skeletons, in the same order as `CWTree.apply_library()` would on the
+   whole site, and records the changes in a `MutationJournal`. Nodes they
+   add get every processor. When a document of the returned tree is
+   read back, the changes to the structure of its skeleton are replayed
+   onto it. Processors also change nodes in place, like `node.data`,
+   `node.kwargs`, or `node.text`, which the journal doesn't record, so
+   then every node that is in the skeleton gets all the attributes of its
+   skeleton node except its children.
+
+So the memory needed depends on the largest document and on the skeletons,
+which are about the size of the table of contents, and not on the size of
+the whole site.
+
+Processors that aren't document-local only see the skeleton. Nodes above
+the subtrees they run on, including `Document` nodes, are missing any
+children that aren't in the skeleton, so inserting a child into one of them
+by index raises `CWTreeConsistencyError`.
+"""
+
+import logging
+from collections.abc import Sequence
+
+from .CWTree import CWTree, CWTreeConsistencyError
+from .journal import MutationJournal, _clone, _get_attributes
+from .nodes import CWRootNode
+from .serialization import dump_tree, load_tree
+from .traversal import preorder_traversal
+
+
+log = logging.getLogger(__name__)
+
+
+class DocumentSpill:
+    """
+    Runs `library` on documents added with `add_document()`, keeping them
+    in files in the existing directory `directory` (a `pathlib.Path`)
+    between processing and writing. `env` is the `CWTree.env` of every tree
+    made from them.
+    """
+
+    def __init__(self, library, env, directory):
+        super().__init__()
+        self.library = library
+        self.env = env
+        self.directory = directory
+        self.processor_data = {}
+        self._paths = []
+        self._skeletons = []
+        # IDs of skeleton nodes that are missing some of their children
+        self._partial_ids = set()
+
+    def add_document(self, document_node):
+        """Run the document-local processors on `document_node`, then keep
+        its skeleton and write it to a file"""
+        tree = CWTree(CWRootNode([document_node]), self.env)
+        tree.apply_library(
+            self.library, self.processor_data, scope='document_local')
+
+        global_tag_names = self.library.get_global_tag_names()
+        if global_tag_names is None:
+            log.warning(
+                "A processor for every node isn't document-local, so whole"
+                " documents are kept in memory")
+        skeleton = _clone(document_node, False)
+        skeleton.set_children(self._get_skeletons(
+            document_node.children, global_tag_names))
+        if len(skeleton.children) != len(document_node.children):
+            self._partial_ids.add(skeleton.id)
+        self._skeletons.append(skeleton)
+
+        path = self.directory / '{}.cwt'.format(len(self._paths))
+        dump_tree(CWTree(document_node), path)
+        self._paths.append(path)
+
+    def _get_skeletons(self, nodes, global_tag_names):
+        """Returns copies, with the same IDs, of the parts of `nodes` and
+        their subtrees that are in the skeleton"""
+        skeletons = []
+        for node in nodes:
+            if global_tag_names is None or node.name in global_tag_names:
+                skeletons.append(_clone(node, True))
+                continue
+            children = self._get_skeletons(node.children, global_tag_names)
+            if children:
+                skeleton = _clone(node, False)
+                skeleton.set_children(children)
+                if len(children) != len(node.children):
+                    self._partial_ids.add(node.id)
+                skeletons.append(skeleton)
+        return skeletons
+
+    def apply_library(self):
+        """
+        Run the processors that aren't document-local on the skeletons of
+        every document added so far, and return a `CWTree` whose root's
+        children are read from their files each time they are accessed.
+        Its `processor_data` and `rounds_per_phase` come from processing the
+        skeletons.
+        """
+        skeleton_tree = CWTree(CWRootNode(self._skeletons), self.env)
+        skeleton_tree.journal = _SkeletonJournal(self._partial_ids)
+        skeleton_tree.apply_library(
+            self.library, self.processor_data, scope='global')
+
+        journals = {}
+        for entry in skeleton_tree.journal:
+            journals.setdefault(
+                entry.document_id, MutationJournal()).entries.append(entry)
+        skeleton_nodes = {
+            node.id: node for node in skeleton_tree.preorder_traversal()}
+
+        root = _SpilledRootNode()
+        root.children = _SpilledDocuments(
+            root, self._paths, skeleton_tree.root.children, journals,
+            skeleton_nodes)
+        tree = _SpilledTree(root, self.env)
+        tree.processor_data = skeleton_tree.processor_data
+        tree.rounds_per_phase = skeleton_tree.rounds_per_phase
+        return tree
+
+
+class _SkeletonJournal(MutationJournal):
+    def __init__(self, partial_ids):
+        super().__init__()
+        self.partial_ids = partial_ids
+
+    def record(self, operation, document_id, target_node, nodes, index=None,
+               with_children=True):
+        if operation == 'insert_subtree' and target_node.id in self.partial_ids:
+            raise CWTreeConsistencyError((
+                "Can't insert a child into {!r} because only part of its"
+                " document is in memory. Set \"spill_documents\" to false,"
+                " or declare the processors of {!r} with"
+                " document_local=True.").format(
+                    target_node, target_node.name))
+        super().record(
+            operation, document_id, target_node, nodes, index=index,
+            with_children=with_children)
+
+
+class _SpilledTree(CWTree):
+    def get_document_path(self, document_id):
+        for skeleton in self.root.children.skeletons:
+            if skeleton.document_id == document_id:
+                return skeleton.path
+        return None
+
+
+class _SpilledRootNode(CWRootNode):
+    def index_of_child(self, child):
+        # the same document may be read more than once, so compare document
+        # IDs instead of identity
+        if child.get_parent() is self:
+            for i, skeleton in enumerate(self.children.skeletons):
+                if skeleton.document_id == child.document_id:
+                    return i
+        raise ValueError("{} is not a child of {}".format(child, self))
+
+
+class _SpilledDocuments(Sequence):
+    """The children of the root of a spilled tree. Each document is read
+    from its file, and has its skeleton's changes applied, when it is
+    accessed. Only the last one read is kept."""
+
+    def __init__(self, root, paths, skeletons, journals, skeleton_nodes):
+        super().__init__()
+        self.root = root
+        self.paths = paths
+        # the processed skeletons of the documents, in the same order
+        self.skeletons = skeletons
+        self.journals = journals
+        self.skeleton_nodes = skeleton_nodes
+        self._last_read = (None, None)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("document index out of range")
+        last_i, last_document_node = self._last_read
+        if i == last_i:
+            return last_document_node
+        document_tree = load_tree(self.paths[i])
+        document_node = document_tree.root
+        journal = self.journals.get(document_node.document_id)
+        if journal is not None:
+            journal.replay(document_tree)
+        for node in preorder_traversal(document_node):
+            skeleton_node = self.skeleton_nodes.get(node.id)
+            if skeleton_node is not None:
+                node.__dict__.update(_get_attributes(skeleton_node))
+        document_node.set_parent(self.root)
+        self._last_read = (i, document_node)
+        return document_node
+
@@ -43,6 +43,47 @@ def postorder_traversal(node) -> "iterator(CWNode)":
                 stack.append((node.children[i], 'add_children'))
 
 
+def sort_postorder(nodes, root) -> "list(CWNode)":
+    """
+    Returns the nodes in *nodes* that are in *root*'s subtree, in the order
+    `postorder_traversal(root)` would yield them. Only walks up from each node
+    to *root*, so sorting a few nodes of a big tree is much faster than
+    traversing it.
+    """
+    # id(parent) -> {id(child): index of child}
+    child_indices = {}
+    # id(node) -> tuple of child indices from root, or None if not under root
+    paths = {id(root): ()}
+    keyed_nodes = []
+    for node in nodes:
+        chain = []
+        ancestor = node
+        while ancestor is not None and id(ancestor) not in paths:
+            chain.append(ancestor)
+            ancestor = ancestor.get_parent()
+        path = None if ancestor is None else paths[id(ancestor)]
+        for descendant in reversed(chain):
+            if path is not None:
+                parent = descendant.get_parent()
+                indices = child_indices.get(id(parent))
+                if indices is None:
+                    indices = {
+                        id(child): i for i, child in enumerate(parent.children)}
+                    child_indices[id(parent)] = indices
+                i = indices.get(id(descendant))
+                path = None if i is None else path + (i,)
+            paths[id(descendant)] = path
+        if path is not None:
+            # a node comes after its descendants, whose paths continue with
+            # a child index
+            keyed_nodes.append((path + (_AFTER_CHILDREN,), node))
+    keyed_nodes.sort(key=lambda keyed_node: keyed_node[0])
+    return [node for _, node in keyed_nodes]
+
+
+_AFTER_CHILDREN = float('inf')
+
+
 def iterate_ancestors(node):
     """
     Yields every ancestor of a node, starting with its immediate parent.
@@ -81,9 +122,11 @@ def find_ancestor(node, predicate):
 
 def visit_tree(tree, node_name_to_visitor, node=None, handle_error=None):
     """
-    Recursively call the `CWTreeVisitor` for each node. If a node
-    is encountered that has no corresponding visitor, `MissingVisitorError` is
-    thrown.
+    Call the `CWTreeVisitor` for each node. If a node is encountered that has
+    no corresponding visitor, `MissingVisitorError` is thrown.
+
+    Uses an explicit stack instead of recursion, so arbitrarily deep trees
+    can be visited.
 
     ```python
     from computerwords.cwdom.CWTree import CWTree
@@ -108,25 +151,33 @@ def visit_tree(tree, node_name_to_visitor, node=None, handle_error=None):
     assert visits == ['pre-x', 'pre-y', 'post-y', 'post-x']
     ```
     """
-    node = node or tree.root
-    visitor = None
-    try:
-        visitor = node_name_to_visitor[node.name]
-    except KeyError:
-        if handle_error is None:
-            raise MissingVisitorError(node)
-        else:
-            handle_error(node)
-
-    if visitor is not None:
-        visitor.before_children(tree, node)
-
-    for child in node.children:
-        visit_tree(
-            tree, node_name_to_visitor, node=child, handle_error=handle_error)
-
-    if visitor is not None:
-        visitor.after_children(tree, node)
+    # Each entry is either a node to visit or a (visitor, node) tuple whose
+    # after_children() is due.
+    stack = [node or tree.root]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+    get_visitor = node_name_to_visitor.get
+    while stack:
+        item = pop()
+        if type(item) is tuple:
+            item[0].after_children(tree, item[1])
+            continue
+
+        visitor = get_visitor(item.name, _MISSING)
+        if visitor is _MISSING:
+            if handle_error is None:
+                raise MissingVisitorError(item)
+            handle_error(item)
+            visitor = None
+
+        if visitor is not None:
+            visitor.before_children(tree, item)
+            push((visitor, item))
+        extend(reversed(item.children))
+
+
+_MISSING = object()
 
 
 class MissingVisitorError(Exception):
@@ -166,15 +217,25 @@ class PostorderTraverser:
 
     You may safely mutate the cursor's ancestors, since they haven't been
     visited yet.
+
+    Only `node`'s subtree is visited, even if it has a parent.
     """
 
     def __init__(self, node):
         super().__init__()
         self.cursor = node
+        self.root = node
         self._is_first_result = True
+        # (node, index in parent's children) for nodes on the path to the
+        # cursor. only a hint: if the tree was mutated, it is recomputed.
+        self._child_indices = []
 
     def replace_cursor(self, new_cursor):
         """Only use this if you really know what you are doing."""
+        if self._child_indices and self._child_indices[-1][0] is self.cursor:
+            self._child_indices[-1] = (new_cursor, self._child_indices[-1][1])
+        if self.cursor is self.root:
+            self.root = new_cursor
         self.cursor = new_cursor
 
     def __iter__(self):
@@ -186,18 +247,26 @@ class PostorderTraverser:
             self._is_first_result = False
         else:
             parent = self.cursor.get_parent()
-            if not parent:
+            if not parent or self.cursor is self.root:
                 raise StopIteration()
 
-            child_i = parent.children.index(self.cursor)
+            child_i = -1
+            if (self._child_indices and
+                    self._child_indices[-1][0] is self.cursor):
+                child_i = self._child_indices.pop()[1]
+            if not (0 <= child_i < len(parent.children) and
+                    parent.children[child_i] is self.cursor):
+                child_i = parent.index_of_child(self.cursor)
             next_child_i = child_i + 1
             if next_child_i >= len(parent.children):
                 self.cursor = parent
             else:
                 self.cursor = parent.children[next_child_i]
+                self._child_indices.append((self.cursor, next_child_i))
                 self._descend()
         return self.cursor
 
     def _descend(self):
         while self.cursor.children:
             self.cursor = self.cursor.children[0]
+            self._child_indices.append((self.cursor, 0))
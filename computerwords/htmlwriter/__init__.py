@@ -1,17 +1,19 @@
 import logging
 import pathlib
-from io import StringIO
 
 import computerwords  # to get the module root path
 from computerwords.cwdom.nodes import (
     CWDocumentLinkNode,
+    CWSharedNode,
     CWTagNode,
     CWTextNode,
 )
-from computerwords.cwdom.traversal import visit_tree, preorder_traversal
-from .visitors import get_tag_to_visitor
+from computerwords.cwdom.traversal import preorder_traversal
+from .visitors import compile_tag_to_visitor, get_tag_to_visitor, write_tree
 from .util import (
     SINGLE_PAGE_TEMPLATE_PATH,
+    HrefTable,
+    ListStream,
     copy_files,
     doc_to_href,
     read_htmlwriter_options,
@@ -30,16 +32,22 @@ def _handle_visit_error(node):
         ).format(node))
 
 
-def _get_subtree_html(config, options, library, tree, node=None):
-    stream = StringIO()
-    visit_tree(
-        tree, get_tag_to_visitor(library, stream, options),
+def _get_subtree_html(
+        config, options, library, tree, node=None, fragment_cache=None,
+        href_table=None):
+    stream = ListStream()
+    write_tree(
+        tree,
+        compile_tag_to_visitor(get_tag_to_visitor(
+            library, stream, options, handle_error=_handle_visit_error,
+            fragment_cache=fragment_cache, href_table=href_table)),
         node=node, handle_error=_handle_visit_error)
     return stream.getvalue()
 
 
 def _get_nav_html_part(
-        config, options, library, tree, document_node, is_prev=False):
+        config, options, library, tree, document_node, is_prev=False,
+        fragment_cache=None, href_table=None):
     entry_key = 'nav_previous_entry' if is_prev else 'nav_next_entry'
     if entry_key not in document_node.data:
         return ''
@@ -53,17 +61,30 @@ def _get_nav_html_part(
         css_class = 'next-page'
         text = CWTextNode(' &rarr;', escape=False)
 
+    # the heading is already written out, so embed its children instead of
+    # copying them
+    heading_children = CWSharedNode(entry.heading_node.children)
+    link_children = (
+        [text, heading_children] if is_prev else [heading_children, text])
     node = CWTagNode('nav', {'class': css_class}, [
-        CWDocumentLinkNode(entry.heading_node.document_id, [
-            text
-        ]).deepcopy_children_from(entry.heading_node, at_end=is_prev)
+        CWDocumentLinkNode(entry.heading_node.document_id, link_children)
     ])
     node.deep_set_document_id(document_node.document_id)
-    return _get_subtree_html(config, options, library, tree, node)
-
-
-def write_document(config, options, output_dir, library, tree, document_node):
-    body = _get_subtree_html(config, options, library, tree, document_node)
+    return _get_subtree_html(
+        config, options, library, tree, node, fragment_cache=fragment_cache,
+        href_table=href_table)
+
+
+def write_document(config, options, output_dir, library, tree, document_node,
+                   fragment_cache=None, href_table=None):
+    """
+    * `fragment_cache`: dict shared by all calls for the same tree, used to
+      write each shared subtree once per directory
+    * `href_table`: `HrefTable` shared by all calls for the same tree
+    """
+    body = _get_subtree_html(
+        config, options, library, tree, document_node,
+        fragment_cache=fragment_cache, href_table=href_table)
 
     output_path = output_dir
     for directory in document_node.document_id[:-1]:
@@ -73,9 +94,11 @@ def write_document(config, options, output_dir, library, tree, document_node):
 
     nav_html = (
         _get_nav_html_part(
-            config, options, library, tree, document_node, is_prev=True) +
+            config, options, library, tree, document_node, is_prev=True,
+            fragment_cache=fragment_cache, href_table=href_table) +
         _get_nav_html_part(
-            config, options, library, tree, document_node, is_prev=False))
+            config, options, library, tree, document_node, is_prev=False,
+            fragment_cache=fragment_cache, href_table=href_table))
 
 
     ctx = {k: v for k, v in config.items()}
@@ -110,12 +133,21 @@ def write_document(config, options, output_dir, library, tree, document_node):
 
 
 def write_multi_page(config, options, output_dir, library, tree):
+    fragment_cache = {}
+    href_table = HrefTable(options)
     for document_node in tree.root.children:
-        write_document(config, options, output_dir, library, tree, document_node)
+        write_document(
+            config, options, output_dir, library, tree, document_node,
+            fragment_cache=fragment_cache, href_table=href_table)
 
 
 def write_single_page(config, options, output_dir, library, tree):
-    body = _get_subtree_html(config, options, library, tree)
+    # one document at a time, so spilled documents (see
+    # `computerwords.cwdom.spill`) aren't all loaded at once. the root node
+    # itself writes nothing.
+    body = ''.join(
+        _get_subtree_html(config, options, library, tree, document_node)
+        for document_node in tree.root.children)
 
     output_path = output_dir / "index.html"
     output_path.touch()
@@ -41,14 +41,16 @@ def find_path_between(a, b):
         return ''
 
 
-def doc_to_href(options, link_node, target_doc_id):
+def doc_to_href(options, link_node, target_doc_id, link_document_id=None):
+    link_document_id = link_document_id or link_node.document_id
     if options.single_page: return ''  # probably not used...
-    if link_node.document_id == target_doc_id: return ''
+    if link_document_id == target_doc_id: return ''
 
-    return find_path_between(link_node.document_id, target_doc_id)
+    return find_path_between(link_document_id, target_doc_id)
 
 
-def anchor_to_href(options, link_node, anchor_node):
+def anchor_to_href(options, link_node, anchor_node, link_document_id=None):
+    link_document_id = link_document_id or link_node.document_id
     if options.single_page:
         name = "{}-{}".format(
                 '/'.join(anchor_node.document_id), anchor_node.ref_id)
@@ -62,20 +64,98 @@ def anchor_to_href(options, link_node, anchor_node):
             return name
         else:
             return "{}#{}".format(
-                find_path_between(link_node.document_id, anchor_node.document_id),
+                find_path_between(link_document_id, anchor_node.document_id),
                 anchor_node.ref_id)
 
 
+class HrefTable:
+    """
+    Remembers relative paths between documents, and where each anchor is, so
+    that writing a link is a couple of dict lookups instead of a walk over
+    both document IDs. Use one per build.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        # (link document ID, target document ID) -> href
+        self._doc_hrefs = {}
+        # ref_id -> (target document ID, '#' + name)
+        self._anchor_fragments = {}
+
+    def doc_to_href(self, link_document_id, target_doc_id):
+        """Like `doc_to_href()`, for a link in `link_document_id`"""
+        key = (link_document_id, target_doc_id)
+        try:
+            return self._doc_hrefs[key]
+        except KeyError:
+            href = doc_to_href(
+                self.options, None, target_doc_id, link_document_id)
+            self._doc_hrefs[key] = href
+            return href
+
+    def anchor_to_href(self, link_document_id, anchor_node):
+        """Like `anchor_to_href()`, for a link (not the anchor itself) in
+        `link_document_id`"""
+        try:
+            target_doc_id, fragment = self._anchor_fragments[
+                anchor_node.ref_id]
+        except KeyError:
+            target_doc_id = anchor_node.document_id
+            fragment = anchor_to_href(
+                self.options, None, anchor_node, target_doc_id)
+            self._anchor_fragments[anchor_node.ref_id] = (
+                target_doc_id, fragment)
+        if self.options.single_page:
+            return fragment
+        return self.doc_to_href(link_document_id, target_doc_id) + fragment
+
+
 def doc_id_to_single_page_anchor_name(doc_id):
     return 'doc-' + '-'.join(doc_id)
 
 
 def html_attrs_to_string(kwargs):
-    args_str_items = []
-    for k, v in kwargs.items():
-        # TODO: escape the value properly?
-        args_str_items.append(" {}='{}'".format(k, v))
-    return ''.join(args_str_items)
+    return _attr_items_to_string(kwargs.items())
+
+
+def _attr_items_to_string(items):
+    return ''.join(
+        " " + str(k) + "='" + html.escape(str(v)) + "'" for k, v in items)
+
+
+# (tag name, attribute items) or tag name -> open tag string
+_open_tag_cache = {}
+_OPEN_TAG_CACHE_MAX_SIZE = 4096
+
+
+def open_tag_to_string(tag_name, kwargs):
+    """Returns `'<tag_name attr='value'...>'`. Tags with the same name and
+    attributes, like every `<li>` in a table of contents, are only
+    rendered once."""
+    key = (tag_name, tuple(kwargs.items())) if kwargs else tag_name
+    try:
+        return _open_tag_cache[key]
+    except KeyError:
+        pass
+    except TypeError:  # unhashable attribute value
+        return '<' + tag_name + html_attrs_to_string(kwargs) + '>'
+    open_tag = '<' + tag_name + html_attrs_to_string(kwargs) + '>'
+    if len(_open_tag_cache) >= _OPEN_TAG_CACHE_MAX_SIZE:
+        _open_tag_cache.clear()
+    _open_tag_cache[key] = open_tag
+    return open_tag
+
+
+class ListStream:
+    """Output stream that is faster than `io.StringIO` for many small
+    writes"""
+
+    def __init__(self):
+        self.parts = []
+        self.write = self.parts.append
+
+    def getvalue(self):
+        return ''.join(self.parts)
 
 
 def copy_files(in_out_path_pairs):
@@ -1,30 +1,125 @@
 import html
 
-from computerwords.cwdom.traversal import CWTreeVisitor
+from computerwords.cwdom.traversal import CWTreeVisitor, MissingVisitorError
 
 from .util import (
+    HrefTable,
     anchor_to_href,
     doc_id_to_single_page_anchor_name,
-    doc_to_href,
     html_attrs_to_string,
+    open_tag_to_string,
 )
 
 
-def get_tag_to_visitor(library, stream, options):
+def get_tag_to_visitor(library, stream, options, handle_error=None,
+                       fragment_cache=None, document_id=None,
+                       href_table=None):
+    """
+    * `fragment_cache`: if not `None`, a dict in which to cache the HTML of
+      `CWSharedNode`s for reuse in other documents
+    * `document_id`: document ID to write links relative to, instead of each
+      link's own
+    * `href_table`: `HrefTable` to share between calls for the same tree
+    """
+    href_table = href_table or HrefTable(options)
     tag_to_visitor = {
         tag: TagVisitor(options, stream, tag)
         for tag in library.HTML_TAGS | set(library.ALIAS_HTML_TAGS.keys())
     }
+    # document IDs of the CWSharedNodes being written, innermost last
+    document_ids = [] if document_id is None else [document_id]
     tag_to_visitor['Root'] = CWTreeVisitor()  # no-op
     tag_to_visitor['Empty'] = CWTreeVisitor()  # no-op
     tag_to_visitor['Document'] = DocumentVisitor(options, stream)
     tag_to_visitor['Text'] = TextVisitor(options, stream, 'Text')
     tag_to_visitor['Anchor'] = AnchorVisitor(options, stream)
-    tag_to_visitor['Link'] = LinkVisitor(options, stream)
-    tag_to_visitor['DocumentLink'] = DocumentLinkVisitor(options, stream)
+    tag_to_visitor['Link'] = LinkVisitor(
+        options, stream, document_ids, href_table)
+    tag_to_visitor['DocumentLink'] = DocumentLinkVisitor(
+        options, stream, document_ids, href_table)
+    tag_to_visitor['Shared'] = SharedVisitor(
+        options, stream, document_ids, href_table, tag_to_visitor,
+        handle_error, library, fragment_cache)
     return tag_to_visitor
 
 
+# kinds of entries in compile_tag_to_visitor() tables
+_NOOP = 0
+_TAG = 1
+_TEXT = 2
+_OTHER = 3
+
+
+def compile_tag_to_visitor(tag_to_visitor):
+    """
+    Returns a table for `write_tree()`. Built-in `TagVisitor`s and
+    `TextVisitor`s are replaced by the data needed to write their nodes
+    directly, and no-op visitors are dropped. Everything else, including
+    subclasses of the built-in visitors, is called normally.
+    """
+    compiled = {}
+    for name, visitor in tag_to_visitor.items():
+        visitor_type = type(visitor)
+        if visitor is None or visitor_type is CWTreeVisitor:
+            compiled[name] = (_NOOP,)
+        elif visitor_type is TagVisitor:
+            compiled[name] = (
+                _TAG, visitor.tag_name,
+                (visitor.output_stream.write, visitor.close_tag))
+        elif visitor_type is TextVisitor:
+            compiled[name] = (_TEXT, visitor.output_stream.write)
+        else:
+            compiled[name] = (_OTHER, visitor)
+    return compiled
+
+
+def write_tree(tree, compiled, node=None, handle_error=None):
+    """
+    Same as `visit_tree(tree, tag_to_visitor, node, handle_error)`, but takes
+    `compile_tag_to_visitor(tag_to_visitor)` and writes tag and text nodes
+    without calling their visitors.
+    """
+    # Each entry is either a node to visit, a (write, close tag) tuple, or a
+    # (visitor, node) list whose after_children() is due.
+    stack = [node or tree.root]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+    get_entry = compiled.get
+    escape = html.escape
+    while stack:
+        item = pop()
+        item_type = type(item)
+        if item_type is tuple:
+            item[0](item[1])
+            continue
+        elif item_type is list:
+            item[0].after_children(tree, item[1])
+            continue
+
+        entry = get_entry(item.name)
+        if entry is None:
+            if handle_error is None:
+                raise MissingVisitorError(item)
+            handle_error(item)
+            extend(reversed(item.children))
+            continue
+
+        kind = entry[0]
+        if kind is _TAG:
+            close = entry[2]
+            close[0](open_tag_to_string(entry[1], item.kwargs))
+            push(close)
+        elif kind is _TEXT:
+            entry[1](escape(item.text) if item.escape else item.text)
+        elif kind is _OTHER:
+            visitor = entry[1]
+            visitor.before_children(tree, item)
+            push([visitor, item])
+        if item.children:
+            extend(reversed(item.children))
+
+
 class WritingVisitor(CWTreeVisitor):
     def __init__(self, options, output_stream):
         super().__init__()
@@ -36,13 +131,14 @@ class TagVisitor(WritingVisitor):
     def __init__(self, options, output_stream, tag_name):
         super().__init__(options, output_stream)
         self.tag_name = tag_name
+        self.close_tag = '</{}>'.format(tag_name)
 
     def before_children(self, tree, node):
-        self.output_stream.write('<{}{}>'.format(
-            self.tag_name, html_attrs_to_string(node.kwargs)))
+        self.output_stream.write(
+            open_tag_to_string(self.tag_name, node.kwargs))
 
     def after_children(self, tree, node):
-        self.output_stream.write('</{}>'.format(self.tag_name))
+        self.output_stream.write(self.close_tag)
 
 
 class TextVisitor(WritingVisitor):
@@ -69,22 +165,55 @@ class AnchorVisitor(WritingVisitor):
         self.output_stream.write('</a>')
 
 
-class LinkVisitor(WritingVisitor):
+class LinkingVisitor(WritingVisitor):
+    def __init__(self, options, output_stream, document_ids, href_table):
+        super().__init__(options, output_stream)
+        self.document_ids = document_ids
+        self.href_table = href_table
+
+    def get_link_document_id(self, node):
+        """Nodes inside a `CWSharedNode` are written as part of the document
+        the `CWSharedNode` is in, not their own."""
+        if self.document_ids:
+            return self.document_ids[-1]
+        return node.document_id
+
+    def write_link_start(self, node, target_document_id, get_href):
+        """Write `<a href="...">`, where `get_href(link_document_id)` returns
+        the href. Handles fragments being written for any document in a
+        directory (see `SharedVisitor`)."""
+        link_document_id = self.get_link_document_id(node)
+        fmt = '<a href="{}">'
+        if (_is_directory_document_id(link_document_id) and
+                target_document_id[:-1] == link_document_id[:-1]):
+            # only a link to the page itself differs between documents in
+            # the same directory
+            self.output_stream.write_for_document(
+                target_document_id,
+                fmt.format(get_href(target_document_id)),
+                fmt.format(get_href(link_document_id)))
+        else:
+            self.output_stream.write(fmt.format(get_href(link_document_id)))
+
+
+class LinkVisitor(LinkingVisitor):
     def before_children(self, tree, node):
-        href = anchor_to_href(
-            self.options,
-            node,
-            tree.processor_data['ref_id_to_anchor'][node.ref_id])
-        self.output_stream.write('<a href="{}">'.format(href))
+        anchor = tree.processor_data['ref_id_to_anchor'][node.ref_id]
+        self.write_link_start(
+            node, anchor.document_id,
+            lambda link_document_id: self.href_table.anchor_to_href(
+                link_document_id, anchor))
 
     def after_children(self, tree, node):
         self.output_stream.write('</a>')
 
 
-class DocumentLinkVisitor(WritingVisitor):
+class DocumentLinkVisitor(LinkingVisitor):
     def before_children(self, tree, node):
-        href = doc_to_href(self.options, node, node.target_document_id)
-        self.output_stream.write('<a href="{}">'.format(href))
+        self.write_link_start(
+            node, node.target_document_id,
+            lambda link_document_id: self.href_table.doc_to_href(
+                link_document_id, node.target_document_id))
 
     def after_children(self, tree, node):
         self.output_stream.write('</a>')
@@ -104,3 +233,98 @@ class DocumentVisitor(WritingVisitor):
         if self.options.single_page:
             self.output_stream.write('</a>')
 
+
+
+class SharedVisitor(LinkingVisitor):
+    """
+    Writes the nodes embedded by a `CWSharedNode`.
+
+    If there is a fragment cache, the HTML is written once per directory
+    instead of once per document, since relative hrefs only depend on the
+    directory, except for links to the page itself, which are resolved for
+    each document.
+    """
+
+    def __init__(self, options, output_stream, document_ids, href_table,
+                 tag_to_visitor, handle_error, library, fragment_cache):
+        super().__init__(options, output_stream, document_ids, href_table)
+        self.tag_to_visitor = tag_to_visitor
+        self.handle_error = handle_error
+        self.library = library
+        self.fragment_cache = fragment_cache
+        self.compiled = None
+
+    def before_children(self, tree, node):
+        document_id = self.get_link_document_id(node)
+        if self.fragment_cache is None or document_id is None:
+            if self.compiled is None:
+                self.compiled = compile_tag_to_visitor(self.tag_to_visitor)
+            self.document_ids.append(document_id)
+            for child in node.shared_children:
+                write_tree(
+                    tree, self.compiled, node=child,
+                    handle_error=self.handle_error)
+            self.document_ids.pop()
+            return
+
+        # node IDs are never reused, and shared nodes don't change
+        key = (
+            tuple(child.id for child in node.shared_children),
+            document_id[:-1])
+        if key not in self.fragment_cache:
+            stream = FragmentStream()
+            tag_to_visitor = get_tag_to_visitor(
+                self.library, stream, self.options,
+                handle_error=self.handle_error,
+                document_id=document_id[:-1] + (None,),
+                href_table=self.href_table)
+            compiled = compile_tag_to_visitor(tag_to_visitor)
+            for child in node.shared_children:
+                write_tree(
+                    tree, compiled, node=child,
+                    handle_error=self.handle_error)
+            self.fragment_cache[key] = stream.get_parts()
+        self.output_stream.write(
+            render_fragment(self.fragment_cache[key], document_id))
+
+
+def _is_directory_document_id(document_id):
+    return document_id is not None and document_id[-1] is None
+
+
+class FragmentStream:
+    """
+    Output stream for HTML that will be reused for every document in a
+    directory. Parts that depend on the document are stored as
+    `(document_id, text_if_document, text_otherwise)`.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.buffer = []
+
+    def write(self, text):
+        self.buffer.append(text)
+
+    def write_for_document(self, document_id, text_if_document, otherwise):
+        self._flush()
+        self.parts.append((document_id, text_if_document, otherwise))
+
+    def _flush(self):
+        if self.buffer:
+            self.parts.append(''.join(self.buffer))
+            self.buffer = []
+
+    def get_parts(self):
+        self._flush()
+        return self.parts
+
+
+def render_fragment(parts, document_id):
+    """Returns the HTML of `FragmentStream.get_parts()` for a document"""
+    if len(parts) == 1 and isinstance(parts[0], str):
+        return parts[0]
+    return ''.join(
+        part if isinstance(part, str) else
+        (part[1] if part[0] == document_id else part[2])
+        for part in parts)
@@ -1,5 +1,14 @@
+import threading
+from collections import namedtuple
+
+
 class UnhandledEdgeCaseError(Exception): pass
 class UnknownNodeNameError(Exception): pass
+class ProcessorDependencyError(Exception): pass
+
+
+ProcessorDeclaration = namedtuple(
+    'ProcessorDeclaration', ['tag_names', 'produces', 'consumes'])
 
 
 class Library:
@@ -15,8 +24,56 @@ class Library:
         super().__init__()
         self.tag_name_to_processors = {}
         self.universal_processors = []
+        # tag name -> [load function]
+        self._lazy_loaders = {}
+        # processor -> ProcessorDeclaration
+        self._declarations = {}
+        # processor -> phase number, or None if it needs to be recomputed
+        self._phases = None
+        # produced name -> [(phase, tag name)] of its consumers
+        self._consumers = None
+        # processors declared with document_local=True
+        self._document_local = set()
+        # held while lazy processors load, so that threads processing
+        # documents at the same time wait for them instead of missing them
+        self._lazy_lock = threading.RLock()
+        # tag names whose lazy processors are loading, by the thread holding
+        # _lazy_lock
+        self._loading_tag_names = set()
+
+    def add_lazy_processors(self, tag_names, load):
+        """
+        Declare that calling `load()` will add processors for `tag_names`
+        (and no others). It is called the first time processors for one of
+        those tags are needed, so the code behind them doesn't have to be
+        imported unless it's used. `load` may be called more than once and
+        should do nothing after the first time.
+        """
+        for tag_name in tag_names:
+            self._lazy_loaders.setdefault(tag_name, []).append(load)
+
+    def _load_lazy_processors(self, tag_name):
+        # loaders were declared in plugin order, so running them before
+        # anything else is registered for this tag keeps processors in the
+        # same order as if everything had been loaded up front.
+        with self._lazy_lock:
+            # another thread may have loaded them while this one waited
+            if (tag_name not in self._lazy_loaders or
+                    tag_name in self._loading_tag_names):
+                return
+            # they stay in _lazy_loaders until they're loaded, so other
+            # threads know to wait
+            self._loading_tag_names.add(tag_name)
+            try:
+                for load in self._lazy_loaders[tag_name]:
+                    load()
+            finally:
+                self._loading_tag_names.remove(tag_name)
+                del self._lazy_loaders[tag_name]
 
     def _set_processor(self, tag_name, p, before_others=False):
+        if tag_name in self._lazy_loaders:
+            self._load_lazy_processors(tag_name)
         if tag_name == '*':
             if before_others:
                 self.universal_processors.insert(0, p)
@@ -29,7 +86,26 @@ class Library:
             else:
                 self.tag_name_to_processors[tag_name].append(p)
 
-    def processor(self, tag_name, p=None, before_others=False):
+    def _declare(self, tag_name, p, produces, consumes):
+        if not produces and not consumes:
+            return
+        old = self._declarations.get(
+            p, ProcessorDeclaration(set(), set(), set()))
+        self._declarations[p] = ProcessorDeclaration(
+            old.tag_names | {tag_name},
+            old.produces | set(produces),
+            old.consumes | set(consumes))
+        self._phases = None
+        self._consumers = None
+
+    def _set_document_local(self, p, document_local):
+        if document_local:
+            self._document_local.add(p)
+            self._phases = None
+            self._consumers = None
+
+    def processor(self, tag_name, p=None, before_others=False,
+                  produces=(), consumes=(), document_local=False):
         """
         Declare a function as a processor for nodes with name *tag_name*.
         May be used as a decorator or as a simple function call.
@@ -49,17 +125,133 @@ class Library:
             tree.replace_node(node, CWTextNode(node.text[::-1]))
         library.processor('Text', reverse_text)
         ```
+
+        If processors depend on each other's results, declare it with
+        *produces* and *consumes*, which are lists of arbitrary names for
+        those results. A processor runs only after every processor producing
+        something it consumes has run on the whole tree, so it doesn't need
+        to be re-run by marking nodes dirty:
+
+        ```py
+        @library.processor('h1', produces=['toc_entry'])
+        def process_h1(tree, node):
+            node.data['toc_entry'] = ...
+
+        @library.processor('Document', consumes=['toc_entry'])
+        def process_document(tree, node):
+            # every h1 in the tree already has a toc_entry
+        ```
+
+        If a producer runs after its consumers have already run (for
+        example, on a heading inserted by a later processor), it should call
+        `CWTree.mark_consumers_dirty()` so they run again.
+
+        If a processor only reads and changes the document its node is in,
+        and doesn't use `tree.processor_data` to share nodes between
+        documents, declare it with `document_local=True`. Document-local
+        processors may run on each document on its own before the rest of
+        the site is read (see `computerwords.cwdom.spill`), so they may not
+        consume anything produced by processors that aren't document-local.
         """
         if p is None:
             def decorator(p2):
                 self._set_processor(tag_name, p2, before_others)
+                self._declare(tag_name, p2, produces, consumes)
+                self._set_document_local(p2, document_local)
                 return p2
             return decorator
         else:
             self._set_processor(tag_name, p, before_others)
+            self._declare(tag_name, p, produces, consumes)
+            self._set_document_local(p, document_local)
             return p
 
+    def _compute_phases(self):
+        producers = {}
+        for p, declaration in self._declarations.items():
+            for name in declaration.produces:
+                producers.setdefault(name, []).append(p)
+
+        phases = {}
+        visiting = set()
+        def get_phase(p):
+            if p in phases:
+                return phases[p]
+            if p in visiting:
+                raise ProcessorDependencyError(
+                    "Processors have circular produces/consumes"
+                    " declarations involving {!r}".format(p))
+            visiting.add(p)
+            phase = 0
+            for name in self._declarations[p].consumes:
+                for producer in producers.get(name, []):
+                    if producer is p:
+                        continue
+                    if (p in self._document_local and
+                            producer not in self._document_local):
+                        raise ProcessorDependencyError(
+                            "Document-local processor {!r} consumes {!r},"
+                            " which is produced by {!r}, which isn't"
+                            " document-local".format(p, name, producer))
+                    phase = max(phase, get_phase(producer) + 1)
+            visiting.remove(p)
+            phases[p] = phase
+            return phase
+
+        for p in self._declarations:
+            get_phase(p)
+
+        consumers = {}
+        for consumer, declaration in self._declarations.items():
+            for name in declaration.consumes:
+                consumers.setdefault(name, []).extend(
+                    (phases[consumer], tag_name)
+                    for tag_name in declaration.tag_names)
+
+        self._phases = phases
+        self._consumers = consumers
+        return phases, consumers
+
+    # _phases and _consumers are only read once in each method below,
+    # because a plugin loading in another thread may reset them at any time
+
+    def get_phase(self, p):
+        """Returns the phase in which processor *p* runs. Processors without
+        dependencies run in phase 0."""
+        phases = self._phases
+        if phases is None:
+            phases = self._compute_phases()[0]
+        return phases.get(p, 0)
+
+    def get_max_phase(self):
+        """Returns the number of the last phase"""
+        phases = self._phases
+        if phases is None:
+            phases = self._compute_phases()[0]
+        return max(phases.values(), default=0)
+
+    def get_is_document_local(self, p):
+        """Returns `True` if processor *p* was declared with
+        `document_local=True`"""
+        return p in self._document_local
+
+    def get_global_tag_names(self):
+        """
+        Returns the set of tag names that have processors that aren't
+        document-local, among the processors added or loaded so far, or
+        `None` if there is such a processor for every tag (`'*'`).
+        """
+        if any(p not in self._document_local
+               for p in self.universal_processors):
+            return None
+        return {
+            tag_name
+            for tag_name, processors in self.tag_name_to_processors.items()
+            if any(p not in self._document_local for p in processors)}
+
     def get_processors(self, tag_name, strict=True):
+        if tag_name in self._lazy_loaders:
+            self._load_lazy_processors(tag_name)
         yield from self.universal_processors
         if strict:
             try:
@@ -73,21 +265,52 @@ class Library:
             yield from self.tag_name_to_processors.get(tag_name, [])
 
     def get_allowed_tags(self):
-        return set(self.tag_name_to_processors.keys())
+        return (
+            set(self.tag_name_to_processors.keys()) |
+            set(self._lazy_loaders.keys()))
+
+    def get_consumer_tag_names(self, name, max_phase):
+        """Returns the tag names of processors that consume *name* and run in
+        phase *max_phase* or earlier."""
+        consumers = self._consumers
+        if consumers is None:
+            consumers = self._compute_phases()[1]
+        return {
+            tag_name
+            for phase, tag_name in consumers.get(name, [])
+            if phase <= max_phase}
 
-    def run_processors(self, tree, node):
+    def run_processors(self, tree, node, min_phase=0, max_phase=None,
+                       scope=None):
+        """
+        Run the processors for *node* whose phase is between *min_phase* and
+        *max_phase* (inclusive; `None` means no limit). If *scope* is
+        `'document_local'`, only run document-local processors; if it is
+        `'global'`, only run the others.
+        """
         if tree.get_is_node_dirty(node):
             raise ValueError(
                 "Nodes should be marked un-dirty before processing.")
+        # the node can only have been dirtied or removed by one of its own
+        # processors, so there's nothing to check before the first one
+        has_run_processor = False
         for p in self.get_processors(node.name):
-            if tree.get_is_node_dirty(node):
+            phase = self.get_phase(p)
+            if phase < min_phase:
+                continue
+            if max_phase is not None and phase > max_phase:
+                continue
+            if scope is not None and (
+                    (p in self._document_local) != (scope == 'document_local')):
+                continue
+            if has_run_processor and tree.get_is_node_dirty(node):
                 raise UnhandledEdgeCaseError((
                     "Node {!r} has multiple processors, but an earlier"
                     " processor dirtied it before the later one could run."
                     " I haven't decided if this is a problem or not, so for"
                     " now this edge case simply throws an error.").format(
                         node.name))
-            if tree.get_was_node_removed(node):
+            if has_run_processor and tree.get_was_node_removed(node):
                 return
                 raise UnhandledEdgeCaseError((
                     "Node {!r} has multiple processors, but an earlier"
@@ -96,3 +319,4 @@ class Library:
                     " now this edge case simply throws an error.").format(
                         node.name))
             p(tree, node)
+            has_run_processor = True
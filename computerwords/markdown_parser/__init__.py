@@ -6,17 +6,27 @@ from .parse_tree_to_cwdom import parse_tree_to_cwdom
 from .src_loc import SourceLocation
 
 
+_START_OF_DOCUMENT = SourceLocation(0, 0, 0).as_range
+
+
 CFMParserConfigBase = namedtuple(
     'CFMParserConfigBase',
-    ['allowed_tags', 'document_id', 'document_path', 'relative_to_loc'])
+    ['allowed_tags', 'document_id', 'document_path', 'relative_to_loc',
+     'source_arena', 'merge_text'])
 class CFMParserConfig(CFMParserConfigBase):
-    def __new__(cls, allowed_tags, document_id, document_path, relative_to_loc=None):
+    def __new__(cls, allowed_tags, document_id, document_path, relative_to_loc=None,
+                source_arena=None, merge_text=False):
         self = super(CFMParserConfig, cls).__new__(
             cls,
             allowed_tags=allowed_tags,
             document_id=document_id,
             document_path=document_path,
-            relative_to_loc=relative_to_loc or SourceLocation(0, 0, 0).as_range)
+            relative_to_loc=relative_to_loc or _START_OF_DOCUMENT,
+            source_arena=source_arena,
+            # adjacent text is always merged if there's an arena; this is for
+            # text that will be moved to an arena after being parsed in
+            # another process
+            merge_text=merge_text)
         assert(isinstance(self.allowed_tags, set))
         assert(isinstance(self.document_id, tuple))
         assert(isinstance(self.document_path, str))
@@ -27,4 +37,6 @@ class CFMParserConfig(CFMParserConfigBase):
             allowed_tags=self.allowed_tags,
             document_id=self.document_id,
             document_path=self.document_path,
-            relative_to_loc=r2l)
+            relative_to_loc=r2l,
+            source_arena=self.source_arena,
+            merge_text=self.merge_text)
@@ -4,6 +4,17 @@ from collections import namedtuple
 class InternalParseError(Exception): pass
 
 
+# AST field name -> name of the node that goes in it, where they differ
+_FIELD_TO_VALUE_NAME = {
+    'angle_bracket_left': '<',
+    'angle_bracket_right': '>',
+    'bracket_left': '[',
+    'bracket_right': ']',
+    'equals': '=',
+    'slash': '/',
+}
+
+
 class KissUpASTNode:
     name = "???"
 
@@ -39,14 +50,8 @@ def create_ast_node(class_name, production_name, forms):
 
             for field in form._fields:
                 field_value_name = getattr(form, field).name
-                expected_field_value_name = {
-                    'angle_bracket_left': '<',
-                    'angle_bracket_right': '>',
-                    'bracket_left': '[',
-                    'bracket_right': ']',
-                    'equals': '=',
-                    'slash': '/',
-                }.get(field, field.lower())
+                expected_field_value_name = _FIELD_TO_VALUE_NAME.get(
+                    field, field.lower())
                 if expected_field_value_name != field_value_name.lower():
                     raise InternalParseError(
                         "AST doesn't match rule: {}.{}.{} -> {}".format(
@@ -0,0 +1,104 @@
+"""
+Remembers the parsed nodes of each block of each document, so that when a
+document is parsed again, only the blocks that changed go through CommonMark
+and the HTML parser again.
+
+```python
+block_cache = BlockCache(pathlib.Path('.computerwords-cache'))
+nodes = cfm_to_cwdom(text, config, block_cache=block_cache)
+block_cache.save()
+```
+
+A block is a chunk of a document as split by `chunks.split_into_chunks()`,
+so it starts with a top-level heading. `cfm_to_cwdom()` looks blocks up by
+a hash of their text, the parser settings, and the versions of Computer
+Words and CommonMark, so blocks cached by another version aren't reused. It
+stores their nodes as pickles, so each build gets its own copy of the
+nodes.
+
+If `path` is given, each document's blocks are kept in a file in that
+directory. Only load caches you created yourself; like any pickle, a
+malicious file can run code.
+"""
+
+import hashlib
+import logging
+import pickle
+import zlib
+
+
+log = logging.getLogger(__name__)
+
+
+MAGIC = b'CWB1'
+
+
+class BlockCache:
+    """
+    `path` is a directory to keep blocks in between builds, or `None` to only
+    keep them in memory, which is enough for rebuilding in the same process.
+    """
+
+    def __init__(self, path=None):
+        super().__init__()
+        self.path = path
+        # document_id -> {key: pickled nodes}
+        self._blocks = {}
+        # document_id -> {key: pickled nodes} of the blocks used since the
+        # last save()
+        self._used_blocks = {}
+
+    def get(self, document_id, key):
+        """Returns the pickled nodes stored for `key`, or `None`"""
+        data = self._get_blocks(document_id).get(key)
+        if data is not None:
+            self._used_blocks.setdefault(document_id, {})[key] = data
+        return data
+
+    def put(self, document_id, key, data):
+        self._get_blocks(document_id)[key] = data
+        self._used_blocks.setdefault(document_id, {})[key] = data
+
+    def save(self):
+        """
+        Forget the blocks of each document parsed since the last `save()`
+        that weren't used, and write the rest to `path`
+        """
+        if self.path is not None and self._used_blocks:
+            self.path.mkdir(parents=True, exist_ok=True)
+        for document_id, blocks in self._used_blocks.items():
+            self._blocks[document_id] = blocks
+            if self.path is not None:
+                with self._get_file_path(document_id).open('wb') as f:
+                    f.write(MAGIC + zlib.compress(pickle.dumps(
+                        (document_id, blocks), pickle.HIGHEST_PROTOCOL)))
+        self._used_blocks = {}
+
+    def _get_blocks(self, document_id):
+        if document_id not in self._blocks:
+            self._blocks[document_id] = self._load(document_id)
+        return self._blocks[document_id]
+
+    def _get_file_path(self, document_id):
+        name = hashlib.sha1(repr(document_id).encode('utf-8')).hexdigest()
+        return self.path / (name + '.cwb')
+
+    def _load(self, document_id):
+        if self.path is None:
+            return {}
+        file_path = self._get_file_path(document_id)
+        if not file_path.exists():
+            return {}
+        try:
+            data = file_path.read_bytes()
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError("not a block cache file")
+            stored_document_id, blocks = pickle.loads(
+                zlib.decompress(data[len(MAGIC):]))
+        except Exception as e:
+            log.warning("Ignoring unreadable block cache {}: {}".format(
+                file_path, e))
+            return {}
+        if stored_document_id != document_id:
+            return {}
+        return blocks
@@ -1,17 +1,23 @@
+import hashlib
 import logging
+import pickle
 import re
 
 from collections import OrderedDict, deque
 
 import CommonMark
 
+import computerwords
 from . import CFMParserConfig
 from computerwords.cwdom.CWTree import CWTree
 from computerwords.cwdom.nodes import *
-from .ast import StmtsNode, TagArgsNode
+from computerwords.cwdom.nodes import _id_generator
+from computerwords.cwdom.traversal import preorder_traversal
+from .chunks import split_into_chunks
 from .exceptions import SourceException
 from .src_loc import SourceRange, SourceLocation
 from .html_lexer import lex_html
+from .html_to_cwdom import parse_html_to_cwdom
 from .html_parser import (
     parse_html,
     parse_open_tag,
@@ -32,42 +38,9 @@ def lex_and_parse_html(string, config):
 
 
 def html_string_to_cwdom(string, config):
-    return parse_tree_to_cwdom(
-        lex_and_parse_html(string, config), config)
-
-### utilities ###
-
-def parse_tree_to_cwdom(root, config):
-    return list(stmts_to_list(root, config))
-
-
-def stmts_to_list(stmts, config):
-    assert type(stmts) is StmtsNode
-    if stmts.form_num == 1:
-        yield from (
-            list(stmt_to_tag_or_text(stmts.stmt, config)) +
-            list(stmts_to_list(stmts.stmts, config))
-        )
-
-
-def stmt_to_tag_or_text(stmt, config):
-    if stmt.form_num == 1:
-        yield from commonmark_to_cwdom(stmt.text.value, config)
-    else:
-        tag_node = stmt.tag
-        if tag_node.form_num == 1:
-            tag_contents = tag_node.open_tag.tag_contents
-            yield CWTagNode(
-                tag_contents.bbword.value,
-                tag_args_to_dict(tag_contents.tag_args),
-                list(stmts_to_list(tag_node.stmts, config)))
-        else:
-            tag_contents = tag_node.self_closing_tag.tag_contents
-            yield CWTagNode(
-                tag_contents.bbword.value,
-                tag_args_to_dict(tag_contents.tag_args))
-
-### end parse_tree_to_cwdom ###
+    return parse_html_to_cwdom(
+        list(lex_html(config, string)), config,
+        lambda text: commonmark_to_cwdom(text, config))
 
 
 class UnparsedTagNode(CWNode):
@@ -83,14 +56,25 @@ class UnparsedTagNode(CWNode):
         return "{}(parse_tree={!r})".format(self.name, self.parse_tree)
 
 
+    def __getstate__(self):
+        state = super().__getstate__()
+        # parse trees can't be pickled, and fix_ignored_html() only needs
+        # the tag name and arguments
+        state['parse_tree'] = None
+        return state
+
+
 class UnparsedOpenTagNode(UnparsedTagNode):
     def __init__(self, parse_tree, literal):
         super().__init__('UnparsedOpenTag', parse_tree, literal)
+        self.tag_name = parse_tree.tag_contents.bbword.value
+        self.tag_kwargs = tag_args_to_dict(parse_tree.tag_contents.tag_args)
 
 
 class UnparsedCloseTagNode(UnparsedTagNode):
     def __init__(self, parse_tree, literal):
         super().__init__('UnparsedCloseTag', parse_tree, literal)
+        self.tag_name = parse_tree.bbword.value
 
 
 def _dump(ast_node):
@@ -117,27 +101,27 @@ def post(name):
 
 
 @t('text')
-def t_Text(ast_node, config, loc):
+def t_Text(ast_node, config, sourcepos):
     yield CWTextNode(ast_node.literal)
 
 @t('document')
-def t_Document(ast_node, config, loc):
+def t_Document(ast_node, config, sourcepos):
     yield CWDocumentNode('PATH')
 
 @t('heading')
-def t_Header(ast_node, config, loc):
+def t_Header(ast_node, config, sourcepos):
     yield CWTagNode('h{}'.format(ast_node.level), {})
 
 @t('paragraph')
-def t_Paragraph(ast_node, config, loc):
+def t_Paragraph(ast_node, config, sourcepos):
     yield CWTagNode('p', {})
 
 @t('link')
-def t_Link(ast_node, config, loc):
+def t_Link(ast_node, config, sourcepos):
     yield CWTagNode('a', {'href': ast_node.destination})
 
 @t('list')
-def t_List(ast_node, config, loc):
+def t_List(ast_node, config, sourcepos):
     if ast_node.list_data['type'] == 'bullet':
         yield CWTagNode('ul', {})
     elif ast_node.list_data['type'] == 'ordered':
@@ -147,11 +131,12 @@ def t_List(ast_node, config, loc):
             ast_node.list_data['type']))
 
 @t('item')
-def t_Item(ast_node, config, loc):
+def t_Item(ast_node, config, sourcepos):
     yield CWTagNode('li', {})
 
 @t('html_block')
-def t_HtmlBlock(ast_node, config, loc):
+def t_HtmlBlock(ast_node, config, sourcepos):
+    loc = _sourcepos_to_range(sourcepos, config)
     try:
         config = config.copy_relative_to_loc(loc)
         items = list(html_string_to_cwdom(ast_node.literal, config))
@@ -160,45 +145,46 @@ def t_HtmlBlock(ast_node, config, loc):
         yield from _do_your_best(ast_node.literal, config, loc)
 
 @t('html_inline')
-def t_HtmlInline(ast_node, config, loc):
-    yield from _do_your_best(ast_node.literal, config, loc)
+def t_HtmlInline(ast_node, config, sourcepos):
+    yield from _do_your_best(
+        ast_node.literal, config, _sourcepos_to_range(sourcepos, config))
 
 @t('emph')
-def t_Emph(ast_node, config, loc):
+def t_Emph(ast_node, config, sourcepos):
     yield CWTagNode('i', {})
 
 @t('strong')
-def t_Strong(ast_node, config, loc):
+def t_Strong(ast_node, config, sourcepos):
     yield CWTagNode('strong', {})
 
 @t('block_quote')
-def t_BlockQuote(ast_node, config, loc):
+def t_BlockQuote(ast_node, config, sourcepos):
     yield CWTagNode('blockquote', {})
 
 @t('thematic_break')
-def t_ThematicBreak(ast_node, config, loc):
+def t_ThematicBreak(ast_node, config, sourcepos):
     yield CWTagNode('hr', {})
 
 @t('code_block')
-def t_CodeBlock(ast_node, config, loc):
+def t_CodeBlock(ast_node, config, sourcepos):
     yield CWTagNode(
         'pre', {'language': ast_node.info}, [CWTextNode(ast_node.literal)])
 
 @t('code')
-def t_Code(ast_node, config, loc):
+def t_Code(ast_node, config, sourcepos):
     yield CWTagNode('code', {}, [CWTextNode(ast_node.literal)])
 
 @t('hardbreak')
-def t_Hardbreak(ast_node, config, loc):
+def t_Hardbreak(ast_node, config, sourcepos):
     yield CWTagNode('br', {})
 
 @t('softbreak')
-def t_Softbreak(ast_node, config, loc):
+def t_Softbreak(ast_node, config, sourcepos):
     # optionally insert br here
     yield CWTextNode(' ')
 
 @t('image')
-def t_Image(ast_node, config, loc):
+def t_Image(ast_node, config, sourcepos):
     yield CWTagNode('img', {'src': ast_node.destination})
 
 @post('image')
@@ -245,10 +231,11 @@ def _do_your_best(literal, config, loc):
 def _yield_nodes(literal, tokens, i, node):
     yield node
     if i < len(tokens) - 1:
-        yield CWTextNode(literal[tokens[i].loc.start.char:])
+        yield CWTextNode(literal[tokens[i].start:])
 
 
 def maybe_parse_everything(literal, config, loc):
+    config = config.copy_relative_to_loc(loc)
     try:
         result = html_string_to_cwdom(literal, config)
     except ParseError:
@@ -304,13 +291,11 @@ def fix_ignored_html(node, strict=False):
 
     for child in children:
         if isinstance(child, UnparsedOpenTagNode):
-            new_tag = CWTagNode(
-                child.parse_tree.tag_contents.bbword.value,
-                tag_args_to_dict(child.parse_tree.tag_contents.tag_args))
+            new_tag = CWTagNode(child.tag_name, child.tag_kwargs)
             children_stack.append(new_tag.children)
             tag_stack.append(new_tag)
         elif isinstance(child, UnparsedCloseTagNode):
-            close_name = child.parse_tree.bbword.value
+            close_name = child.tag_name
             if tag_stack and close_name == tag_stack[-1].name:
                 children_stack.pop()
                 closed_tag = tag_stack.pop()
@@ -337,20 +322,52 @@ def fix_ignored_html(node, strict=False):
     node.set_children(new_children)
 
 
+def _merge_adjacent_text(nodes):
+    """
+    CommonMark splits text at punctuation (`"dog's"` becomes `'dog'`, `"'"`,
+    and `'s'`), so join each run of text nodes back into one node. The
+    output is the same, there are far fewer nodes, and more of them are long
+    enough to be moved to the source arena.
+    """
+    merged = []
+    # texts of the run of text nodes that ends with merged[-1]
+    texts = []
+    for node in nodes:
+        if (type(node) is CWTextNode and texts and
+                merged[-1].escape == node.escape):
+            texts.append(node.text)
+            continue
+        if len(texts) > 1:
+            merged[-1].text = ''.join(texts)
+        texts = [node.text] if type(node) is CWTextNode else []
+        merged.append(node)
+    if len(texts) > 1:
+        merged[-1].text = ''.join(texts)
+    return merged
+
+
+def _sourcepos_to_range(sourcepos, config):
+    ((start_line, start_col), (end_line, end_col)) = sourcepos
+    # sourcepos is relative to the text given to CommonMark, which may be a
+    # chunk of the document or text inside an HTML block
+    return SourceRange(
+        SourceLocation(start_line - 1, start_col - 1, None),
+        SourceLocation(end_line - 1, end_col - 1, None),
+    ).relative_to(config.relative_to_loc)
+
+
 def _ast_node_to_cwdom(ast_node, config):
+    # CommonMark's 1-based ((line, col), (line, col)) is passed along as-is;
+    # handlers that can raise errors turn it into a SourceRange themselves
     if ast_node.sourcepos:
-        ((start_line, start_col), (end_line, end_col)) = ast_node.sourcepos
+        sourcepos = ast_node.sourcepos
     elif ast_node.parent and ast_node.parent.sourcepos:
-        ((start_line, start_col), (end_line, end_col)) = ast_node.parent.sourcepos
+        sourcepos = ast_node.parent.sourcepos
     else:
         # shouldn't happen
-        ((start_line, start_col), (end_line, end_col)) = ((1, 1), (1, 1))
-
-    loc = SourceRange(
-        SourceLocation(start_line - 1, start_col - 1, None),
-        SourceLocation(end_line - 1, end_col - 1, None))
+        sourcepos = ((1, 1), (1, 1))
 
-    for cwdom_node in AST_TYPE_TO_CW[ast_node.t](ast_node, config, loc):
+    for cwdom_node in AST_TYPE_TO_CW[ast_node.t](ast_node, config, sourcepos):
         children = []
         ast_child = ast_node.first_child
         while ast_child:
@@ -358,7 +375,10 @@ def _ast_node_to_cwdom(ast_node, config):
                 children.append(child)
             ast_child = ast_child.nxt
         # node might have added its own children (see Code)
-        cwdom_node.set_children(cwdom_node.children + children)
+        children = cwdom_node.children + children
+        if config.source_arena is not None or config.merge_text:
+            children = _merge_adjacent_text(children)
+        cwdom_node.set_children(children)
         if ast_node.t in AST_TYPE_TO_CW_POST:
             AST_TYPE_TO_CW_POST[ast_node.t](cwdom_node, config)
         yield cwdom_node
@@ -371,15 +391,200 @@ def _replace_lone_p(nodes):
         return nodes
 
 
-def commonmark_to_cwdom(text, config, fix_tags=True):
+def _parse_commonmark(text, config):
     parser = CommonMark.blocks.Parser()
-    doc_node = list(_ast_node_to_cwdom(parser.parse(text), config))[0]
+    return list(_ast_node_to_cwdom(parser.parse(text), config))[0]
+
+
+def commonmark_to_cwdom(text, config, fix_tags=True):
+    doc_node = _parse_commonmark(text, config)
     doc_node.deep_set_document_id(config.document_id)
     if fix_tags:
         fix_ignored_html(doc_node)
     return _replace_lone_p(doc_node.children)
 
 
-def cfm_to_cwdom(text, config, fix_tags=True):
+def _parse_chunk(chunk, config):
+    config = config.copy_relative_to_loc(
+        SourceLocation(chunk.line, 0, chunk.char).as_range)
+    return _parse_commonmark(chunk.text, config).children
+
+
+def _parse_chunk_to_pickle(chunk, config):
+    """Runs in a worker process"""
+    return pickle.dumps(
+        _parse_chunk(chunk, config), pickle.HIGHEST_PROTOCOL)
+
+
+def _load_chunk(data):
+    children = pickle.loads(data)
+    # node IDs from other processes and builds overlap with this one's
+    for child in children:
+        for node in preorder_traversal(child):
+            node.id = node.name + ':' + str(_id_generator.get_id())
+    return children
+
+
+# bump this when a change to the parser changes its output, so that blocks
+# parsed by an older version aren't reused
+BLOCK_CACHE_VERSION = 1
+
+_commonmark_version = None
+def _get_commonmark_version():
+    global _commonmark_version
+    if _commonmark_version is None:
+        try:
+            from importlib.metadata import version
+            _commonmark_version = version('CommonMark')
+        except ImportError:  # Python < 3.8, or CommonMark isn't installed
+            _commonmark_version = ''
+    return _commonmark_version
+
+
+def _get_block_key(chunk, config):
+    # blocks cached by another release of Computer Words or CommonMark
+    # aren't reused
+    settings = repr((
+        BLOCK_CACHE_VERSION, computerwords.__version__,
+        _get_commonmark_version(),
+        sorted(config.allowed_tags), config.merge_text))
+    return hashlib.sha1(
+        (settings + chunk.text).encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _chunks_to_cwdom(chunks, config, fix_tags, job_runner, chunk_size,
+                     block_cache):
+    # arenas can't be shared with other processes, so text is moved to the
+    # arena after parsing
+    worker_config = CFMParserConfig(
+        allowed_tags=config.allowed_tags,
+        document_id=config.document_id,
+        document_path=config.document_path,
+        merge_text=config.source_arena is not None or config.merge_text)
+
+    chunk_children = [None] * len(chunks)
+    keys = [None] * len(chunks)
+    if block_cache is not None:
+        for i, chunk in enumerate(chunks):
+            keys[i] = _get_block_key(chunk, worker_config)
+            data = block_cache.get(config.document_id, keys[i])
+            if data is not None:
+                chunk_children[i] = _load_chunk(data)
+    missing = [
+        i for i, children in enumerate(chunk_children) if children is None]
+
+    if (job_runner is not None and chunk_size and
+            sum(len(chunks[i].text) for i in missing) > chunk_size):
+        futures = [
+            (i, job_runner.submit(
+                _parse_chunk_to_pickle, chunks[i], worker_config,
+                use_processes=True))
+            for i in missing]
+        for i, future in futures:
+            data = future.result()
+            chunk_children[i] = _load_chunk(data)
+            if block_cache is not None:
+                block_cache.put(config.document_id, keys[i], data)
+    else:
+        for i in missing:
+            chunk_children[i] = _parse_chunk(chunks[i], worker_config)
+            if block_cache is not None:
+                block_cache.put(
+                    config.document_id, keys[i],
+                    pickle.dumps(chunk_children[i], pickle.HIGHEST_PROTOCOL))
+
+    children = [child for children in chunk_children for child in children]
+    if worker_config.merge_text:
+        children = _merge_adjacent_text(children)
+
+    doc_node = CWDocumentNode('PATH', children)
+    doc_node.deep_set_document_id(config.document_id)
+    if fix_tags:
+        fix_ignored_html(doc_node)
+    return _replace_lone_p(doc_node.children)
+
+
+# Shorter text isn't worth pointing into the arena, since a span takes about
+# as much memory as a short string.
+MIN_SPAN_LENGTH = 64
+
+# How many bytes past the end of the last text found in the source to look
+# for the next one, besides the length of the text and twice the length of
+# the text skipped since then. Text that isn't in the source verbatim, like
+# text with escapes, is never found, and searching the whole source for it
+# would make this quadratic.
+SEARCH_WINDOW = 4096
+
+
+def _move_text_to_arena(nodes, text, arena):
+    """
+    Add `text` to `arena`, and replace each long `CWTextNode` in `nodes`
+    whose text appears in `text` with a `CWSpanTextNode` pointing at it.
+    Text changed by the parser, like text with escapes, is left alone.
+    """
+    data = text.encode('utf-8')
+    base = arena.append(data)
+    # text nodes are in the same order as their text in the source, so each
+    # one is looked for a little way after the last one found
+    i = 0
+    skipped = 0
+    stack = [(None, j, node) for j, node in reversed(list(enumerate(nodes)))]
+    while stack:
+        parent, child_i, node = stack.pop()
+        if type(node) is CWTextNode:
+            if len(node.text) < MIN_SPAN_LENGTH:
+                skipped += len(node.text)
+                continue
+            node_data = node.text.encode('utf-8')
+            start = data.find(
+                node_data, i,
+                i + len(node_data) + 2 * skipped + SEARCH_WINDOW)
+            if start == -1:
+                skipped += len(node_data)
+                continue
+            i = start + len(node_data)
+            skipped = 0
+            span_node = CWSpanTextNode(
+                arena, base + start, base + i,
+                document_id=node.document_id, escape=node.escape)
+            if parent is None:
+                nodes[child_i] = span_node
+            else:
+                parent.replace_child(child_i, span_node)
+        else:
+            stack.extend(
+                (node, j, child)
+                for j, child in reversed(list(enumerate(node.children))))
+
+
+def cfm_to_cwdom(text, config, fix_tags=True, job_runner=None,
+                 chunk_size=None, block_cache=None):
+    """
+    Parse Computer Flavored Markdown `text` into a list of CWDOM nodes.
+
+    If `job_runner` (a `JobRunner`) and `chunk_size` are given, documents
+    longer than `chunk_size` characters are split into chunks of about that
+    size at top-level headings (see `chunks.split_into_chunks()`), which are
+    parsed in `job_runner`'s process pool.
+
+    If `block_cache` (a `BlockCache`) is given, the document is split at
+    every top-level heading instead, and only the blocks that aren't in the
+    cache are parsed. They're parsed in the process pool if together they
+    are longer than `chunk_size`.
+
+    The nodes are the same as if the document was parsed in one piece.
+    """
     assert(isinstance(config, CFMParserConfig))
-    return commonmark_to_cwdom(text, config, fix_tags)
+    chunks = None
+    if block_cache is not None:
+        chunks = split_into_chunks(text, 1)
+    elif job_runner is not None and chunk_size and len(text) > chunk_size:
+        chunks = split_into_chunks(text, chunk_size)
+    if chunks and (len(chunks) > 1 or block_cache is not None):
+        nodes = _chunks_to_cwdom(
+            chunks, config, fix_tags, job_runner, chunk_size, block_cache)
+    else:
+        nodes = commonmark_to_cwdom(text, config, fix_tags)
+    if config.source_arena is not None:
+        _move_text_to_arena(nodes, text, config.source_arena)
+    return nodes
@@ -0,0 +1,138 @@
+"""
+Splits a big Markdown document into chunks that CommonMark would parse the
+same way on their own, so that they can be parsed in parallel (see
+`cfm_to_cwdom()`).
+
+A document is only split before an ATX heading (`# Heading`) that starts in
+the first column right after a blank line. Such a line closes every list,
+block quote, paragraph, indented code block, and HTML block that ends at a
+blank line, so the only blocks it can be inside are fenced code blocks and
+`<script>`, `<pre>`, `<style>`, `<!-- -->`, `<? ?>`, `<!X >`, and CDATA
+blocks, which are followed line by line.
+
+Where a line could mean two things depending on blocks that aren't followed
+(a fence in an indented line or right after an HTML tag), the rest of the
+document is left in one chunk. Documents with link reference definitions
+are never split, since a definition applies to the whole document.
+"""
+
+import re
+
+from collections import namedtuple
+
+from CommonMark.blocks import (
+    reATXHeadingMarker,
+    reClosingCodeFence,
+    reCodeFence,
+    reHtmlBlockClose,
+    reHtmlBlockOpen,
+)
+
+
+# a `[label]:` at the start of a line, possibly inside block quotes or lists
+_LINK_REFERENCE_DEFINITION_RE = re.compile(
+    r'^[ \t>*+\-\d.)]*\[(?:[^\]\\]|\\.)+\]:', re.MULTILINE)
+# same line endings as CommonMark
+_LINE_ENDING_RE = re.compile(r'\r\n|\n|\r')
+_NUM_HTML_BLOCK_TYPES_WITH_END_MARKERS = 5
+# characters that CommonMark counts as blank
+_BLANK_CHARS = ' \t\f\v'
+
+
+Chunk = namedtuple('Chunk', ['text', 'line', 'char'])
+Chunk.__doc__ = """
+`text` starts on line `line` (counting from 0) at character `char` of the
+document.
+"""
+
+
+def _get_html_block_type(line):
+    """Returns the type of HTML block that `line` (without indentation)
+    starts if it ends at a marker instead of a blank line, or `None`"""
+    for block_type in range(1, _NUM_HTML_BLOCK_TYPES_WITH_END_MARKERS + 1):
+        if reHtmlBlockOpen[block_type].search(line):
+            return block_type
+    return None
+
+
+def _iterate_safe_split_points(text):
+    """Yields `(char, line)` for the start of each line that a document can
+    be split before"""
+    fence = None  # (fence character, fence length) of the open code block
+    html_block_type = None  # of the open HTML block
+    # True if a line since the last blank line started with a tag, in which
+    # case the next lines might be part of an HTML block
+    after_tag = False
+    previous_line_was_blank = True
+    line_start = 0
+    line_number = 0
+    for ending in _LINE_ENDING_RE.finditer(text):
+        line = text[line_start:ending.start()]
+        start, line_start = line_start, ending.end()
+        line_number += 1
+        content = line.lstrip(' ')
+        indent = len(line) - len(content)
+
+        if fence is not None:
+            match = reClosingCodeFence.match(content)
+            if (indent <= 3 and match and content[0] == fence[0] and
+                    len(match.group(0)) >= fence[1]):
+                fence = None
+            continue
+
+        if html_block_type is not None:
+            if reHtmlBlockClose[html_block_type].search(line):
+                html_block_type = None
+            continue
+
+        if not content.strip(_BLANK_CHARS):
+            after_tag = False
+            previous_line_was_blank = True
+            continue
+
+        if indent <= 3 and content[0] in '`~<#':
+            if content[0] == '<':
+                block_type = _get_html_block_type(content)
+                if block_type is not None:
+                    if indent > 0 or after_tag:
+                        return
+                    if not reHtmlBlockClose[block_type].search(content):
+                        html_block_type = block_type
+                after_tag = True
+            elif content[0] == '#':
+                if (indent == 0 and previous_line_was_blank and
+                        reATXHeadingMarker.match(content)):
+                    yield (start, line_number - 1)
+            else:
+                match = reCodeFence.match(content)
+                if match:
+                    if indent > 0 or after_tag:
+                        return
+                    fence = (content[0], len(match.group(0)))
+        previous_line_was_blank = False
+
+
+def split_into_chunks(text, chunk_size):
+    """
+    Returns a list of `Chunk`s of `text` that are at least `chunk_size`
+    characters long (except the last one), or a list of one chunk if
+    `text` can't be split.
+    """
+    if _LINK_REFERENCE_DEFINITION_RE.search(text):
+        return [Chunk(text, 0, 0)]
+    # the last line doesn't need a line ending to be looked at
+    if not text.endswith(('\n', '\r')):
+        text_with_ending = text + '\n'
+    else:
+        text_with_ending = text
+
+    chunks = []
+    chunk_start = chunk_line = 0
+    for char, line in _iterate_safe_split_points(text_with_ending):
+        if char - chunk_start >= chunk_size:
+            chunks.append(
+                Chunk(text[chunk_start:char], chunk_line, chunk_start))
+            chunk_start = char
+            chunk_line = line
+    chunks.append(Chunk(text[chunk_start:], chunk_line, chunk_start))
+    return chunks
@@ -1,3 +1,6 @@
+import copyreg
+
+
 class SourceException(Exception):
     def __init__(self, loc, reason):
         self.loc = loc
@@ -5,6 +8,11 @@ class SourceException(Exception):
         self.path = None  # insert later if you want
         super().__init__("{}: {}".format(loc, reason))
 
+    def __reduce__(self):
+        # subclasses take different arguments, so unpickle without calling
+        # __init__ (errors are pickled when parsing in other processes)
+        return (copyreg.__newobj__, (type(self),) + self.args, self.__dict__)
+
     def apply_config(self, parser_config):
         self.path = parser_config.document_path
         if parser_config.relative_to_loc:
@@ -2,7 +2,7 @@ import re
 
 from . import tokens
 from .exceptions import SourceException
-from .src_loc import SourceLocation
+from .src_loc import LineTable
 
 
 LEFT_ANGLE_BRACKET = '<'
@@ -18,14 +18,13 @@ class LexError(SourceException): pass
 # Matching function signature:
 
 ```
-fn(string, index, num_brackets, start_loc, get_loc_at)
+fn(string, index, num_brackets, line_table)
     -> None or (token, index, num_brackets)
 ARGS
     string: the string
     index: index of character to lex in the string
     num_brackets: current bracket nesting depth
-    start_loc: SourceLocation corresponding to index
-    get_loc_at(i): function that returns the location at string index i
+    line_table: LineTable of the string, for making tokens with Token.at()
 RETURN
     token: a token object (whatever you want really)
     index: index of the next character to lex
@@ -34,57 +33,46 @@ RETURN
 """
 
 
-def _match_text(s, i, num_brackets, start_loc, get_loc_at):
+_TEXT_RUN_RE = re.compile(r'[^<\\]+')
+
+
+def _match_text(s, i, num_brackets, line_table):
     """Match text"""
 
     if num_brackets > 0:
         return None
 
-    chars = []
-
-    while True:
-        next_char = None
-        is_last_char = len(s) <= i + 1
-        if not is_last_char:
-            next_char = s[i + 1]
-
-        if i >= len(s) or s[i] == LEFT_ANGLE_BRACKET:
-            if chars:
-                return (
-                    tokens.TextToken(
-                        start_loc.to(get_loc_at(i)),
-                        ''.join(chars)),
-                    i,
-                    num_brackets)
-            else:
-                return None
-        # elif s[i] == RIGHT_ANGLE_BRACKET:
-            # meh, just give 'em text
-            # raise LexError(
-            #     get_loc_at(i).as_range,
-            #     "The character '>' must be escaped when used in text")
-        elif s[i] == '\\':
+    # runs of text between backslashes are sliced out whole, so text without
+    # escapes becomes a single slice of s
+    start = i
+    chunks = []
+    while i < len(s) and s[i] != LEFT_ANGLE_BRACKET:
+        # an unescaped '>' is just text
+        if s[i] == '\\':
+            next_char = s[i + 1] if i + 1 < len(s) else None
             if next_char in TEXT_BACKSLASH_CHARS:
-                chars.append(next_char)
-                i += 1
+                chunks.append(next_char)
+                i += 2
             else:
                 raise LexError(
-                    get_loc_at(i).as_range,
+                    line_table.get_range(i, i),
                     "A backslash in text must be followed by one of: {}"
                         .format(sorted(TEXT_BACKSLASH_CHARS)))
         else:
-            chars.append(s[i])
-            if is_last_char:
-                return (
-                    tokens.TextToken(
-                        start_loc.to(get_loc_at(i + 1)),
-                        ''.join(chars)),
-                    i + 1,
-                    num_brackets)
-        i += 1
+            match = _TEXT_RUN_RE.match(s, i)
+            chunks.append(match.group(0))
+            i = match.end()
 
+    if chunks:
+        return (
+            tokens.TextToken.at(line_table, start, i, ''.join(chunks)),
+            i,
+            num_brackets)
+    else:
+        return None
 
-def _match_string_literal(s, i, num_brackets, start_loc, get_loc_at):
+
+def _match_string_literal(s, i, num_brackets, line_table):
     """Match string literal"""
 
     if num_brackets != 1:
@@ -93,6 +81,7 @@ def _match_string_literal(s, i, num_brackets, start_loc, get_loc_at):
     chars = []
     if s[i] != '"':
         return None
+    start = i
     i += 1
 
     while True:
@@ -100,9 +89,8 @@ def _match_string_literal(s, i, num_brackets, start_loc, get_loc_at):
             return None
         elif s[i] == '"':
             return (
-                tokens.StringToken(
-                    start_loc.to(get_loc_at(i + 1)),
-                    ''.join(chars)),
+                tokens.StringToken.at(
+                    line_table, start, i + 1, ''.join(chars)),
                 i + 1,
                 num_brackets)
         elif s[i] == '\\':
@@ -117,7 +105,7 @@ def _match_string_literal(s, i, num_brackets, start_loc, get_loc_at):
                 i += 1
             else:
                 raise LexError(
-                    get_loc_at(i).as_range,
+                    line_table.get_range(i, i),
                     "A backslash in a string literal must be followed by one of: {}"
                         .format(sorted(STRING_LITERAL_BACKSLASH_CHARS)))
         else:
@@ -125,26 +113,26 @@ def _match_string_literal(s, i, num_brackets, start_loc, get_loc_at):
         i += 1
 
 
-def _match_left_bracket(s, i, num_brackets, start_loc, get_loc_at):
+def _match_left_bracket(s, i, num_brackets, line_table):
     if num_brackets > 0:
         return None
 
     if s[i] == LEFT_ANGLE_BRACKET:
         return (
-            tokens.BracketLeftToken(start_loc.to(get_loc_at(i + 1)), s[i]),
+            tokens.BracketLeftToken.at(line_table, i, i + 1, s[i]),
             i + 1,
             num_brackets + 1)
     else:
         return None
 
 
-def _match_right_bracket(s, i, num_brackets, start_loc, get_loc_at):
+def _match_right_bracket(s, i, num_brackets, line_table):
     if num_brackets < 1:
         return None
 
     if s[i] == RIGHT_ANGLE_BRACKET:
         return (
-            tokens.BracketRightToken(start_loc.to(get_loc_at(i + 1)), s[i]),
+            tokens.BracketRightToken.at(line_table, i, i + 1, s[i]),
             i + 1,
             num_brackets - 1)
     else:
@@ -153,13 +141,12 @@ def _match_right_bracket(s, i, num_brackets, start_loc, get_loc_at):
 
 def _make_re_matcher(expr, required_num_brackets, Cls):
     re_compiled = re.compile(expr)
-    def match(s, i, num_brackets, start_loc, get_loc_at):
+    def match(s, i, num_brackets, line_table):
         match = re_compiled.match(s, i)
         if match and num_brackets == required_num_brackets:
-            text = match.group(0)
             return (
-                Cls(start_loc.to(get_loc_at(i + len(text))), text),
-                i + len(text),
+                Cls.at(line_table, i, match.end(), match.group(0)),
+                match.end(),
                 num_brackets)
         else:
             return None
@@ -180,40 +167,26 @@ TOKEN_FNS = [
 
 
 def lex_html_no_catch(s):
-    line_indexes = [0] + [m.start() for m in re.finditer('\n', s)] + [len(s)]
-    line = 0
+    line_table = LineTable(s)
     i = 0
     num_brackets = 0
     while i < len(s):
         j = i
-        while line_indexes[line] < - i:
-            line += 1
-        col = i - line_indexes[line]
-        loc = SourceLocation(line, col, i)
-
-        def get_loc_at(i2):
-            line2 = line
-            while line_indexes[line2] < - i2:
-                line2 += 1
-            return SourceLocation(line, i2 - line_indexes[line2], i2)
-
         for token_fn in TOKEN_FNS:
-            result = token_fn(s, i, num_brackets, loc, get_loc_at)
+            result = token_fn(s, i, num_brackets, line_table)
             if result:
                 (token, i, num_brackets) = result
                 yield token
                 break
         if j == i:
             # meh, just yield text
-            yield tokens.TextToken(loc.as_range, s[i])
+            yield tokens.TextToken.at(line_table, i, i, s[i])
             i += 1
-            #raise LexError(loc, "Could not match character {}".format(s[i]))
-
-    while line_indexes[line] < - i:
-        line += 1
+            #raise LexError(
+            #    line_table.get_range(i, i),
+            #    "Could not match character {}".format(s[i]))
 
-    yield tokens.EndToken(
-        SourceLocation(line, i - line_indexes[line], i).as_range, '')
+    yield tokens.EndToken.at(line_table, i, i, '')
 
 
 def lex_html(config, s):
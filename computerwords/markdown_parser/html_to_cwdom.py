@@ -0,0 +1,173 @@
+"""
+Turns the tokens of an HTML block (see `html_lexer`) into CWDOM nodes with
+two loops and a stack of open tags, instead of building a parse tree with the
+recursive grammar in `html_parser` and then converting it.
+
+It accepts exactly what that grammar accepts and raises the same errors in
+the same order: parse errors first, then errors from converting tag
+arguments and text in document order. Big blocks with many tags take linear
+time and don't use any more of Python's stack than small ones.
+
+`html_parser` is still used to parse single tags (see `cfm_to_cwdom`).
+"""
+
+from computerwords.cwdom.nodes import CWTagNode, CWTextNode
+from .exceptions import SourceException
+from .html_parser import ParseError, TagMismatchError, UnknownTagError
+from .parse_tree_to_cwdom_util import DuplicateArgumentsError
+
+
+# event kinds
+_TEXT = 'text'
+_OPEN = 'open'
+_CLOSE = 'close'
+_SELF_CLOSING = 'self_closing'
+
+
+def _match_tag_contents(tokens, i):
+    """
+    `tag_contents -> space? BBWORD tag_args`
+
+    Returns `(name token, [(key token, value token), ...], next index)`, or
+    `None`
+    """
+    if tokens[i].name == 'SPACE':
+        i += 1
+    if tokens[i].name != 'BBWORD':
+        return None
+    name_token = tokens[i]
+    i += 1
+    args = []
+    # the token list always ends with an END token, so none of these
+    # lookups can go past the end
+    while (tokens[i].name == 'SPACE' and
+           tokens[i + 1].name == 'BBWORD' and
+           tokens[i + 2].name == '=' and
+           tokens[i + 3].name in ('BBWORD', 'STRING')):
+        args.append((tokens[i + 1], tokens[i + 3]))
+        i += 4
+    return name_token, args, i
+
+
+def _match_tag(tokens, i):
+    """
+    Match an open, close, or self-closing tag starting with the `<` at
+    `tokens[i]`. Returns `(kind, name token, args, next index)`, or `None`.
+    """
+    i += 1
+    contents = _match_tag_contents(tokens, i)
+    if contents is not None:
+        name_token, args, j = contents
+        # open_tag -> < tag_contents >
+        if tokens[j].name == '>':
+            return _OPEN, name_token, args, j + 1
+        # self_closing_tag -> < tag_contents space? / space? >
+        if tokens[j].name == 'SPACE':
+            j += 1
+        if tokens[j].name == '/':
+            j += 1
+            if tokens[j].name == 'SPACE':
+                j += 1
+            if tokens[j].name == '>':
+                return _SELF_CLOSING, name_token, args, j + 1
+        return None
+
+    # close_tag -> < space? / BBWORD >
+    if tokens[i].name == 'SPACE':
+        i += 1
+    if (tokens[i].name == '/' and
+            tokens[i + 1].name == 'BBWORD' and
+            tokens[i + 2].name == '>'):
+        return _CLOSE, tokens[i + 1], None, i + 3
+    return None
+
+
+def _tokens_to_events(tokens, config):
+    """
+    Returns a flat list of `(kind, token, args)` in document order, or raises
+    the error the grammar would raise.
+    """
+    events = []
+    # (index of '<' token, name token) of each tag that hasn't been closed
+    open_tags = []
+    i = 0
+    while True:
+        token = tokens[i]
+        if token.name == 'TEXT':
+            events.append((_TEXT, token, None))
+            i += 1
+            continue
+        if token.name == 'ε' and not open_tags:
+            return events
+
+        match = _match_tag(tokens, i) if token.name == '<' else None
+        if match is None:
+            # Neither this token nor any tag it is inside of can be parsed,
+            # so the grammar gives up on the outermost one.
+            raise ParseError(tokens[open_tags[0][0]] if open_tags else token)
+
+        kind, name_token, args, i_after = match
+        if kind is _OPEN:
+            open_tags.append((i, name_token))
+        elif kind is _SELF_CLOSING:
+            if (config.allowed_tags and
+                    name_token.value not in config.allowed_tags):
+                raise UnknownTagError(name_token)
+        else:
+            if not open_tags:
+                raise ParseError(token)
+            _, open_name_token = open_tags.pop()
+            if open_name_token.value not in config.allowed_tags:
+                raise UnknownTagError(open_name_token)
+            if open_name_token.value != name_token.value:
+                raise TagMismatchError(open_name_token, name_token)
+        events.append((kind, name_token, args))
+        i = i_after
+
+
+def _args_to_kwargs(args):
+    kwargs = {}
+    for key_token, value_token in args:
+        if key_token.value in kwargs:
+            raise DuplicateArgumentsError(
+                key_token,
+                "Duplicate argument {!r}".format(key_token.value))
+        kwargs[key_token.value] = value_token.value
+    return kwargs
+
+
+def _text_to_nodes(text):
+    return [CWTextNode(text)]
+
+
+def _events_to_cwdom(events, text_to_nodes):
+    children = []
+    # (name, kwargs, parent's children) of each open tag
+    stack = []
+    for kind, token, args in events:
+        if kind is _TEXT:
+            children.extend(text_to_nodes(token.value))
+        elif kind is _OPEN:
+            stack.append((token.value, _args_to_kwargs(args), children))
+            children = []
+        elif kind is _SELF_CLOSING:
+            children.append(CWTagNode(token.value, _args_to_kwargs(args)))
+        else:
+            name, kwargs, parent_children = stack.pop()
+            parent_children.append(CWTagNode(name, kwargs, children))
+            children = parent_children
+    return children
+
+
+def parse_html_to_cwdom(tokens, config, text_to_nodes=_text_to_nodes):
+    """
+    Returns a list of CWDOM nodes for `tokens`, the output of `lex_html()`.
+    Each `TEXT` token becomes the list of nodes returned by
+    `text_to_nodes(text)`, which by default is a single `CWTextNode`.
+    """
+    try:
+        events = _tokens_to_events(tokens, config)
+    except SourceException as e:
+        e.apply_config(config)
+        raise e
+    return _events_to_cwdom(events, text_to_nodes)
@@ -11,10 +11,11 @@ def parse_tree_to_cwdom(root):
 
 def stmts_to_list(stmts):
     assert type(stmts) is StmtsNode
-    if stmts.form_num == 1:
-        return [stmt_to_tag_or_text(stmts.stmt)] + stmts_to_list(stmts.stmts)
-    else:
-        return []
+    nodes = []
+    while stmts.form_num == 1:
+        nodes.append(stmt_to_tag_or_text(stmts.stmt))
+        stmts = stmts.stmts
+    return nodes
 
 def stmt_to_tag_or_text(stmt):
     if stmt.form_num == 1:
@@ -21,10 +21,11 @@ def tag_args_to_dict(tag_args):
 
 def tag_args_to_list(tag_args):
     assert type(tag_args) is TagArgsNode
-    if tag_args.form_num == 1:
-        return [tag_args.tag_arg] + tag_args_to_list(tag_args.tag_args)
-    else:
-        return []
+    result = []
+    while tag_args.form_num == 1:
+        result.append(tag_args.tag_arg)
+        tag_args = tag_args.tag_args
+    return result
 
 
 def get_tag_arg_value(tag_arg):
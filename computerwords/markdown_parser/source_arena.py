@@ -0,0 +1,63 @@
+"""
+Keeps the source of every document in one memory-mapped temporary file, so
+that long text nodes can point into it (see `CWSpanTextNode`) instead of each
+holding a copy of their text in memory.
+
+```python
+arena = SourceArena()
+offset = arena.append('Some text'.encode('utf-8'))
+arena.get_text(offset + 5, offset + 9)  # 'text'
+```
+"""
+
+import mmap
+import tempfile
+import threading
+
+
+class SourceArena:
+    """
+    An append-only file of UTF-8 text. Offsets are in bytes. Only one file
+    descriptor is used no matter how many documents are added.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._file = tempfile.TemporaryFile()
+        self._size = 0
+        self._mmap = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, data):
+        """Add `data` (`bytes`) to the end and return its offset"""
+        with self._lock:
+            offset = self._size
+            self._file.seek(offset)
+            self._file.write(data)
+            self._size += len(data)
+            return offset
+
+    def get_text(self, start, end):
+        """Returns the text between byte offsets `start` and `end`"""
+        mapped = self._mmap
+        if mapped is None or end > len(mapped):
+            with self._lock:
+                if self._mmap is None or end > len(self._mmap):
+                    self._file.flush()
+                    # the old map isn't closed, since another thread may be
+                    # reading from it; it closes when it is garbage collected
+                    self._mmap = mmap.mmap(
+                        self._file.fileno(), self._size,
+                        access=mmap.ACCESS_READ)
+                mapped = self._mmap
+        return mapped[start:end].decode('utf-8')
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.close()
@@ -1,3 +1,6 @@
+import re
+
+from bisect import bisect_right
 from collections import namedtuple
 
 
@@ -74,3 +77,27 @@ class SourceRange(SourceRangeBase):
             start_col=self.start.col + 1,
             end_line=self.end.line + 1,
             end_col=self.end.col + 1)
+
+
+class LineTable:
+    """
+    Turns character offsets into `SourceLocation`s for one string. Tokens
+    keep only their offsets and a reference to the table, and the line
+    starts are only found the first time a location is asked for, which is
+    usually never, since locations are only needed for error messages.
+    """
+
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+        self._line_starts = None
+
+    def get_loc(self, char):
+        if self._line_starts is None:
+            self._line_starts = [0] + [
+                m.end() for m in re.finditer('\n', self.text)]
+        line = bisect_right(self._line_starts, char) - 1
+        return SourceLocation(line, char - self._line_starts[line], char)
+
+    def get_range(self, start, end):
+        return SourceRange(self.get_loc(start), self.get_loc(end))
@@ -2,11 +2,37 @@ from .src_loc import SourceRange
 
 
 class Token:
+    """
+    `start` and `end` are character offsets into the lexed string. `loc`,
+    the `SourceRange` with lines and columns, is only worked out if it's
+    asked for.
+    """
+
     def __init__(self, loc, value):
         super().__init__()
         assert(isinstance(loc, SourceRange))
         self.value = value
-        self.loc = loc
+        self.start = loc.start.char
+        self.end = loc.end.char
+        self._loc = loc
+        self._line_table = None
+
+    @classmethod
+    def at(cls, line_table, start, end, value):
+        """Make a token at offsets `start`-`end` of `line_table.text`"""
+        self = cls.__new__(cls)
+        self.value = value
+        self.start = start
+        self.end = end
+        self._loc = None
+        self._line_table = line_table
+        return self
+
+    @property
+    def loc(self):
+        if self._loc is None:
+            self._loc = self._line_table.get_range(self.start, self.end)
+        return self._loc
 
     def __eq__(self, other):
         return (
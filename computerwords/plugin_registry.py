@@ -0,0 +1,224 @@
+"""
+Finds plugins and imports them only when they are needed.
+
+Each entry in the `"plugins"` config list can be:
+
+* The name of a built-in plugin, such as `"computerwords.plugins.graphviz"`.
+  Built-in plugins are imported the first time a node with one of their tags
+  is processed, or when their writer is used.
+* The name of a `computerwords.plugins` entry point provided by an installed
+  package. Its value should be a class path like `"my_package.plugin:MyPlugin"`.
+* A class path like `"my_package.plugin:MyPlugin"`.
+* A module path like `"my_package.plugin"`. Every `CWPlugin` subclass in the
+  module's `__all__` (or in the whole module if it has no `__all__`) is used.
+* A dict like `{"class": "my_package.plugin:MyPlugin", "tags": ["my-tag"]}`,
+  optionally with a `"writer"` key. Like built-in plugins, these are imported
+  only when one of `"tags"` or `"writer"` is needed.
+
+Plugins in the last category must only add processors for the tags they
+declare.
+"""
+
+import importlib
+import logging
+from collections import namedtuple
+
+from computerwords.config import DictCascade
+
+
+log = logging.getLogger(__name__)
+
+
+ENTRY_POINT_GROUP = 'computerwords.plugins'
+
+
+"""
+`tags` and `writer_name` are `None` if they aren't known without importing the
+plugin, in which case it is imported eagerly.
+"""
+PluginSpec = namedtuple(
+    'PluginSpec', ['name', 'class_path', 'tags', 'writer_name'])
+
+
+_HEADING_TAGS = {'h' + str(i) for i in range(1, 7)}
+
+
+BUILTIN_PLUGIN_SPECS = {
+    spec.name: spec for spec in [
+        PluginSpec(
+            'computerwords.plugins.callouts',
+            'computerwords.plugins.callouts:CalloutsPlugin',
+            {'note', 'warning'}, None),
+        PluginSpec(
+            'computerwords.plugins.heading_aliases',
+            'computerwords.plugins.heading_aliases:HeadingAliasesPlugin',
+            {'heading-alias', 'heading-link'} | _HEADING_TAGS, None),
+        PluginSpec(
+            'computerwords.plugins.htmlwriter',
+            'computerwords.plugins.htmlwriter:HTMLWriterPlugin',
+            set(), 'html'),
+        PluginSpec(
+            'computerwords.plugins.searchwriter',
+            'computerwords.plugins.searchwriter:SearchWriterPlugin',
+            set(), 'search'),
+        PluginSpec(
+            'computerwords.plugins.graphviz',
+            'computerwords.plugins.graphviz:GraphvizPlugin',
+            {'pre'}, None),
+        PluginSpec(
+            'computerwords.plugins.pygments',
+            'computerwords.plugins.pygments:PygmentsPlugin',
+            {'pre'}, None),
+        PluginSpec(
+            'computerwords.plugins.python35',
+            'computerwords.plugins.python35:Python35Plugin',
+            {'autodoc-python'}, None),
+    ]
+}
+
+
+class PluginError(Exception): pass
+
+
+_entry_point_class_paths = None
+def _get_entry_point_class_paths():
+    global _entry_point_class_paths
+    if _entry_point_class_paths is None:
+        _entry_point_class_paths = {}
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:  # Python < 3.8
+            return _entry_point_class_paths
+        eps = entry_points()
+        if hasattr(eps, 'select'):
+            group = eps.select(group=ENTRY_POINT_GROUP)
+        else:
+            group = eps.get(ENTRY_POINT_GROUP, [])
+        for ep in group:
+            _entry_point_class_paths[ep.name] = ep.value
+    return _entry_point_class_paths
+
+
+def get_plugin_spec(entry):
+    """Returns a `PluginSpec` for an entry in the `"plugins"` config list."""
+    if isinstance(entry, dict):
+        if 'class' not in entry:
+            raise PluginError(
+                "Plugin config {!r} has no 'class' key".format(entry))
+        return PluginSpec(
+            entry['class'], entry['class'],
+            set(entry.get('tags', [])), entry.get('writer', None))
+    if entry in BUILTIN_PLUGIN_SPECS:
+        return BUILTIN_PLUGIN_SPECS[entry]
+    if ':' not in entry:
+        class_path = _get_entry_point_class_paths().get(entry, None)
+        if class_path is not None:
+            return PluginSpec(entry, class_path, None, None)
+    return PluginSpec(entry, entry, None, None)
+
+
+def _import_plugin_classes(class_path):
+    from computerwords.plugin import CWPlugin
+
+    if ':' in class_path:
+        module_path, class_name = class_path.split(':', 1)
+        module = importlib.import_module(module_path)
+        return [getattr(module, class_name)]
+
+    module = importlib.import_module(class_path)
+    if hasattr(module, '__all__'):
+        candidates = [getattr(module, name) for name in module.__all__]
+    else:
+        candidates = module.__dict__.values()
+    classes = []
+    for maybe_cls in candidates:
+        try:
+            if issubclass(maybe_cls, CWPlugin):
+                classes.append(maybe_cls)
+        except TypeError:
+            pass
+    return classes
+
+
+class PluginLoader:
+    """
+    Owns every plugin named in the config. Plugins with known tags are
+    registered with the library as lazy processors, and only imported when
+    the library needs one of their tags.
+    """
+
+    def __init__(self, entries):
+        super().__init__()
+        self.specs = []
+        seen = set()
+        for entry in entries:
+            spec = get_plugin_spec(entry)
+            if spec.name not in seen:
+                seen.add(spec.name)
+                self.specs.append(spec)
+        # spec name -> [plugin]
+        self._loaded = {}
+        self.config = None
+        self.library = None
+
+    @property
+    def plugins(self):
+        """All plugins imported so far, in config order"""
+        return [
+            plugin
+            for spec in self.specs if spec.name in self._loaded
+            for plugin in self._loaded[spec.name]]
+
+    def _is_lazy(self, spec):
+        return spec.tags is not None
+
+    def load_eager_plugins(self):
+        """Import every plugin whose tags are unknown, and return the list
+        of them. Call this before building the config so their defaults can
+        be included."""
+        for spec in self.specs:
+            if not self._is_lazy(spec):
+                self._loaded[spec.name] = [
+                    cls() for cls in _import_plugin_classes(spec.class_path)]
+        return self.plugins
+
+    def configure(self, config, library):
+        """
+        Finish setting up eager plugins using the fully resolved `config`,
+        and tell `library` how to load the lazy ones.
+        """
+        self.config = config
+        self.library = library
+        for spec in self.specs:
+            if self._is_lazy(spec):
+                library.add_lazy_processors(
+                    spec.tags, lambda spec=spec: self._load(spec))
+            else:
+                for plugin in self._loaded[spec.name]:
+                    plugin.postprocess_config(config)
+                    plugin.add_processors(library)
+
+    def _load(self, spec):
+        if spec.name in self._loaded:
+            return
+        log.debug("Loading plugin {}".format(spec.class_path))
+        plugins = [cls() for cls in _import_plugin_classes(spec.class_path)]
+        self._loaded[spec.name] = plugins
+        for plugin in plugins:
+            if plugin.CONFIG_NAMESPACE is not None:
+                self.config[plugin.CONFIG_NAMESPACE] = dict(DictCascade(
+                    plugin.get_default_config() or {},
+                    self.config.get(plugin.CONFIG_NAMESPACE, {})))
+            plugin.postprocess_config(self.config)
+            plugin.add_processors(self.library)
+
+    def get_writer(self, name):
+        """Returns the plugin providing the writer called `name`, importing
+        it if necessary, or `None`."""
+        for spec in self.specs:
+            if self._is_lazy(spec) and spec.writer_name == name:
+                self._load(spec)
+        for plugin in self.plugins:
+            if plugin.WRITER_NAME == name:
+                return plugin
+        return None
@@ -1,10 +1,15 @@
 import hashlib
-import subprocess
+import logging
+import os
+import threading
 
 from computerwords.cwdom.nodes import CWTagNode, CWTextNode
 from computerwords.plugin import CWPlugin
 
 
+log = logging.getLogger(__name__)
+
+
 class GraphvizPlugin(CWPlugin):
 
     CONFIG_NAMESPACE = 'graphviz'
@@ -15,14 +20,14 @@ class GraphvizPlugin(CWPlugin):
         }
 
     def add_processors(self, library):
-        @library.processor('pre')
+        @library.processor('pre', document_local=True)
         def lang_graphviz_convert(tree, node):
             if node.kwargs.get('language', None) != 'graphviz-dot-convert':
                 return
             _do_graphviz(tree, node, node.children[0].text)
 
 
-        @library.processor('pre')
+        @library.processor('pre', document_local=True)
         def lang_graphviz_convert(tree, node):
             if node.kwargs.get('language', None) != 'graphviz-simple':
                 return
@@ -45,14 +50,39 @@ def _do_graphviz(tree, node, text):
     filename = "{}.{}".format(h.hexdigest(), output_format)
     output_path = tree.env['output_dir'] / filename
     src = output_path.relative_to(tree.env['output_dir'])
-    p = subprocess.Popen(
-        ['dot', '-T' + output_format, '-o', str(output_path)],
-        stdin=subprocess.PIPE)
-    p.communicate(code, timeout=10)
-    tree.replace_subtree(
-        node, CWTagNode('figure', {'class': 'image graphviz-graph'}, [
+
+    def make_figure(result=None):
+        return CWTagNode('figure', {'class': 'image graphviz-graph'}, [
             CWTagNode('img', {'src': str(src)}),
-        ]))
+        ])
+
+    # the filename is a hash of the source, so if it exists (or is being
+    # rendered by another node right now), it's already up to date.
+    rendered_paths = tree.processor_data.setdefault('graphviz_paths', set())
+    if output_path in rendered_paths or output_path.exists():
+        tree.replace_subtree(node, make_figure())
+        return
+    rendered_paths.add(output_path)
+
+    # render to a temp file and rename it, so a half-written file from an
+    # interrupted build is never mistaken for a cached one. The process and
+    # thread IDs keep workers rendering the same graph from sharing it.
+    tmp_path = output_path.with_name('{}.{}.{}.tmp'.format(
+        output_path.name, os.getpid(), threading.get_ident()))
+
+    def finish_render(result):
+        if result.returncode == 0:
+            tmp_path.replace(output_path)
+        else:
+            log.error("dot failed to render {}: {}".format(
+                output_path.name, result.stderr.decode('UTF-8', 'replace')))
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return make_figure()
+
+    tree.replace_subtree(node, tree.submit_subprocess(
+        ['dot', '-T' + output_format, '-o', str(tmp_path)],
+        input=code, timeout=10, on_complete=finish_render))
 
 
-__all__ = ['GraphvizPlugin']
\ No newline at end of file
+__all__ = ['GraphvizPlugin']
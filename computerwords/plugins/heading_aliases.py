@@ -3,22 +3,37 @@ import logging
 from computerwords.plugin import CWPlugin
 
 from computerwords.cwdom.nodes import CWEmptyNode, CWLinkNode
-from computerwords.cwdom.traversal import find_ancestor, preorder_traversal
+from computerwords.cwdom.traversal import find_ancestor
 
 
 log = logging.getLogger(__name__)
 
 
+HEADING_TAG_NAMES = {'h' + str(i) for i in range(1, 7)}
+
+
 class HeadingAliasesPlugin(CWPlugin):
 
     def add_processors(self, library):
 
         def init(tree):
             tree.processor_data.setdefault('heading_aliases', {})
-            tree.processor_data.setdefault('heading_alias_nodes', set())
-            tree.processor_data.setdefault('heading_link_nodes', set())
-
-        @library.processor('heading-alias')
+            # document_id -> {heading-alias nodes waiting for a heading}
+            tree.processor_data.setdefault('heading_alias_nodes', {})
+            # alias name -> {heading-link nodes waiting for the alias}
+            tree.processor_data.setdefault('heading_link_nodes', {})
+
+        def dirty_waiting_nodes(tree, key, waiting_key):
+            # waiting nodes re-add themselves if they still can't resolve
+            waiting = tree.processor_data[key].pop(waiting_key, ())
+            for waiting_node in waiting:
+                tree.mark_node_dirty(waiting_node)
+
+        # aliases run after every heading has a TOC entry, and links run
+        # after every alias has been resolved. the dirtying below only
+        # matters for headings and aliases created by later processors.
+        @library.processor(
+            'heading-alias', consumes=['toc_entry'], produces=['heading_alias'])
         def process_heading_alias(tree, node):
             init(tree)
 
@@ -27,17 +42,15 @@ class HeadingAliasesPlugin(CWPlugin):
 
             # by visiting this alias, some links may be come valid.
             # make sure they are visited later.
-            for link in tree.processor_data['heading_link_nodes']:
-                if link.kwargs['name'] == node.kwargs['name']:
-                    tree.mark_node_dirty(link)
+            dirty_waiting_nodes(
+                tree, 'heading_link_nodes', node.kwargs['name'])
 
             # find the "next" node with a TOC entry in this document.
             document = find_ancestor(node, lambda n: n.name == 'Document')
-            toc_node = None
-            for maybe_h in preorder_traversal(document, node):
-                if maybe_h.data.get('toc_entry', None):
-                    toc_node = maybe_h
-                    break
+            toc_node = tree.get_order_index().find_next(
+                node, names=HEADING_TAG_NAMES,
+                predicate=lambda n: n.data.get('toc_entry', None),
+                within=document)
 
             # if we found one, copy its TOC entry.
             if toc_node:
@@ -52,7 +65,8 @@ class HeadingAliasesPlugin(CWPlugin):
                 # the TOC entry might not have been created yet, so store a
                 # reference to this node so our h* visitors can re-dirty it
                 # and try again.
-                tree.processor_data['heading_alias_nodes'].add(node)
+                tree.processor_data['heading_alias_nodes'].setdefault(
+                    node.document_id, set()).add(node)
 
         @library.processor('h1')
         @library.processor('h2')
@@ -64,13 +78,12 @@ class HeadingAliasesPlugin(CWPlugin):
             init(tree)
 
             # dirty all heading-alias nodes in this document.
-            for ha in tree.processor_data['heading_alias_nodes']:
-                if ha.document_id == node.document_id:
-                    tree.mark_node_dirty(ha)
+            dirty_waiting_nodes(
+                tree, 'heading_alias_nodes', node.document_id)
 
-        @library.processor('heading-link')
+        @library.processor('heading-link', consumes=['heading_alias'])
         def process_heading_link(tree, node):
-            tree.processor_data.setdefault('heading_alias_nodes', set())
+            init(tree)
             assert('name' in node.kwargs)
 
             # If the alias has been defined, replace this node with a link
@@ -87,7 +100,8 @@ class HeadingAliasesPlugin(CWPlugin):
             else:
                 # otherwise, keep a reference to this node so that a
                 # heading-alias tag can later dirty it if it's a match.
-                tree.processor_data['heading_link_nodes'].add(node)
+                tree.processor_data['heading_link_nodes'].setdefault(
+                    node.kwargs['name'], set()).add(node)
 
 
 __all__ = ['HeadingAliasesPlugin']
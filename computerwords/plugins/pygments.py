@@ -21,7 +21,7 @@ class PygmentsPlugin(CWPlugin):
         return {}
 
     def add_processors(self, library):
-        @library.processor('pre')
+        @library.processor('pre', document_local=True)
         def lang_pygments_convert(tree, node):
             if node.data.get('pygments_done', False):
                 return
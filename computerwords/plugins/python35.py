@@ -29,7 +29,9 @@ class Python35Plugin(CWPlugin):
 
     def add_processors(self, library):
         self.library = library
-        library.processor('autodoc-python', self.process_autodoc_module)
+        library.processor(
+            'autodoc-python', self.process_autodoc_module,
+            document_local=True)
 
     def process_autodoc_module(self, tree, node):
         # load symbol tree
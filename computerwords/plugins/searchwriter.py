@@ -0,0 +1,29 @@
+import logging
+
+from computerwords.plugin import CWPlugin
+
+
+log = logging.getLogger(__name__)
+
+
+class SearchWriterPlugin(CWPlugin):
+    """
+    Writes a search index for the site (see `computerwords.searchwriter`).
+    Use it with `--writer search`, usually together with `--writer html`.
+    """
+
+    CONFIG_NAMESPACE = 'search'
+
+    def get_default_config(self):
+        return {
+            # directory inside the output directory to write the index to
+            "dir_name": "search",
+            # number of (term, section) pairs to keep in memory before
+            # spilling them to a temporary file
+            "max_postings_in_memory": 1000000,
+        }
+
+    WRITER_NAME = "search"
+    def write(self, config, src_root, dest_root, stdlib, tree):
+        from computerwords.searchwriter import write as write_search_index
+        write_search_index(config, src_root, dest_root, stdlib, tree)
@@ -109,12 +109,21 @@ def doc_subtree_to_cwdom(subtree, get_doc_cwdom, doc):
         yield from doc_subtree_to_cwdom(child, get_doc_cwdom, doc)
 
 
-def read_doc_tree(root_path, file_hierarchy_conf, get_doc_cwdom):
-    doc_tree = DocTree(chain_list([
+def get_doc_tree(root_path, file_hierarchy_conf):
+    return DocTree(chain_list([
         _conf_entry_to_doc_subtree(root_path, entry)
         for entry in file_hierarchy_conf
     ]))
-    document_nodes = chain_list(
-        [doc_subtree_to_cwdom(doc, get_doc_cwdom, doc)
-        for doc in doc_tree])
+
+
+def iterate_document_nodes(doc_tree, get_doc_cwdom):
+    """Yields the `CWDocumentNode` of each document in `doc_tree`, reading
+    each one only when it is needed"""
+    for doc in doc_tree:
+        yield from doc_subtree_to_cwdom(doc, get_doc_cwdom, doc)
+
+
+def read_doc_tree(root_path, file_hierarchy_conf, get_doc_cwdom):
+    doc_tree = get_doc_tree(root_path, file_hierarchy_conf)
+    document_nodes = list(iterate_document_nodes(doc_tree, get_doc_cwdom))
     return doc_tree, document_nodes
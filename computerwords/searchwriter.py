@@ -0,0 +1,243 @@
+"""
+Writes a full-text search index of the processed tree, for searching the
+site from the browser without a server.
+
+Every document is split into *sections*, one per table of contents entry,
+plus one for any text before a document's first heading. The index is
+written to a directory (`search/` by default) in the output directory:
+
+* `manifest.json`: `{"version": 1, "prefix_length": 2, "num_sections": N,
+  "sections": "sections.json.gz", "shards": {prefix: file name, ...}}`
+* `sections.json.gz`: a list of `[url, title]`, where `url` is relative to
+  the site root, like `"api/index.html#CWTree"`. A section's position in
+  this list is its ID.
+* One gzipped JSON file per term prefix: `{term: postings, ...}`, where
+  `postings` is a flat list `[section ID, count, section ID, count, ...]`
+  with each section ID stored as the difference from the previous one.
+
+A browser client lowercases each query term, looks up its first
+`prefix_length` characters in `shards`, and only downloads those files.
+
+Terms are collected one section at a time. When more than
+`max_postings_in_memory` (term, section) pairs have been collected, they
+are sorted and spilled to a temporary file, and the files are merged at the
+end, so the number of postings in memory doesn't grow with the size of the
+site.
+"""
+
+import gzip
+import heapq
+import html
+import itertools
+import json
+import logging
+import re
+import tempfile
+import urllib.parse
+from collections import Counter
+
+
+log = logging.getLogger(__name__)
+
+
+INDEX_VERSION = 1
+PREFIX_LENGTH = 2
+MANIFEST_NAME = 'manifest.json'
+SECTIONS_NAME = 'sections.json.gz'
+
+_TERM_RE = re.compile(r'\w{2,}')
+_TAG_RE = re.compile(r'<[^>]*>')
+
+
+def tokenize(text):
+    """Returns the list of search terms in `text`"""
+    return _TERM_RE.findall(text.lower())
+
+
+def _text_of(node):
+    if node.escape:
+        return node.text
+    else:
+        # raw HTML, like syntax highlighted code
+        return html.unescape(_TAG_RE.sub(' ', node.text))
+
+
+def _document_url(document_id):
+    return '/'.join(document_id) + '.html'
+
+
+def _is_table_of_contents(node):
+    # the table of contents itself is a CWSharedNode, which has no children,
+    # but its heading is a normal node
+    return (
+        node.name == 'div' and
+        node.kwargs.get('class') == 'table-of-contents-wrapper')
+
+
+def iterate_sections(tree):
+    """
+    Yields `(url, title, [text, ...])` for each section of each document,
+    in document order. The table of contents is not included.
+    """
+    url = title = None
+    texts = []
+    # one document at a time, so spilled documents (see
+    # `computerwords.cwdom.spill`) aren't all loaded at once
+    for document_node in tree.root.children:
+        stack = [document_node]
+        while stack:
+            node = stack.pop()
+            if _is_table_of_contents(node):
+                continue
+            stack.extend(reversed(node.children))
+
+            if node.name == 'Document' or 'toc_entry' in node.data:
+                if texts:
+                    yield url, title, texts
+                texts = []
+                if node.name == 'Document':
+                    url = _document_url(node.document_id)
+                    title = '/'.join(node.document_id)
+                else:
+                    url = '{}#{}'.format(
+                        _document_url(node.document_id),
+                        node.data['toc_entry'].ref_id)
+                    title = tree.subtree_to_text(node)
+            elif node.name == 'Text' and url is not None:
+                texts.append(_text_of(node))
+    if texts:
+        yield url, title, texts
+
+
+class _PostingsCollector:
+    """Collects `(term, section ID, count)` triples, spilling them to sorted
+    temporary files when there are too many to keep in memory"""
+
+    def __init__(self, temp_dir, max_postings_in_memory):
+        super().__init__()
+        self.temp_dir = temp_dir
+        self.max_postings_in_memory = max_postings_in_memory
+        self.postings = []
+        self.run_paths = []
+
+    def add_section(self, section_id, terms):
+        for term, count in Counter(terms).items():
+            self.postings.append((term, section_id, count))
+        if len(self.postings) >= self.max_postings_in_memory:
+            self._spill()
+
+    def _spill(self):
+        self.postings.sort()
+        path = '{}/run{}.txt'.format(self.temp_dir, len(self.run_paths))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(
+                '{}\t{}\t{}\n'.format(*posting) for posting in self.postings)
+        log.debug("Spilled {} postings to {}".format(len(self.postings), path))
+        self.run_paths.append(path)
+        self.postings = []
+
+    def _read_run(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                term, section_id, count = line.rstrip('\n').split('\t')
+                yield term, int(section_id), int(count)
+
+    def iterate_sorted(self):
+        """Yields every posting, sorted by term, then section ID"""
+        self.postings.sort()
+        return heapq.merge(
+            self.postings, *[self._read_run(path) for path in self.run_paths])
+
+
+def _write_gzipped_json(path, value):
+    # mtime=0 so unchanged indexes are byte-for-byte identical
+    with gzip.GzipFile(str(path), 'wb', mtime=0) as f:
+        f.write(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+def _shard_file_name(prefix):
+    return urllib.parse.quote(prefix, safe='') + '.json.gz'
+
+
+def _remove_index(index_dir):
+    """Remove the files of an index written earlier, since its shards may
+    not all be overwritten"""
+    with (index_dir / MANIFEST_NAME).open('r') as f:
+        manifest = json.load(f)
+    file_names = [manifest['sections']] + list(manifest['shards'].values())
+    for file_name in file_names:
+        path = index_dir / file_name
+        if path.exists():
+            path.unlink()
+
+
+def write_index(tree, output_dir, max_postings_in_memory=1000000):
+    """Write the search index of `tree` to the directory `output_dir`"""
+    if (output_dir / MANIFEST_NAME).exists():
+        _remove_index(output_dir)
+    elif not output_dir.exists():
+        output_dir.mkdir(parents=True)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        collector = _PostingsCollector(temp_dir, max_postings_in_memory)
+        sections = []
+        for url, title, texts in iterate_sections(tree):
+            terms = []
+            for text in texts:
+                terms.extend(tokenize(text))
+            collector.add_section(len(sections), terms)
+            sections.append([url, title])
+        _write_gzipped_json(output_dir / SECTIONS_NAME, sections)
+
+        shards = {}
+        postings_by_prefix = itertools.groupby(
+            collector.iterate_sorted(), lambda p: p[0][:PREFIX_LENGTH])
+        for prefix, prefix_postings in postings_by_prefix:
+            shard = {}
+            for term, term_postings in itertools.groupby(
+                    prefix_postings, lambda p: p[0]):
+                flat_postings = []
+                last_section_id = 0
+                for _, section_id, count in term_postings:
+                    flat_postings.append(section_id - last_section_id)
+                    flat_postings.append(count)
+                    last_section_id = section_id
+                shard[term] = flat_postings
+            shards[prefix] = _shard_file_name(prefix)
+            _write_gzipped_json(output_dir / shards[prefix], shard)
+
+    with (output_dir / MANIFEST_NAME).open('w') as f:
+        json.dump({
+            'version': INDEX_VERSION,
+            'prefix_length': PREFIX_LENGTH,
+            'num_sections': len(sections),
+            'sections': SECTIONS_NAME,
+            'shards': shards,
+        }, f, sort_keys=True)
+    log.info("Wrote search index of {} sections in {} shards to {}".format(
+        len(sections), len(shards), output_dir))
+
+
+def read_postings(index_dir, term):
+    """Returns `[(section ID, count), ...]` for `term` from the index in
+    `index_dir`. Mostly useful for testing."""
+    with (index_dir / MANIFEST_NAME).open('r') as f:
+        manifest = json.load(f)
+    file_name = manifest['shards'].get(term[:manifest['prefix_length']])
+    if file_name is None:
+        return []
+    with gzip.open(str(index_dir / file_name), 'rb') as f:
+        flat_postings = json.loads(f.read().decode('utf-8')).get(term, [])
+    postings = []
+    section_id = 0
+    for delta, count in zip(flat_postings[::2], flat_postings[1::2]):
+        section_id += delta
+        postings.append((section_id, count))
+    return postings
+
+
+def write(config, input_dir, output_dir, library, tree):
+    search_config = config.get('search', {})
+    write_index(
+        tree, output_dir / search_config.get('dir_name', 'search'),
+        search_config.get('max_postings_in_memory', 1000000))
@@ -5,8 +5,14 @@ from .links import add_links
 from .table_of_contents import add_table_of_contents
 
 
-stdlib = Library()
-add_basics(stdlib)
-add_html(stdlib)
-add_links(stdlib)
-add_table_of_contents(stdlib)
+def make_stdlib():
+    """Returns a new `Library` with the standard processors"""
+    library = Library()
+    add_basics(library)
+    add_html(library)
+    add_links(library)
+    add_table_of_contents(library)
+    return library
+
+
+stdlib = make_stdlib()
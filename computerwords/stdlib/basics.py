@@ -1,6 +1,13 @@
 def add_basics(library):
     noop = lambda *args, **kwargs: None
-    library.processor('Root', noop)
-    library.processor('Empty', noop)
-    library.processor('Text', noop)
-    library.processor('Document', noop)
+    library.processor('Root', noop, document_local=True)
+    library.processor('Empty', noop, document_local=True)
+    library.processor('Text', noop, document_local=True)
+    library.processor('Document', noop, document_local=True)
+    library.processor('Shared', noop, document_local=True)
+
+    @library.processor('Job', document_local=True)
+    def process_job(tree, node):
+        # dirtied by CWTree when the job finishes
+        if node.future.done():
+            tree.replace_subtree(node, node.get_replacement())
@@ -86,10 +86,10 @@ def add_html(library):
 
     noop = lambda *args, **kwargs: None
     for html_tag in library.HTML_TAGS:
-        library.processor(html_tag, noop)
+        library.processor(html_tag, noop, document_local=True)
 
     def define_alias(from_tag_name, to_tag_name):
-        @library.processor(from_tag_name)
+        @library.processor(from_tag_name, document_local=True)
         def process_alias(tree, node):
             # it's not strictly necessary to do the copy/replace in this
             # implementation, but if someone has added a processor to the
@@ -99,7 +99,7 @@ def add_html(library):
     for from_tag_name, to_tag_name in library.ALIAS_HTML_TAGS.items():
         define_alias(from_tag_name, to_tag_name)
 
-    @library.processor('a')
+    @library.processor('a', document_local=True)
     def process_a(tree, node):
         # the fanciest no-op...
         if 'href' in node.kwargs:
@@ -109,7 +109,7 @@ def add_html(library):
         else:
             return
 
-    @library.processor('html-enumerate-all-tags')
+    @library.processor('html-enumerate-all-tags', document_local=True)
     def process_enumerate_all_tags(tree, node):
         tree.replace_subtree(node, CWTagNode('tt', {}, [
             CWTextNode(', '.join(sorted(all_tags)))
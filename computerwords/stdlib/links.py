@@ -6,8 +6,8 @@ log = logging.getLogger(__name__)
 
 def add_links(library):
     noop = lambda *args, **kwargs: None
-    library.processor('Anchor', noop)
-    library.processor('Link', noop)
+    library.processor('Anchor', noop, document_local=True)
+    library.processor('Link', noop, document_local=True)
 
     @library.processor('Anchor')
     def process_anchor(tree, node):
@@ -4,10 +4,11 @@ from computerwords.cwdom.nodes import (
     CWAnchorNode,
     CWDocumentNode,
     CWLinkNode,
+    CWSharedNode,
     CWTagNode,
     CWTextNode,
 )
-from computerwords.cwdom.traversal import iterate_ancestors, preorder_traversal
+from computerwords.cwdom.traversal import iterate_ancestors
 
 
 log = logging.getLogger(__name__)
@@ -42,6 +43,8 @@ def _debug_print(entry_and_children, i=0):
 def _add_toc_data_if_not_exists(tree):
     tree.processor_data.setdefault('toc_nodes', [])
     tree.processor_data.setdefault('toc_heading_nodes', [])
+    # incremented whenever any document's entries change
+    tree.processor_data.setdefault('toc_generation', 0)
 
 
 def _node_to_toc_entry(tree, node):
@@ -143,12 +146,12 @@ def add_table_of_contents(library):
     ```
     """
 
-    @library.processor('h1')
-    @library.processor('h2')
-    @library.processor('h3')
-    @library.processor('h4')
-    @library.processor('h5')
-    @library.processor('h6')
+    @library.processor('h1', produces=['toc_entry'])
+    @library.processor('h2', produces=['toc_entry'])
+    @library.processor('h3', produces=['toc_entry'])
+    @library.processor('h4', produces=['toc_entry'])
+    @library.processor('h5', produces=['toc_entry'])
+    @library.processor('h6', produces=['toc_entry'])
     def process_header(tree, node):
         if _boolish_string(node.kwargs.get('skip_toc', '')):
             return
@@ -166,39 +169,57 @@ def add_table_of_contents(library):
         # TODO: mark dirty automatically if in second pass!
         tree.mark_node_dirty(anchor)
 
-        for parent in iterate_ancestors(node):
-            if isinstance(parent, CWDocumentNode):
-                tree.mark_node_dirty(parent)
-                break
+        # only dirties the Document if this heading was added after the
+        # Document's phase
+        tree.mark_consumers_dirty(node, 'toc_entry')
 
-    @library.processor('Document')
+    @library.processor(
+        'Document', consumes=['toc_entry'], produces=['toc_entries'])
     def process_document(tree, node):
         _add_toc_data_if_not_exists(tree)
-        node.data['toc_entries'] = []
+        entries = []
         ref_ids = set()
-        for _node in preorder_traversal(node):
+        headings = tree.get_order_index().get_descendants(
+            node, HEADER_TAG_NAMES)
+        for _node in headings:
             if 'toc_entry' in _node.data:
                 entry = _node.data['toc_entry']
                 if entry.ref_id in ref_ids:
                     continue
                 ref_ids.add(entry.ref_id)
-                node.data['toc_entries'].append(entry)
-        tree.mark_node_dirty(node.get_parent())
+                entries.append(entry)
 
-    @library.processor(TOC_TAG_NAME)
+        # the rest of the TOC only needs to be recomputed if this document's
+        # part of it changed
+        if entries == node.data.get('toc_entries'):
+            return
+        node.data['toc_entries'] = entries
+        node.data['toc_nested_list'] = _entries_to_nested_list(entries)
+        tree.processor_data['toc_generation'] += 1
+        tree.mark_consumers_dirty(node, 'toc_entries')
+
+    @library.processor(TOC_TAG_NAME, produces=['toc_nodes'])
     def process_toc(tree, node):
         _add_toc_data_if_not_exists(tree)
         tree.processor_data['toc_nodes'].append(node)
 
-    @library.processor('Root')
+    @library.processor('Root', consumes=['toc_entries', 'toc_nodes'])
     def process_root(tree, node):
         _add_toc_data_if_not_exists(tree)
+        generation = tree.processor_data['toc_generation']
 
-        doc_path_to_entries = {
-            doc_node.path: doc_node.data['toc_entries']
+        toc_nodes_to_update = [
+            toc_node for toc_node in tree.processor_data['toc_nodes']
+            if toc_node.data.get('toc_generation') != generation]
+        if (tree.processor_data.get('toc_computed_generation') == generation
+                and not toc_nodes_to_update):
+            return
+
+        path_to_doc = OrderedDict(
+            (doc_node.path, doc_node)
             for doc_node in node.children
             if doc_node.name == 'Document'
-        }
+        )
 
         ### compute TOC ###
 
@@ -206,20 +227,24 @@ def add_table_of_contents(library):
             sorted_paths = _doc_tree_to_sorted_paths(
                 tree.env['doc_tree'])
         else:
-            sorted_paths = sorted(doc_path_to_entries.keys())
+            sorted_paths = sorted(path_to_doc.keys())
         top_level_entries = []
         for path in sorted_paths:
-            top_level_entries.extend(
-                _entries_to_nested_list(doc_path_to_entries[path]))
+            top_level_entries.extend(path_to_doc[path].data['toc_nested_list'])
 
         tree.processor_data['toc'] = top_level_entries
+        tree.processor_data['toc_computed_generation'] = generation
 
         ### put TOC in tree ###
 
         entry_to_number = {}
         _store_entry_to_sequence(top_level_entries, entry_to_number, ())
 
-        for toc_node in tree.processor_data['toc_nodes']:
+        # the list only depends on maxdepth, so build it once per maxdepth
+        # and share it between all TOCs
+        max_depth_to_list = {}
+
+        for toc_node in toc_nodes_to_update:
             max_depth = 3
             try:
                 max_depth = int(toc_node.kwargs.get('maxdepth', '3'))
@@ -227,6 +252,11 @@ def add_table_of_contents(library):
                 pass
             assert(max_depth > 0)
 
+            if max_depth not in max_depth_to_list:
+                max_depth_to_list[max_depth] = _nested_list_to_node(
+                    entry_to_number, top_level_entries, max_depth)
+            toc_list = CWSharedNode([max_depth_to_list[max_depth]])
+
             replacement_prefix = []
 
             if _boolish_string(toc_node.kwargs.get('include-heading', 'true')) != False:
@@ -243,31 +273,25 @@ def add_table_of_contents(library):
                 {'class': 'table-of-contents-wrapper'},
                 replacement_prefix + [
                     CWTagNode('nav', {'class': 'table-of-contents'}, [
-                        _nested_list_to_node(
-                            entry_to_number, top_level_entries, max_depth),
+                        toc_list,
                     ])
                 ]
             )
             toc_node.data['node_in_tree'] = replacement
+            toc_node.data['toc_generation'] = generation
 
             tree.replace_subtree(node_to_replace, replacement)
 
         ### add next/prev data to docs ###
 
-        path_to_doc = {
-            doc_node.path: doc_node
-            for doc_node in node.children
-            if doc_node.name == 'Document'
-        }
-
         last_doc = None
         for path in sorted_paths:
             doc = path_to_doc[path]
             if last_doc:
-                if doc_path_to_entries[last_doc.path]:
-                    doc.data['nav_previous_entry'] = doc_path_to_entries[last_doc.path][0]
-                if doc_path_to_entries[doc.path]:
-                    last_doc.data['nav_next_entry'] = doc_path_to_entries[doc.path][0]
+                if last_doc.data['toc_entries']:
+                    doc.data['nav_previous_entry'] = last_doc.data['toc_entries'][0]
+                if doc.data['toc_entries']:
+                    last_doc.data['nav_next_entry'] = doc.data['toc_entries'][0]
             last_doc = doc
 
         # optional: insert heading numbers
@@ -1,10 +1,16 @@
 #!/usr/bin/env python
 
+import re
 import sys
 from setuptools import setup, find_packages
 
 
-VERSION = '1.0b3'
+def get_version():
+    with open('computerwords/__init__.py') as f:
+        return re.search(r"__version__ = '(.*)'", f.read()).group(1)
+
+
+VERSION = get_version()
 
 
 def readme():
@@ -0,0 +1,126 @@
+import sys
+
+from tests.CWTestCase import CWTestCase
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.library import Library
+from computerwords.stdlib.basics import add_basics
+
+
+class JobError(Exception): pass
+
+
+def _raise_job_error():
+    raise JobError()
+
+
+class CWTreeJobsTestCase(CWTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.library = Library()
+        add_basics(self.library)
+        self.library.processor('b', lambda tree, node: None)
+
+    def apply(self, tree):
+        tree.apply_library(self.library)
+        return tree.root.get_string_for_test_comparison()
+
+    def test_job_result_replaces_placeholder(self):
+        @self.library.processor('slow')
+        def process_slow(tree, node):
+            tree.replace_subtree(node, tree.submit_job(
+                lambda text: text.upper(), node.kwargs['text'],
+                on_complete=lambda result: CWTagNode('b', {}, [
+                    CWTextNode(result)])))
+
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [
+                CWTagNode('slow', {'text': 'abc'}),
+                CWTagNode('slow', {'text': 'def'}),
+            ])
+        ]))
+        self.assertEqual(self.apply(tree), self.strip("""
+            Root()
+              Document(path='doc')
+                b(kwargs={})
+                  'ABC'
+                b(kwargs={})
+                  'DEF'
+        """))
+
+    def test_job_result_is_processed(self):
+        @self.library.processor('slow')
+        def process_slow(tree, node):
+            tree.replace_subtree(
+                node, tree.submit_job(lambda: CWTagNode('reverse', {}, [
+                    CWTextNode('abc')])))
+
+        @self.library.processor('reverse')
+        def process_reverse(tree, node):
+            tree.replace_subtree(
+                node, CWTextNode(node.children[0].text[::-1]))
+
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [CWTagNode('slow', {})])
+        ]))
+        self.assertEqual(self.apply(tree), self.strip("""
+            Root()
+              Document(path='doc')
+                'cba'
+        """))
+
+    def test_job_result_children_can_submit_jobs(self):
+        @self.library.processor('slow')
+        def process_slow(tree, node):
+            depth = int(node.kwargs['depth'])
+            if depth == 0:
+                tree.replace_subtree(node, CWTextNode('done'))
+            else:
+                tree.replace_subtree(node, tree.submit_job(
+                    lambda: CWTagNode('b', {}, [
+                        CWTagNode('slow', {'depth': str(depth - 1)})])))
+
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [CWTagNode('slow', {'depth': '2'})])
+        ]))
+        self.assertEqual(self.apply(tree), self.strip("""
+            Root()
+              Document(path='doc')
+                b(kwargs={})
+                  b(kwargs={})
+                    'done'
+        """))
+        self.assertEqual(tree.rounds_per_phase, [1])
+
+    def test_subprocess(self):
+        @self.library.processor('shout')
+        def process_shout(tree, node):
+            tree.replace_subtree(node, tree.submit_subprocess(
+                [sys.executable, '-c',
+                 'import sys; print(sys.stdin.read().upper(), end="")'],
+                input=node.children[0].text.encode('UTF-8'),
+                on_complete=lambda result: CWTextNode(
+                    result.stdout.decode('UTF-8'))))
+
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [
+                CWTagNode('shout', {}, [CWTextNode('hello')])
+            ])
+        ]))
+        self.assertEqual(self.apply(tree), self.strip("""
+            Root()
+              Document(path='doc')
+                'HELLO'
+        """))
+
+    def test_job_error_is_raised(self):
+        @self.library.processor('broken')
+        def process_broken(tree, node):
+            tree.replace_subtree(node, tree.submit_job(_raise_job_error))
+
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [CWTagNode('broken', {})])
+        ]))
+        with self.assertRaises(JobError):
+            tree.apply_library(self.library)
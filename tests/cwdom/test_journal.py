@@ -0,0 +1,135 @@
+import unittest
+
+from tests.CWTestCase import CWTestCase
+from tests.cwdom.test_nodestore import LibraryForTesting
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.journal import (
+    MutationJournal,
+    MutationJournalReplayError,
+    _clone,
+)
+from computerwords.cwdom.nodes import *
+from computerwords.library import Library
+
+
+def _make_document(path, children):
+    document = CWDocumentNode(path, children)
+    document.deep_set_document_id((path,))
+    return document
+
+
+class MutationJournalTestCase(CWTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tree = CWTree(CWRootNode([
+            _make_document('changed', [
+                CWNode('add_own_child'),
+                CWNode('wrap_self'),
+                CWNode('replace_own_contents', [CWNode('a')]),
+                CWNode('replace_self', [CWNode('b')]),
+                CWNode('replace_self_subtree'),
+                CWNode('unshare_child', [
+                    CWSharedNode([CWNode('a'), CWNode('b')]),
+                ]),
+            ]),
+            _make_document('unchanged', [CWNode('a'), CWNode('b')]),
+        ]))
+        self.tree.journal = MutationJournal()
+        # same node IDs as the tree before processing
+        self.unprocessed_root = _clone(self.tree.root, True)
+        self.tree.apply_library(LibraryForTesting())
+
+    def test_records_operations(self):
+        self.assertEqual(
+            [entry.operation for entry in self.tree.journal], [
+                'insert_subtree', 'wrap_node', 'replace_subtree',
+                'replace_node', 'replace_subtree', 'replace_subtree',
+                'insert_subtree',
+            ])
+
+    def test_changed_document_ids(self):
+        self.assertEqual(
+            self.tree.journal.get_changed_document_ids(), {('changed',)})
+
+    def test_replay(self):
+        expected = self.tree.root.get_string_for_test_comparison()
+        for _ in range(2):
+            tree = CWTree(_clone(self.unprocessed_root, True))
+            self.tree.journal.replay(tree)
+            self.assertEqual(
+                tree.root.get_string_for_test_comparison(), expected)
+            for node in tree.preorder_traversal():
+                for child in node.children:
+                    self.assertIs(child.get_parent(), node)
+            self.assertEqual(
+                [node.id for node in tree.preorder_traversal()],
+                [node.id for node in self.tree.preorder_traversal()])
+
+    def test_replay_bulk_inserts(self):
+        tree = CWTree(CWRootNode([
+            _make_document('doc', [
+                CWNode('add_own_children', [CWNode('a'), CWNode('b')]),
+                CWNode('add_siblings'),
+                CWNode('b'),
+            ]),
+        ]))
+        tree.journal = MutationJournal()
+        unprocessed_root = _clone(tree.root, True)
+        tree.apply_library(LibraryForTesting())
+        self.assertEqual(
+            [entry.operation for entry in tree.journal],
+            ['insert_subtree', 'add_siblings_ahead'])
+
+        replayed_tree = CWTree(unprocessed_root)
+        tree.journal.replay(replayed_tree)
+        self.assertEqual(
+            replayed_tree.root.get_string_for_test_comparison(),
+            tree.root.get_string_for_test_comparison())
+        self.assertEqual(
+            [node.id for node in replayed_tree.preorder_traversal()],
+            [node.id for node in tree.preorder_traversal()])
+
+    def test_attribute_changes(self):
+        library = Library()
+        for name in ('Root', 'Document', 'b'):
+            library.processor(name, lambda tree, node: None)
+
+        @library.processor('p')
+        def process_p(tree, node):
+            node.kwargs['class'] = 'changed'
+            node.data['processed'] = True
+            tree.insert_subtree(node, 0, CWTextNode('added'))
+
+        @library.processor('Text')
+        def process_text(tree, node):
+            node.text = node.text.upper()
+
+        tree = CWTree(CWRootNode([
+            _make_document('p', [CWTagNode('p', {}, [CWTextNode('a')])]),
+            _make_document('text', [CWTextNode('b')]),
+            _make_document('unchanged', [CWTagNode('b', {})]),
+        ]))
+        tree.journal = MutationJournal()
+        unprocessed_root = _clone(tree.root, True)
+        tree.apply_library(library)
+
+        self.assertEqual(
+            tree.journal.get_changed_document_ids(), {('p',), ('text',)})
+        self.assertEqual(
+            [entry.operation for entry in tree.journal], [
+                'insert_subtree', 'set_attributes', 'set_attributes',
+                'set_attributes', 'set_attributes',
+            ])
+
+        replayed_tree = CWTree(unprocessed_root)
+        tree.journal.replay(replayed_tree)
+        self.assertEqual(
+            replayed_tree.root.get_string_for_test_comparison(),
+            tree.root.get_string_for_test_comparison())
+        self.assertEqual(
+            replayed_tree.root.children[0].children[0].data,
+            {'processed': True})
+
+    def test_replay_missing_node(self):
+        with self.assertRaises(MutationJournalReplayError):
+            self.tree.journal.replay(CWTree(CWRootNode([])))
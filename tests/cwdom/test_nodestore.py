@@ -30,7 +30,7 @@ class LibraryForTesting(Library):
         BARE_NAMES = {
             'Root', 'Document',
             'a', 'b',
-            'a_child', 'wrapper', 'contents', 'replacement',
+            'a_child', 'wrapper', 'contents', 'replacement', 'Shared',
         }
         for node_name in BARE_NAMES:
             self.processor(node_name, record)
@@ -46,6 +46,18 @@ class LibraryForTesting(Library):
         def add_own_child(tree, node):
             tree.insert_subtree(node, 0, CWNode('a_child'))
 
+        self.processor('add_own_children', record)
+        @self.processor('add_own_children')
+        def add_own_children(tree, node):
+            tree.insert_subtrees(node, 1, [
+                CWNode('a_child', [CWNode('a')]), CWNode('a_child')])
+
+        self.processor('add_siblings', record)
+        @self.processor('add_siblings')
+        def add_siblings(tree, node):
+            tree.add_siblings_ahead([
+                CWNode('a', [CWNode('a_child')]), CWNode('b')])
+
         self.processor('wrap_self', record)
         @self.processor('wrap_self')
         def wrap_self(tree, node):
@@ -74,6 +86,11 @@ class LibraryForTesting(Library):
                 CWNode('replacement')
             ]))
 
+        self.processor('unshare_child', record)
+        @self.processor('unshare_child')
+        def unshare_child(tree, node):
+            tree.unshare(node.children[0])
+
 
 class TestCWTreeTraversals(CWTestCase):
     def test_postorder(self):
@@ -178,6 +195,59 @@ class TestCWTree(CWTestCase):
                   a_child()
         """))
 
+    def test_add_own_children(self):
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [
+                CWNode('add_own_children', [CWNode('b'), CWNode('b')]),
+            ])
+        ]))
+        tree.root.deep_set_document_id(('doc',))
+        library = LibraryForTesting()
+        tree.apply_library(library)
+        self.assertTreeIsConsistent(tree.root)
+        self.assertEqual(library.visit_history, [
+            'b', 'b', 'add_own_children', 'Document', 'Root',
+            'a', 'a_child', 'a_child'])
+        self.assertEqual(tree.root.get_string_for_test_comparison(), self.strip("""
+            Root()
+              Document(path='doc')
+                add_own_children()
+                  b()
+                  a_child()
+                    a()
+                  a_child()
+                  b()
+        """))
+        for node in tree.preorder_traversal(tree.root.children[0]):
+            self.assertEqual(node.document_id, ('doc',))
+
+    def test_add_siblings(self):
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [
+                CWNode('add_siblings'),
+                CWNode('b'),
+            ])
+        ]))
+        tree.root.deep_set_document_id(('doc',))
+        library = LibraryForTesting()
+        tree.apply_library(library)
+        self.assertTreeIsConsistent(tree.root)
+        # the siblings are processed in the same pass, right after the node
+        # that added them
+        self.assertEqual(library.visit_history, [
+            'add_siblings', 'a_child', 'a', 'b', 'b', 'Document', 'Root'])
+        self.assertEqual(tree.root.get_string_for_test_comparison(), self.strip("""
+            Root()
+              Document(path='doc')
+                add_siblings()
+                a()
+                  a_child()
+                b()
+                b()
+        """))
+        for node in tree.preorder_traversal(tree.root.children[0]):
+            self.assertEqual(node.document_id, ('doc',))
+
     def test_add_root_child_fails(self):
         tree = CWTree(CWRootNode([
             CWDocumentNode('doc', [
@@ -308,3 +378,33 @@ class TestCWTree(CWTestCase):
                 replacement()
                   replacement()
         """))
+
+    def test_unshare(self):
+        shared_children = [CWNode('a'), CWNode('b')]
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [
+                CWNode('unshare_child', [CWSharedNode(shared_children)]),
+                CWNode('contents', [CWSharedNode(shared_children)]),
+            ])
+        ]))
+        library = LibraryForTesting()
+        tree.apply_library(library)
+        self.assertEqual(library.visit_history, [
+            'Shared', 'unshare_child', 'Shared', 'contents', 'Document',
+            'Root', 'a', 'b'])
+        self.assertEqual(tree.root.get_string_for_test_comparison(), self.strip("""
+            Root()
+              Document(path='doc')
+                unshare_child()
+                  a()
+                  b()
+                contents()
+                  Shared()
+                    a()
+                    b()
+        """))
+        self.assertTreeIsConsistent(tree.root)
+        # the shared nodes themselves were copied, not moved
+        self.assertIsNone(shared_children[0].get_parent())
+        self.assertNotIn(
+            shared_children[0], tree.root.children[0].children[0].children)
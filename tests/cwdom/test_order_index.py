@@ -0,0 +1,164 @@
+import unittest
+from unittest import mock
+
+from tests.CWTestCase import CWTestCase
+from tests.cwdom.test_nodestore import LibraryForTesting
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom import order_index
+from computerwords.cwdom.nodes import *
+from computerwords.library import Library
+
+
+class OrderIndexTestCase(CWTestCase):
+    def setUp(self):
+        super().setUp()
+        self.nodes = {}
+
+        def node(name, node_id, children=None):
+            self.nodes[node_id] = CWNode(name, children or [])
+            return self.nodes[node_id]
+
+        self.tree = CWTree(CWRootNode([
+            node('Document', 'd1', [
+                node('h1', 'h1a', [node('Text', 't1')]),
+                node('p', 'p1', [node('a', 'a1')]),
+                node('h2', 'h2a'),
+                node('p', 'p2'),
+                node('h1', 'h1b'),
+            ]),
+            node('Document', 'd2', [
+                node('h2', 'h2b'),
+                node('a', 'a2'),
+            ]),
+        ]))
+        self.index = self.tree.get_order_index()
+
+    def assertIndexIsConsistent(self):
+        nodes = list(self.tree.preorder_traversal())
+        for node_a, node_b in zip(nodes, nodes[1:]):
+            self.assertTrue(self.index.precedes(node_a, node_b))
+            self.assertFalse(self.index.precedes(node_b, node_a))
+        self.assertEqual(
+            list(self.index.iterate_after(self.tree.root)), nodes[1:])
+        for node in nodes:
+            self.assertIn(node, self.index)
+
+    def test_precedes(self):
+        n = self.nodes
+        self.assertTrue(self.index.precedes(n['d1'], n['t1']))
+        self.assertTrue(self.index.precedes(n['a1'], n['h2a']))
+        self.assertTrue(self.index.precedes(n['h1b'], n['h2b']))
+        self.assertTrue(self.index.precedes(self.tree.root, n['a2']))
+        self.assertFalse(self.index.precedes(n['h2b'], n['h1b']))
+        self.assertFalse(self.index.precedes(n['p1'], n['p1']))
+        self.assertIndexIsConsistent()
+
+    def test_find_next(self):
+        n = self.nodes
+        headings = {'h1', 'h2'}
+        self.assertIs(
+            self.index.find_next(n['h1a'], names=headings), n['h2a'])
+        self.assertIs(
+            self.index.find_next(n['p2'], names=headings), n['h1b'])
+        self.assertIs(
+            self.index.find_next(n['p2'], names={'h2'}), n['h2b'])
+        self.assertIsNone(
+            self.index.find_next(n['p2'], names={'h2'}, within=n['d1']))
+        self.assertIs(
+            self.index.find_next(
+                n['d1'], names=headings, predicate=lambda h: h is n['h1b']),
+            n['h1b'])
+        self.assertIs(self.index.find_next(n['h1a']), n['t1'])
+        self.assertIsNone(self.index.find_next(n['a2']))
+
+    def test_get_descendants(self):
+        n = self.nodes
+        self.assertEqual(
+            self.index.get_descendants(n['d1'], {'h1', 'h2'}),
+            [n['h1a'], n['h2a'], n['h1b']])
+        self.assertEqual(
+            self.index.get_descendants(n['p1']), [n['a1']])
+        self.assertEqual(self.index.get_descendants(n['p2']), [])
+        self.assertEqual(
+            self.index.get_descendants(self.tree.root, {'a'}),
+            [n['a1'], n['a2']])
+
+    def test_get_nodes_between(self):
+        n = self.nodes
+        self.assertEqual(
+            self.index.get_nodes_between('p', n['h1a'], n['h1b']),
+            [n['p1'], n['p2']])
+        self.assertEqual(
+            self.index.get_nodes_between('a', n['d1'], n['a2']),
+            [n['a1']])
+        self.assertEqual(
+            self.index.get_nodes_between('h2', n['h1a'], n['a2']),
+            [n['h2a'], n['h2b']])
+
+    def test_removed_nodes_are_not_contained(self):
+        self.assertNotIn(CWNode('p'), self.index)
+
+    def test_kept_up_to_date_by_processors(self):
+        self.tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [
+                CWNode('add_own_child'),
+                CWNode('wrap_self'),
+                CWNode('replace_own_contents', [CWNode('a')]),
+                CWNode('replace_self', [CWNode('b')]),
+                CWNode('replace_self_subtree'),
+                CWNode('unshare_child', [
+                    CWSharedNode([CWNode('a'), CWNode('b')]),
+                ]),
+            ]),
+            CWDocumentNode('unchanged', [CWNode('a')]),
+        ]))
+        self.index = self.tree.get_order_index()
+        self.assertEqual(len(self.index.get_descendants(self.tree.root)), 12)
+        self.tree.apply_library(LibraryForTesting())
+        self.assertIndexIsConsistent()
+        document = self.tree.root.children[0]
+        self.assertEqual(
+            self.index.get_descendants(document),
+            list(self.tree.preorder_traversal(document))[1:])
+
+    def test_kept_up_to_date_by_bulk_inserts(self):
+        self.tree = CWTree(CWRootNode([
+            CWDocumentNode('doc', [
+                CWNode('add_own_children', [CWNode('a'), CWNode('b')]),
+                CWNode('add_siblings'),
+                CWNode('b'),
+            ]),
+        ]))
+        self.index = self.tree.get_order_index()
+        self.tree.apply_library(LibraryForTesting())
+        self.assertIndexIsConsistent()
+        document = self.tree.root.children[0]
+        self.assertEqual(
+            self.index.get_descendants(document),
+            list(self.tree.preorder_traversal(document))[1:])
+
+    def test_relabels_when_out_of_room(self):
+        library = Library()
+        for name in ('Root', 'Document', 'a', 'b', 'new', 'x'):
+            library.processor(name, lambda tree, node: None)
+
+        @library.processor('insert_many')
+        def insert_many(tree, node):
+            # gets labels before any processing happens
+            tree.get_order_index().get_descendants(tree.root)
+            for _ in range(5):
+                tree.insert_subtree(node, 1, CWNode('new', [CWNode('x')]))
+
+        with mock.patch.object(order_index, '_GAP', 2):
+            self.tree = CWTree(CWRootNode([
+                CWDocumentNode('doc', [
+                    CWNode('insert_many', [CWNode('a'), CWNode('b')]),
+                ]),
+            ]))
+            self.index = self.tree.get_order_index()
+            self.tree.apply_library(library)
+            self.assertIndexIsConsistent()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+import threading
+
+from tests.CWTestCase import CWTestCase
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.jobs import JobRunner
+from computerwords.cwdom.nodes import *
+from computerwords.cwdom.parallel import (
+    apply_library_in_parallel,
+    apply_library_in_threads,
+)
+from computerwords.htmlwriter import _get_subtree_html
+from computerwords.htmlwriter.util import HTMLWriterOptions
+from computerwords.library import Library
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+from computerwords.markdown_parser.source_arena import SourceArena
+from computerwords.plugins.callouts import CalloutsPlugin
+from computerwords.plugins.heading_aliases import HeadingAliasesPlugin
+from computerwords.searchwriter import iterate_sections
+from computerwords.stdlib import make_stdlib
+
+
+def _make_library(env=None):
+    library = make_stdlib()
+    HeadingAliasesPlugin().add_processors(library)
+    CalloutsPlugin().add_processors(library)
+    return library
+
+
+def _make_documents():
+    documents = []
+    for i, document_id in enumerate([('a',), ('b',), ('sub', 'c')]):
+        document = CWDocumentNode('/'.join(document_id), [
+            CWTagNode('table-of-contents', {}),
+            CWTagNode('heading-alias', {'name': 'alias{}'.format(i)}),
+            CWTagNode('h1', {}, [CWTextNode('Same')]),
+            CWTagNode('p', {}, [
+                CWTextNode('Text '),
+                CWTagNode('b', {}, [CWTextNode('bold')]),
+                CWTagNode('heading-link', {'name': 'alias{}'.format(2 - i)}),
+            ]),
+            CWTagNode('note', {}, [CWTagNode('h2', {}, [CWTextNode('Sub')])]),
+            CWTagNode('ul', {}, [CWTagNode('li', {}, [CWTextNode('item')])]),
+        ])
+        document.deep_set_document_id(document_id)
+        documents.append(document)
+    return documents
+
+
+def _parse_documents(library, source_arena):
+    documents = []
+    for i, document_id in enumerate([('a',), ('b',), ('sub', 'c')]):
+        config = CFMParserConfig(
+            allowed_tags=library.get_allowed_tags(), document_id=document_id,
+            document_path='/'.join(document_id), source_arena=source_arena)
+        text = "# Heading {}\n\n{}\n\n```\n{}\n```\n".format(
+            i, 'Long enough to be kept in the source arena. ' * 4,
+            'code ' * 20)
+        document = CWDocumentNode(
+            '/'.join(document_id), cfm_to_cwdom(text, config))
+        document.deep_set_document_id(document_id)
+        documents.append(document)
+    return documents
+
+
+class _ParallelTestCase(CWTestCase):
+    def setUp(self):
+        super().setUp()
+        self.library = _make_library()
+        self.env = {'config': {}}
+        self.job_runner = JobRunner(max_workers=2)
+        self.addCleanup(self.job_runner.shutdown)
+        self.options = HTMLWriterOptions(
+            single_page=False, static_dir=None, files_to_copy=[],
+            stylesheet_tag_strings=[], site_url='/', meta_description='')
+
+    def get_html(self, tree):
+        return [
+            _get_subtree_html({}, self.options, self.library, tree, document)
+            for document in tree.root.children]
+
+
+class ParallelProcessingTestCase(_ParallelTestCase):
+    def test_same_as_serial(self):
+        tree = CWTree(CWRootNode(_make_documents()), self.env)
+        tree.apply_library(self.library)
+
+        parallel_tree = CWTree(CWRootNode(_make_documents()), self.env)
+        apply_library_in_parallel(
+            parallel_tree, self.library, self.job_runner, _make_library)
+
+        self.assertEqual(self.get_html(parallel_tree), self.get_html(tree))
+        self.assertEqual(
+            list(iterate_sections(parallel_tree)),
+            list(iterate_sections(tree)))
+        self.assertEqual(
+            parallel_tree.rounds_per_phase, tree.rounds_per_phase)
+
+    def test_memory_mapped_text(self):
+        tree = CWTree(
+            CWRootNode(_parse_documents(self.library, None)), self.env)
+        tree.apply_library(self.library)
+
+        source_arena = SourceArena()
+        self.addCleanup(source_arena.close)
+        parallel_tree = CWTree(
+            CWRootNode(_parse_documents(self.library, source_arena)),
+            self.env)
+        self.assertTrue(any(
+            type(node) is CWSpanTextNode
+            for node in parallel_tree.preorder_traversal()))
+        apply_library_in_parallel(
+            parallel_tree, self.library, self.job_runner, _make_library)
+
+        self.assertEqual(self.get_html(parallel_tree), self.get_html(tree))
+
+    def test_documents_are_replaced(self):
+        tree = CWTree(CWRootNode(_make_documents()), self.env)
+        old_ids = {node.id for node in tree.preorder_traversal()}
+        apply_library_in_parallel(
+            tree, self.library, self.job_runner, _make_library)
+
+        for document in tree.root.children:
+            self.assertIs(document.get_parent(), tree.root)
+        self.assertEqual(
+            [node.id for node in tree.preorder_traversal()
+             if node.id in old_ids],
+            [tree.root.id])
+
+
+class ThreadsTestCase(_ParallelTestCase):
+    def test_same_as_serial(self):
+        tree = CWTree(CWRootNode(_make_documents()), self.env)
+        tree.apply_library(self.library)
+
+        threads_tree = CWTree(CWRootNode(_make_documents()), self.env)
+        apply_library_in_threads(threads_tree, self.library, max_workers=2)
+
+        self.assertEqual(self.get_html(threads_tree), self.get_html(tree))
+        self.assertEqual(
+            list(iterate_sections(threads_tree)),
+            list(iterate_sections(tree)))
+        self.assertEqual(
+            threads_tree.rounds_per_phase, tree.rounds_per_phase)
+
+    def test_threads_have_own_cursors(self):
+        library = Library()
+        library.processor('Root', lambda tree, node: None)
+        library.processor('Document', lambda tree, node: None)
+        # both threads are in the middle of processing when they replace
+        # their nodes
+        barrier = threading.Barrier(2, timeout=5)
+        seen = []
+
+        @library.processor('a', document_local=True)
+        def process_a(tree, node):
+            barrier.wait()
+            tree.processor_data['a'] = node
+            tree.replace_node(node, CWTagNode('b', {}))
+            barrier.wait()
+            seen.append(tree.processor_data['a'])
+
+        @library.processor('b', document_local=True)
+        def process_b(tree, node):
+            pass
+
+        a_nodes = [CWTagNode('a', {}), CWTagNode('a', {})]
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('x', [a_nodes[0]]),
+            CWDocumentNode('y', [a_nodes[1]]),
+        ]))
+        apply_library_in_threads(tree, library, max_workers=2)
+
+        self.assertCountEqual(seen, a_nodes)
+        self.assertEqual(
+            [document.children[0].name for document in tree.root.children],
+            ['b', 'b'])
+        self.assertEqual(tree.processor_data, {})
@@ -0,0 +1,144 @@
+import pickle
+import threading
+import unittest
+
+from tests.CWTestCase import CWTestCase
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.cwdom.serialization import (
+    CWTreeSerializationError,
+    dumps_tree,
+    loads_tree,
+)
+from computerwords.htmlwriter import _get_subtree_html
+from computerwords.htmlwriter.util import HTMLWriterOptions
+from computerwords.markdown_parser.source_arena import SourceArena
+from computerwords.stdlib import stdlib
+
+
+class SerializationTestCase(CWTestCase):
+    def make_tree(self):
+        documents = []
+        for document_id in [('a',), ('b',), ('sub', 'c')]:
+            document = CWDocumentNode('/'.join(document_id), [
+                CWTagNode('table-of-contents', {}),
+                CWTagNode('h1', {}, [CWTextNode(' '.join(document_id))]),
+                CWTagNode('p', {'class': 'x'}, [
+                    CWTextNode('<b>', escape=False),
+                    CWLinkNode('b', [CWTextNode('link')]),
+                ]),
+            ])
+            document.deep_set_document_id(document_id)
+            documents.append(document)
+        tree = CWTree(CWRootNode(documents))
+        tree.apply_library(stdlib, {'config': {}})
+        return tree
+
+    def test_round_trip(self):
+        tree = self.make_tree()
+        loaded = loads_tree(dumps_tree(tree))
+
+        self.assertEqual(
+            loaded.root.get_string_for_test_comparison(),
+            tree.root.get_string_for_test_comparison())
+        self.assertEqual(
+            [(type(node), node.id, node.document_id)
+             for node in loaded.preorder_traversal()],
+            [(type(node), node.id, node.document_id)
+             for node in tree.preorder_traversal()])
+        for node in loaded.preorder_traversal():
+            for child in node.children:
+                self.assertIs(child.get_parent(), node)
+        self.assertEqual(
+            set(loaded.processor_data), set(tree.processor_data))
+
+        # references into the tree point at the loaded nodes
+        anchor = loaded.processor_data['ref_id_to_anchor']['b']
+        self.assertTrue(any(
+            node is anchor for node in loaded.preorder_traversal()))
+
+        options = HTMLWriterOptions(
+            single_page=False, static_dir=None, files_to_copy=[],
+            stylesheet_tag_strings=[], site_url='/', meta_description='')
+        for document, loaded_document in zip(
+                tree.root.children, loaded.root.children):
+            self.assertEqual(
+                _get_subtree_html(
+                    {}, options, stdlib, loaded, loaded_document),
+                _get_subtree_html({}, options, stdlib, tree, document))
+
+    def test_new_ids_are_not_reused(self):
+        tree = CWTree(CWRootNode([CWNode('a')]))
+        data = dumps_tree(tree)
+        loaded_ids = {
+            node.id for node in loads_tree(data).preorder_traversal()}
+        self.assertNotIn(CWNode('a').id, loaded_ids)
+
+    def test_unpicklable_data_is_dropped(self):
+        node = CWNode('a')
+        node.data = {'lock': threading.Lock(), 'ok': [1]}
+        tree = CWTree(CWRootNode([node]))
+        tree.processor_data = {'lock': threading.Lock(), 'nodes': [node]}
+
+        loaded = loads_tree(dumps_tree(tree))
+        loaded_node = loaded.root.children[0]
+        self.assertEqual(loaded_node.data, {'ok': [1]})
+        self.assertEqual(list(loaded.processor_data), ['nodes'])
+        self.assertIs(loaded.processor_data['nodes'][0], loaded_node)
+
+    def test_deep_tree(self):
+        node = CWNode('a')
+        for _ in range(10000):
+            node = CWNode('a', [node])
+        loaded = loads_tree(dumps_tree(CWTree(CWRootNode([node]))))
+        self.assertEqual(len(list(loaded.preorder_traversal())), 10002)
+
+    def test_nodes_can_be_pickled(self):
+        node = CWNode('a', [CWTextNode('x')])
+        loaded = pickle.loads(pickle.dumps(node))
+        self.assertEqual(loaded, node)
+        self.assertIs(loaded.children[0].get_parent(), loaded)
+
+    def test_bad_data(self):
+        with self.assertRaises(CWTreeSerializationError):
+            loads_tree(b'not a tree')
+
+    def test_shared_objects_stay_shared(self):
+        node = CWNode('a')
+        entry = {'heading_nodes': {node}}
+        node.data['entry'] = entry
+        tree = CWTree(CWRootNode([node]))
+        tree.processor_data = {'entries': [entry]}
+
+        loaded = loads_tree(dumps_tree(tree))
+        loaded_node = loaded.root.children[0]
+        self.assertIs(loaded.processor_data['entries'][0],
+                      loaded_node.data['entry'])
+        self.assertEqual(loaded_node.data['entry']['heading_nodes'],
+                         {loaded_node})
+
+    def test_new_ids(self):
+        node = CWNode('a', [CWTextNode('x')])
+        node.data['nodes'] = {node}
+        data = dumps_tree(CWTree(CWRootNode([node])))
+        loaded = loads_tree(data, new_ids=True)
+        loaded_node = loaded.root.children[0]
+        self.assertNotEqual(loaded_node.id, node.id)
+        self.assertTrue(loaded_node.id.startswith('a:'))
+        self.assertEqual(loaded_node.data['nodes'], {loaded_node})
+        self.assertIn(loaded_node, loaded_node.data['nodes'])
+
+    def test_span_text_becomes_plain_text(self):
+        arena = SourceArena()
+        self.addCleanup(arena.close)
+        offset = arena.append('abc déf'.encode('utf-8'))
+        node = CWSpanTextNode(arena, offset + 4, offset + 8)
+        tree = CWTree(CWRootNode([CWNode('a', [node])]))
+
+        loaded = loads_tree(dumps_tree(tree))
+        loaded_node = loaded.root.children[0].children[0]
+        self.assertIsNone(loaded_node.arena)
+        self.assertEqual(loaded_node.text, 'déf')
+        self.assertIs(loaded_node.get_parent(), loaded.root.children[0])
+        # the original still reads from the arena
+        self.assertIs(node.arena, arena)
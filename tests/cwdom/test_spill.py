@@ -0,0 +1,225 @@
+import gc
+import pathlib
+import tempfile
+import weakref
+from unittest import mock
+
+from tests.CWTestCase import CWTestCase
+from computerwords.cwdom.CWTree import CWTree, CWTreeConsistencyError
+from computerwords.cwdom.nodes import *
+from computerwords.cwdom import spill
+from computerwords.cwdom.spill import DocumentSpill
+from computerwords.htmlwriter import _get_subtree_html
+from computerwords.htmlwriter.util import HTMLWriterOptions
+from computerwords.library import Library
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+from computerwords.markdown_parser.source_arena import SourceArena
+from computerwords.plugins.callouts import CalloutsPlugin
+from computerwords.plugins.heading_aliases import HeadingAliasesPlugin
+from computerwords.searchwriter import iterate_sections
+from computerwords.stdlib.basics import add_basics
+from computerwords.stdlib.html import add_html
+from computerwords.stdlib.links import add_links
+from computerwords.stdlib.table_of_contents import add_table_of_contents
+
+
+def _make_documents():
+    documents = []
+    for i, document_id in enumerate([('a',), ('b',), ('sub', 'c')]):
+        document = CWDocumentNode('/'.join(document_id), [
+            CWTagNode('table-of-contents', {}),
+            CWTagNode('heading-alias', {'name': 'alias{}'.format(i)}),
+            CWTagNode('h1', {}, [CWTextNode('Same')]),
+            CWTagNode('p', {}, [
+                CWTextNode('Text '),
+                CWTagNode('b', {}, [CWTextNode('bold')]),
+                CWTagNode('heading-link', {'name': 'alias{}'.format(2 - i)}),
+            ]),
+            CWTagNode('note', {}, [CWTagNode('h2', {}, [CWTextNode('Sub')])]),
+            CWTagNode('ul', {}, [CWTagNode('li', {}, [CWTextNode('item')])]),
+        ])
+        document.deep_set_document_id(document_id)
+        documents.append(document)
+    return documents
+
+
+_LONG_TEXT = 'Long enough to be kept in the source arena. ' * 4
+
+_MARKDOWN = """<table-of-contents />
+
+<heading-alias name="alias{}" />
+
+# Same
+
+{}<heading-link name="alias{}" />
+
+<note>
+
+## Sub
+
+{}
+
+</note>
+"""
+
+
+def _parse_documents(library, source_arena):
+    documents = []
+    for i, document_id in enumerate([('a',), ('b',), ('sub', 'c')]):
+        config = CFMParserConfig(
+            allowed_tags=library.get_allowed_tags(), document_id=document_id,
+            document_path='/'.join(document_id), source_arena=source_arena)
+        document = CWDocumentNode('/'.join(document_id), cfm_to_cwdom(
+            _MARKDOWN.format(i, _LONG_TEXT, 2 - i, _LONG_TEXT), config))
+        document.deep_set_document_id(document_id)
+        documents.append(document)
+    return documents
+
+
+class DocumentSpillTestCase(CWTestCase):
+    def setUp(self):
+        super().setUp()
+        self.library = Library()
+        add_basics(self.library)
+        add_html(self.library)
+        add_links(self.library)
+        add_table_of_contents(self.library)
+        HeadingAliasesPlugin().add_processors(self.library)
+        CalloutsPlugin().add_processors(self.library)
+        self.env = {'config': {}}
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.spill = DocumentSpill(
+            self.library, self.env, pathlib.Path(self.temp_dir.name))
+        self.options = HTMLWriterOptions(
+            single_page=False, static_dir=None, files_to_copy=[],
+            stylesheet_tag_strings=[], site_url='/', meta_description='')
+
+    def get_html(self, tree):
+        return [
+            _get_subtree_html({}, self.options, self.library, tree, document)
+            for document in tree.root.children]
+
+    def test_same_as_whole_tree(self):
+        tree = CWTree(CWRootNode(_make_documents()), self.env)
+        tree.apply_library(self.library)
+
+        for document in _make_documents():
+            self.spill.add_document(document)
+        spilled_tree = self.spill.apply_library()
+
+        self.assertEqual(self.get_html(spilled_tree), self.get_html(tree))
+        self.assertEqual(
+            list(iterate_sections(spilled_tree)),
+            list(iterate_sections(tree)))
+        self.assertEqual(
+            [document.data['nav_next_entry'].ref_id
+             for document in spilled_tree.root.children[:2]],
+            ['Same-1', 'Same-2'])
+        self.assertEqual(
+            spilled_tree.rounds_per_phase, tree.rounds_per_phase)
+
+    def test_memory_mapped_text(self):
+        tree = CWTree(
+            CWRootNode(_parse_documents(self.library, None)), self.env)
+        tree.apply_library(self.library)
+
+        source_arena = SourceArena()
+        self.addCleanup(source_arena.close)
+        documents = _parse_documents(self.library, source_arena)
+        self.assertTrue(any(
+            type(node) is CWSpanTextNode
+            for node in CWTree(documents[0]).preorder_traversal()))
+        for document in documents:
+            self.spill.add_document(document)
+        spilled_tree = self.spill.apply_library()
+
+        self.assertEqual(self.get_html(spilled_tree), self.get_html(tree))
+
+    def test_attributes_changed_by_global_processors(self):
+        @self.library.processor('h1')
+        def process_h1(tree, node):
+            tree.processor_data.setdefault('h1_count', 0)
+            tree.processor_data['h1_count'] += 1
+            node.kwargs['class'] = 'global-{}'.format(
+                tree.processor_data['h1_count'])
+            node.children[0].text = node.kwargs['class']
+
+        tree = CWTree(CWRootNode(_make_documents()), self.env)
+        tree.apply_library(self.library)
+
+        for document in _make_documents():
+            self.spill.add_document(document)
+        spilled_tree = self.spill.apply_library()
+
+        def get_h1_kwargs(tree):
+            return [
+                node.kwargs
+                for document in tree.root.children
+                for node in CWTree(document).preorder_traversal()
+                if node.name == 'h1']
+
+        self.assertIn({'class': 'global-1'}, get_h1_kwargs(tree))
+        self.assertEqual(get_h1_kwargs(spilled_tree), get_h1_kwargs(tree))
+        self.assertEqual(self.get_html(spilled_tree), self.get_html(tree))
+
+    def test_documents_are_not_kept(self):
+        documents = _make_documents()
+        list_item = weakref.ref(documents[0].children[-1].children[0])
+        for document in documents:
+            self.spill.add_document(document)
+        skeleton_ids = {
+            node.id
+            for skeleton in self.spill._skeletons
+            for node in CWTree(skeleton).preorder_traversal()}
+        del documents, document
+        gc.collect()
+        self.assertIsNone(list_item())
+
+        tree = self.spill.apply_library()
+        document = tree.root.children[0]
+        self.assertIs(document.get_parent(), tree.root)
+        self.assertNotIn(document.children[-1].id, skeleton_ids)
+        self.assertEqual(
+            document.children[-1].get_string_for_test_comparison(),
+            CWTagNode('ul', {}, [
+                CWTagNode('li', {}, [CWTextNode('item')]),
+            ]).get_string_for_test_comparison())
+
+    def test_lookups_do_not_read_documents(self):
+        for document in _make_documents():
+            self.spill.add_document(document)
+        tree = self.spill.apply_library()
+
+        with mock.patch.object(
+                spill, 'load_tree', wraps=spill.load_tree) as load_tree:
+            self.assertEqual(tree.get_document_path(('sub', 'c')), 'sub/c')
+            self.assertIsNone(tree.get_document_path(('d',)))
+            self.assertEqual(load_tree.call_count, 0)
+
+            documents = list(tree.root.children)
+            self.assertEqual(load_tree.call_count, 3)
+            self.assertEqual(
+                [tree.root.index_of_child(document)
+                 for document in documents],
+                [0, 1, 2])
+            self.assertIs(tree.root.children[-1], documents[-1])
+            self.assertEqual(load_tree.call_count, 3)
+        with self.assertRaises(ValueError):
+            tree.root.index_of_child(documents[0].children[0])
+
+    def test_insert_into_partial_node(self):
+        @self.library.processor('Document')
+        def process_document(tree, node):
+            if not node.children[0].name == 'Text':
+                tree.insert_subtree(node, 0, CWTextNode('x'))
+
+        document = CWDocumentNode('a', [
+            CWTagNode('p', {}, [CWTextNode('not in the skeleton')]),
+            CWTagNode('h1', {}, [CWTextNode('Heading')]),
+        ])
+        document.deep_set_document_id(('a',))
+        self.spill.add_document(document)
+        with self.assertRaisesRegex(CWTreeConsistencyError, 'spill'):
+            self.spill.apply_library()
@@ -0,0 +1,97 @@
+import unittest
+
+from tests.CWTestCase import CWTestCase
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.cwdom.traversal import (
+    CWTreeVisitor,
+    MissingVisitorError,
+    PostorderTraverser,
+    postorder_traversal,
+    sort_postorder,
+    visit_tree,
+)
+
+
+class RecordingVisitor(CWTreeVisitor):
+    def __init__(self, visits):
+        super().__init__()
+        self.visits = visits
+
+    def before_children(self, tree, node):
+        self.visits.append('pre-{}'.format(node.name))
+
+    def after_children(self, tree, node):
+        self.visits.append('post-{}'.format(node.name))
+
+
+class VisitTreeTestCase(CWTestCase):
+    def test_order(self):
+        visits = []
+        visitor = RecordingVisitor(visits)
+        tree = CWTree(CWRootNode([
+            CWNode('a', [CWNode('b'), CWNode('c', [CWNode('d')])]),
+            CWNode('e'),
+        ]))
+        node_name_to_visitor = {name: visitor for name in 'abcde'}
+        node_name_to_visitor['Root'] = CWTreeVisitor()
+        visit_tree(tree, node_name_to_visitor)
+        self.assertEqual(visits, [
+            'pre-a', 'pre-b', 'post-b', 'pre-c', 'pre-d', 'post-d', 'post-c',
+            'post-a', 'pre-e', 'post-e',
+        ])
+
+    def test_missing_visitor(self):
+        tree = CWTree(CWRootNode([CWNode('a', [CWNode('b')])]))
+        visits = []
+        with self.assertRaises(MissingVisitorError):
+            visit_tree(tree, {'Root': CWTreeVisitor()})
+
+        visit_tree(
+            tree, {'Root': CWTreeVisitor(), 'b': RecordingVisitor(visits)},
+            handle_error=lambda node: visits.append('error-' + node.name))
+        self.assertEqual(visits, ['error-a', 'pre-b', 'post-b'])
+
+    def test_deep_tree(self):
+        node = CWNode('a')
+        for _ in range(10000):
+            node = CWNode('a', [node])
+        visits = []
+        visit_tree(CWTree(CWRootNode([node])), {
+            'Root': CWTreeVisitor(),
+            'a': RecordingVisitor(visits),
+        })
+        self.assertEqual(len(visits), 20002)
+        self.assertEqual(visits[10000:10002], ['pre-a', 'post-a'])
+
+
+class PostorderTraverserTestCase(CWTestCase):
+    def test_subtree(self):
+        a = CWNode('a', [CWNode('b'), CWNode('c')])
+        CWRootNode([a, CWNode('d')])
+        traverser = PostorderTraverser(a)
+        names = []
+        for node in traverser:
+            if node is a:
+                traverser.replace_cursor(CWNode('x', a.children))
+            names.append(node.name)
+        self.assertEqual(names, ['b', 'c', 'a'])
+
+
+class SortPostorderTestCase(CWTestCase):
+    def test_same_order_as_traversal(self):
+        a = CWNode('a', [CWNode('b'), CWNode('c', [CWNode('d')])])
+        root = CWRootNode([a, CWNode('e', [CWNode('f')])])
+        nodes = list(postorder_traversal(root))
+        self.assertEqual(sort_postorder(reversed(nodes), root), nodes)
+        self.assertEqual(
+            sort_postorder(set(nodes), a), list(postorder_traversal(a)))
+
+    def test_skips_nodes_outside_root(self):
+        a = CWNode('a', [CWNode('b')])
+        detached = CWNode('c')
+        detached.set_parent(a)  # but isn't one of its children
+        CWRootNode([a, CWNode('d')])
+        self.assertEqual(
+            sort_postorder([a.children[0], detached, CWNode('e')], a),
+            [a.children[0]])
@@ -0,0 +1,115 @@
+import random
+import unittest
+
+from tests.CWTestCase import CWTestCase
+from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser.html_lexer import lex_html
+from computerwords.markdown_parser.html_parser import (
+    ParseError,
+    TagMismatchError,
+    UnknownTagError,
+    parse_html,
+)
+from computerwords.markdown_parser.html_to_cwdom import parse_html_to_cwdom
+from computerwords.markdown_parser.parse_tree_to_cwdom import (
+    DuplicateArgumentsError,
+    parse_tree_to_cwdom,
+)
+
+
+DOC_ID = ('test.md',)
+DOC_PATH = 'test.md'
+
+
+def get_config(allowed_tags):
+    return CFMParserConfig(
+        document_id=DOC_ID, document_path=DOC_PATH, allowed_tags=allowed_tags)
+
+
+def _describe(parse):
+    """Returns a string describing the output of `parse()`, or the error it
+    raised"""
+    try:
+        return '\n'.join(
+            node.get_string_for_test_comparison() for node in parse())
+    except (ParseError, TagMismatchError, UnknownTagError) as e:
+        return '{}: {}'.format(type(e).__name__, e)
+
+
+class HTMLToCWDOMTestCase(CWTestCase):
+    def parse(self, s, allowed_tags={'abc', 'xyz'}, **kwargs):
+        config = get_config(allowed_tags)
+        return parse_html_to_cwdom(list(lex_html(config, s)), config, **kwargs)
+
+    def test_nested_tags(self):
+        nodes = self.parse(
+            'outer <abc x=y z="a b"><xyz/>inner < xyz / ></abc>')
+        self.assertEqual(
+            '\n'.join(node.get_string_for_test_comparison() for node in nodes),
+            self.strip("""
+                'outer '
+                abc(kwargs={'x': 'y', 'z': 'a b'})
+                  xyz(kwargs={})
+                  'inner '
+                  xyz(kwargs={})
+            """))
+
+    def test_errors(self):
+        with self.assertRaisesRegex(ParseError, "1:12-13: Unable to parse"):
+            self.parse('text<abc /><')
+        with self.assertRaisesRegex(
+                TagMismatchError, "Did you forget to close your <abc> tag"):
+            self.parse('<abc>inner</xyz>')
+        with self.assertRaisesRegex(UnknownTagError, "Unknown tag: foo"):
+            self.parse('text <foo></foo>')
+        with self.assertRaisesRegex(UnknownTagError, "Unknown tag: foo"):
+            self.parse('text <foo />')
+        with self.assertRaises(DuplicateArgumentsError):
+            self.parse('<abc x=y x=z></abc>')
+
+    def test_text_is_only_converted_if_parsing_succeeds(self):
+        texts = []
+
+        def text_to_nodes(text):
+            texts.append(text)
+            return []
+
+        with self.assertRaises(ParseError):
+            self.parse('a <abc>b', text_to_nodes=text_to_nodes)
+        self.assertEqual(texts, [])
+        [node] = self.parse('a <abc>b</abc>', text_to_nodes=text_to_nodes)
+        self.assertEqual((node.name, node.children), ('abc', []))
+        self.assertEqual(texts, ['a ', 'b'])
+
+    def test_many_statements(self):
+        # the recursive grammar runs out of stack long before this
+        s = '<abc x=y>text</abc>' * 5000
+        self.assertEqual(len(self.parse(s)), 5000)
+        s = '<abc>' * 5000 + '</abc>' * 5000
+        node = self.parse(s)[0]
+        depth = 1
+        while node.children:
+            node = node.children[0]
+            depth += 1
+        self.assertEqual(depth, 5000)
+
+    def test_same_results_as_grammar(self):
+        pieces = [
+            '<', '>', '/', ' ', '=', 'abc', 'xyz', 'foo', 'x', '"s"', 'text',
+            '<abc>', '</abc>', '<xyz>', '</xyz>', '<abc/>', '\\<', '\n',
+        ]
+        rng = random.Random(42)
+        for _ in range(3000):
+            s = ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 12)))
+            for allowed_tags in ({'abc', 'xyz'}, set()):
+                config = get_config(allowed_tags)
+                tokens = list(lex_html(config, s))
+                self.assertEqual(
+                    _describe(lambda: parse_html_to_cwdom(tokens, config)),
+                    _describe(lambda: parse_tree_to_cwdom(
+                        parse_html(tokens, config))),
+                    msg=repr(s))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -50,6 +50,21 @@ class TestLexer(unittest.TestCase):
             t.EndToken(L(0, len(input_str), len(input_str)).plus(0)),
         ])
 
+    def test_locations_across_lines(self):
+        tokens = lex('ab\n<x\n/>')
+        self.assertEqual(tokens, [
+            t.TextToken(        L(0, 0, 0).to(L(1, 0, 3)), 'ab\n'),
+            t.BracketLeftToken( L(1, 0, 3).plus(1)),
+            t.BBWordToken(      L(1, 1, 4).plus(1), 'x'),
+            t.SpaceToken(       L(1, 2, 5).to(L(2, 0, 6)), '\n'),
+            t.SlashToken(       L(2, 0, 6).plus(1)),
+            t.BracketRightToken(L(2, 1, 7).plus(1)),
+            t.EndToken(         L(2, 2, 8).plus(0)),
+        ])
+        self.assertEqual(
+            [(token.start, token.end) for token in tokens],
+            [(0, 3), (3, 4), (4, 5), (5, 6), (6, 7), (7, 8), (8, 8)])
+
     def test_text_bad_escapes(self):
         expected = "0:0: A backslash in text must be followed by one of: ['<', '>', '[', '\\', ']']"
         with self.assertRaises(html_lexer.LexError, msg=expected) as e:
@@ -1,8 +1,21 @@
+import pathlib
+import pickle
+import tempfile
 import unittest
+from unittest import mock
 
+import computerwords
+from computerwords.cwdom.jobs import JobRunner
 from computerwords.cwdom.nodes import *
+from computerwords.cwdom.traversal import preorder_traversal
 from computerwords.markdown_parser import CFMParserConfig
+from computerwords.markdown_parser import block_cache as block_cache_module
+from computerwords.markdown_parser import cfm_to_cwdom as cfm_to_cwdom_module
+from computerwords.markdown_parser.block_cache import BlockCache
 from computerwords.markdown_parser.cfm_to_cwdom import cfm_to_cwdom
+from computerwords.markdown_parser.chunks import split_into_chunks
+from computerwords.markdown_parser.html_parser import UnknownTagError
+from computerwords.markdown_parser.source_arena import SourceArena
 
 from tests.CWTestCase import CWTestCase
 
@@ -156,3 +169,215 @@ class IntegratedHTMLParsingTestCase(CWTestCase):
                     p(kwargs={})
                       'some test'
             """))
+
+
+class SourceArenaTestCase(CWTestCase):
+    def setUp(self):
+        super().setUp()
+        self.arena = SourceArena()
+        self.addCleanup(self.arena.close)
+        self.config = CONFIG._replace(source_arena=self.arena)
+
+    def test_long_text_is_moved_to_arena(self):
+        long_text = 'Long text, ünicode included. ' * 4
+        code = 'def f():\n    return "{}"\n'.format('x' * 70)
+        s = "short\n\n{}\n\n```python\n{}```\n\n<x>{}</x>\n\n&amp;{}".format(
+            long_text, code, long_text, long_text)
+
+        def get_texts(nodes):
+            return [
+                ''.join(n.text for n in preorder_traversal(node)
+                        if n.name == 'Text')
+                for node in nodes]
+
+        root = CWRootNode(cfm_to_cwdom(s, self.config))
+        self.assertEqual(
+            get_texts(root.children), get_texts(cfm_to_cwdom(s, CONFIG)))
+
+        text_nodes = [
+            node for node in preorder_traversal(root) if node.name == 'Text']
+        self.assertEqual(
+            [type(node) is CWSpanTextNode for node in text_nodes],
+            # runs of text are joined, and '&amp;' became '&', so the last
+            # paragraph's text isn't in the source
+            [False, True, True, True, False])
+        for node in text_nodes:
+            self.assertIn(node, node.get_parent().children)
+
+    def test_text_after_changed_text_is_moved_to_arena(self):
+        long_text = 'Long text, ünicode included. ' * 4
+        # none of these are in the source, so the search for the last
+        # paragraph has to look past all of them
+        s = '\n\n'.join(['&amp;' + long_text] * 200 + [long_text])
+
+        root = CWRootNode(cfm_to_cwdom(s, self.config))
+        text_nodes = [
+            node for node in preorder_traversal(root) if node.name == 'Text']
+        self.assertEqual(
+            [type(node) is CWSpanTextNode for node in text_nodes],
+            [False] * 200 + [True])
+        self.assertEqual(text_nodes[-1].text, long_text.strip())
+
+    def test_span_node(self):
+        offset = self.arena.append('abc déf'.encode('utf-8'))
+        node = CWSpanTextNode(self.arena, offset + 4, offset + 8)
+        self.assertEqual(node.text, 'déf')
+        self.assertEqual(node.copy().text, 'déf')
+
+        loaded = pickle.loads(pickle.dumps(node))
+        self.assertIsNone(loaded.arena)
+        self.assertEqual(loaded.text, 'déf')
+
+        # reading after more text is added
+        self.arena.append(b'more')
+        self.assertEqual(
+            CWSpanTextNode(self.arena, offset + 7, offset + 12).text, 'fmore')
+
+        node.text = 'changed'
+        self.assertEqual(node.text, 'changed')
+
+
+class ChunkedParseTestCase(CWTestCase):
+    def get_chunk_lines(self, s):
+        return [chunk.line for chunk in split_into_chunks(s, 1)]
+
+    def test_split_points(self):
+        s = "intro\n\n# A\ntext\n## not split\n\n  # not split\n\n## B\n"
+        chunks = split_into_chunks(s, 1)
+        self.assertEqual(''.join(chunk.text for chunk in chunks), s)
+        self.assertEqual(
+            [(chunk.line, chunk.char) for chunk in chunks],
+            [(0, 0), (2, 7), (8, s.index('## B'))])
+        # chunks are at least chunk_size long
+        self.assertEqual(
+            [chunk.line for chunk in split_into_chunks(s, 10)], [0, 8])
+        self.assertEqual(
+            [chunk.line for chunk in split_into_chunks(s, 1000)], [0])
+
+    def test_blocks_that_continue_past_blank_lines(self):
+        self.assertEqual(
+            self.get_chunk_lines("````\n\n# A\n```\n\n# B\n````\n\n# C"),
+            [0, 8])
+        self.assertEqual(
+            self.get_chunk_lines("<pre>\n\n# A\n</pre>\n\n# B"), [0, 5])
+        self.assertEqual(self.get_chunk_lines("<!-- x -->\n\n# A"), [0, 2])
+        # the fence might be inside the HTML block
+        self.assertEqual(
+            self.get_chunk_lines("# A\n\n<div>\n```\n\n# B\n```\n\n# C"),
+            [0])
+        # the fence might be inside a list item
+        self.assertEqual(
+            self.get_chunk_lines("# A\n\n- a\n\n  ```\n\n# B"), [0])
+        # link references apply to the whole document
+        self.assertEqual(self.get_chunk_lines("# A\n\n# B\n\n[x]: /y"), [0])
+
+    def test_same_nodes_as_one_chunk(self):
+        repo_dir = pathlib.Path(__file__).resolve().parent.parent.parent
+        docs_dir = repo_dir / 'docs'
+        job_runner = JobRunner(max_workers=2)
+        self.addCleanup(job_runner.shutdown)
+        config = CONFIG._replace(allowed_tags={
+            'a', 'autodoc-python', 'heading-alias', 'heading-link',
+            'html-enumerate-all-tags', 'my-tag', 'note', 'table-of-contents',
+            'warning'})
+        for path in sorted(docs_dir.glob('*.md')):
+            text = path.read_text()
+            self.assertEqual(
+                CWRootNode(cfm_to_cwdom(
+                    text, config, job_runner=job_runner, chunk_size=1,
+                )).get_string_for_test_comparison(),
+                CWRootNode(cfm_to_cwdom(
+                    text, config)).get_string_for_test_comparison(),
+                msg=str(path))
+
+    def test_error_locations(self):
+        job_runner = JobRunner(max_workers=2)
+        self.addCleanup(job_runner.shutdown)
+        s = "# A\n\ntext\n\n# B\n\nmore <foo />\n"
+        for kwargs in ({}, {'job_runner': job_runner, 'chunk_size': 1}):
+            with self.assertRaisesRegex(
+                    UnknownTagError, "'test.md':7:2-5: Unknown tag: foo"):
+                cfm_to_cwdom(s, CONFIG, **kwargs)
+
+
+class BlockCacheTestCase(CWTestCase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = pathlib.Path(self.temp_dir.name) / 'cache'
+        self.sections = [
+            "# A\n\nSome <x>text</x>.\n\n",
+            "# B\n\n<x>\n\n",
+            "## C\n\n* a list\n\n",
+            "# D\n\nclose the tag: </x>\n",
+        ]
+
+    def parse(self, block_cache, sections):
+        """Returns the nodes as a string, and the text of each parsed
+        block"""
+        with mock.patch.object(
+                cfm_to_cwdom_module, '_parse_chunk',
+                wraps=cfm_to_cwdom_module._parse_chunk) as parse_chunk:
+            nodes = cfm_to_cwdom(
+                ''.join(sections), CONFIG, block_cache=block_cache)
+        return (
+            CWRootNode(nodes).get_string_for_test_comparison(),
+            [call[0][0].text for call in parse_chunk.call_args_list])
+
+    def test_only_changed_blocks_are_parsed(self):
+        block_cache = BlockCache()
+        expected = CWRootNode(cfm_to_cwdom(
+            ''.join(self.sections), CONFIG)).get_string_for_test_comparison()
+        self.assertEqual(
+            self.parse(block_cache, self.sections), (expected, self.sections))
+        block_cache.save()
+        self.assertEqual(
+            self.parse(block_cache, self.sections), (expected, []))
+
+        changed = list(self.sections)
+        changed[2] = "## C\n\n* a longer list\n\n"
+        result, parsed = self.parse(block_cache, changed)
+        self.assertEqual(
+            result, CWRootNode(cfm_to_cwdom(
+                ''.join(changed), CONFIG)).get_string_for_test_comparison())
+        self.assertEqual(parsed, [changed[2]])
+
+    def test_saved_blocks(self):
+        block_cache = BlockCache(self.path)
+        expected, _ = self.parse(block_cache, self.sections)
+        block_cache.save()
+        self.assertEqual(
+            self.parse(BlockCache(self.path), self.sections), (expected, []))
+
+        # blocks that weren't used are forgotten
+        block_cache = BlockCache(self.path)
+        self.parse(block_cache, self.sections[:2])
+        block_cache.save()
+        self.assertEqual(
+            self.parse(BlockCache(self.path), self.sections)[1],
+            self.sections[2:])
+
+    def test_blocks_from_other_versions_are_not_used(self):
+        block_cache = BlockCache(self.path)
+        self.parse(block_cache, self.sections)
+        block_cache.save()
+        for module, name in [
+                (cfm_to_cwdom_module, 'BLOCK_CACHE_VERSION'),
+                (computerwords, '__version__'),
+                (cfm_to_cwdom_module, '_commonmark_version')]:
+            with mock.patch.object(module, name, 'other'):
+                self.assertEqual(
+                    self.parse(BlockCache(self.path), self.sections)[1],
+                    self.sections)
+
+    def test_unreadable_file(self):
+        block_cache = BlockCache(self.path)
+        self.parse(block_cache, self.sections)
+        block_cache.save()
+        for file_path in self.path.iterdir():
+            file_path.write_bytes(b'garbage')
+        with self.assertLogs(block_cache_module.log, 'WARNING'):
+            self.assertEqual(
+                self.parse(BlockCache(self.path), self.sections)[1],
+                self.sections)
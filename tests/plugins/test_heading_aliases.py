@@ -0,0 +1,100 @@
+from tests.CWTestCase import CWTestCase
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.library import Library
+from computerwords.plugins.heading_aliases import HeadingAliasesPlugin
+from computerwords.stdlib.basics import add_basics
+from computerwords.stdlib.html import add_html
+from computerwords.stdlib.links import add_links
+from computerwords.stdlib.table_of_contents import add_table_of_contents
+
+
+class HeadingAliasesTestCase(CWTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.library = Library()
+        add_basics(self.library)
+        add_html(self.library)
+        add_links(self.library)
+        add_table_of_contents(self.library)
+        HeadingAliasesPlugin().add_processors(self.library)
+
+    def make_document(self, document_id, children):
+        document = CWDocumentNode(document_id, children)
+        document.deep_set_document_id(document_id)
+        return document
+
+    def get_links(self, tree):
+        return [
+            node for node in tree.preorder_traversal()
+            if isinstance(node, CWLinkNode)]
+
+    def test_links_across_documents(self):
+        tree = CWTree(CWRootNode([
+            self.make_document('doc1', [
+                CWTagNode('heading-link', {'name': 'b'}),
+                CWTagNode('heading-alias', {'name': 'a'}),
+                CWTagNode('h1', {}, [CWTextNode('A')]),
+            ]),
+            self.make_document('doc2', [
+                CWTagNode('heading-link', {'name': 'a'}),
+                CWTagNode('heading-alias', {'name': 'b'}),
+                CWTagNode('h1', {}, [CWTextNode('B')]),
+            ]),
+        ]))
+        tree.apply_library(self.library, {'config': {}})
+        self.assertEqual(
+            [link.ref_id for link in self.get_links(tree)], ['B', 'A'])
+        self.assertEqual(
+            set(tree.processor_data['heading_aliases'].keys()), {'a', 'b'})
+
+    def test_alias_waits_for_late_heading(self):
+        @self.library.processor('late-heading', consumes=['heading_alias'])
+        def process_late_heading(tree, node):
+            tree.replace_subtree(
+                node, CWTagNode('h1', {}, [CWTextNode('Late')]))
+
+        tree = CWTree(CWRootNode([
+            self.make_document('doc1', [
+                CWTagNode('heading-link', {'name': 'late'}),
+                CWTagNode('heading-alias', {'name': 'unrelated'}),
+            ]),
+            self.make_document('doc2', [
+                CWTagNode('heading-alias', {'name': 'late'}),
+                CWTagNode('late-heading', {}),
+            ]),
+        ]))
+        tree.apply_library(self.library, {'config': {}})
+        self.assertEqual(
+            [link.ref_id for link in self.get_links(tree)], ['Late'])
+        self.assertEqual(
+            set(tree.processor_data['heading_alias_nodes'].keys()),
+            {'doc1'})
+
+    def test_one_traversal_per_phase(self):
+        tree = CWTree(CWRootNode([
+            self.make_document('doc1', [
+                CWTagNode('table-of-contents', {}),
+                CWTagNode('heading-alias', {'name': 'a'}),
+                CWTagNode('h1', {}, [CWTextNode('A')]),
+                CWTagNode('p', {}, [
+                    CWTagNode('heading-link', {'name': 'b'}),
+                ]),
+            ]),
+            self.make_document('doc2', [
+                CWTagNode('table-of-contents', {}),
+                CWTagNode('heading-alias', {'name': 'b'}),
+                CWTagNode('h1', {}, [CWTextNode('B')]),
+                CWTagNode('heading-link', {'name': 'a'}),
+            ]),
+        ]))
+        tree.apply_library(self.library, {'config': {}})
+        # the table of contents inserts nodes under nodes the traversal has
+        # already passed, but they're visited without traversing again
+        self.assertEqual(
+            tree.rounds_per_phase, [1] * (self.library.get_max_phase() + 1))
+        self.assertEqual(
+            [link.ref_id for link in self.get_links(tree)
+             if link.ref_id in ('A', 'B')],
+            ['B', 'A'])
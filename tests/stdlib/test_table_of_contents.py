@@ -98,20 +98,21 @@ class TableOfContentsTestCase(CWTestCase):
                   h1(kwargs={'class': 'table-of-contents-title'})
                     'Table of Contents'
                   nav(kwargs={'class': 'table-of-contents'})
-                    ol(kwargs={})
-                      li(kwargs={})
-                        Link(ref_id='Header-1-text')
-                          'Header 1 text'
-                        ol(kwargs={})
-                          li(kwargs={})
-                            Link(ref_id='Subheader-1-text')
-                              'Subheader 1 text'
-                          li(kwargs={})
-                            Link(ref_id='Subheader-2-text')
-                              'Subheader 2 text'
-                      li(kwargs={})
-                        Link(ref_id='Header-2-text')
-                          'Header 2 text'
+                    Shared()
+                      ol(kwargs={})
+                        li(kwargs={})
+                          Link(ref_id='Header-1-text')
+                            'Header 1 text'
+                          ol(kwargs={})
+                            li(kwargs={})
+                              Link(ref_id='Subheader-1-text')
+                                'Subheader 1 text'
+                            li(kwargs={})
+                              Link(ref_id='Subheader-2-text')
+                                'Subheader 2 text'
+                        li(kwargs={})
+                          Link(ref_id='Header-2-text')
+                            'Header 2 text'
                 Anchor(ref_id='Header-1-text', kwargs={'class': 'header-anchor'})
                   h1(kwargs={})
                     'Header 1 text'
@@ -126,3 +127,48 @@ class TableOfContentsTestCase(CWTestCase):
                   h1(kwargs={})
                     'Header 2 text'
         """))
+
+    def test_toc_lists_are_shared_per_maxdepth(self):
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc 1', [
+                CWTagNode('table-of-contents', {}, []),
+                CWTagNode('h1', {}, [CWTextNode('Header 1 text')]),
+                CWTagNode('h2', {}, [CWTextNode('Subheader 1 text')]),
+            ]),
+            CWDocumentNode('doc 2', [
+                CWTagNode('table-of-contents', {}, []),
+                CWTagNode('table-of-contents', {'maxdepth': '1'}, []),
+                CWTagNode('h1', {}, [CWTextNode('Header 2 text')]),
+            ]),
+        ]))
+        tree.apply_library(self.library)
+        toc_1, toc_2, toc_shallow = [
+            node.data['node_in_tree']
+            for node in tree.processor_data['toc_nodes']]
+        self.assertEqual(
+            toc_1.get_string_for_test_comparison(),
+            toc_2.get_string_for_test_comparison())
+        shared_1 = toc_1.children[1].children[0]
+        shared_2 = toc_2.children[1].children[0]
+        self.assertIsNot(shared_1, shared_2)
+        self.assertIs(
+            shared_1.shared_children[0], shared_2.shared_children[0])
+        self.assertNotIn(
+            'Subheader', toc_shallow.get_string_for_test_comparison())
+
+    def test_unchanged_document_does_not_recompute_toc(self):
+        tree = CWTree(CWRootNode([
+            CWDocumentNode('doc 1', [
+                CWTagNode('table-of-contents', {}, []),
+                CWTagNode('h1', {}, [CWTextNode('Header 1 text')]),
+            ]),
+        ]))
+        tree.apply_library(self.library)
+        doc = tree.root.children[0]
+        generation = tree.processor_data['toc_generation']
+        toc = tree.processor_data['toc']
+
+        self.library.run_processors(tree, doc)
+        self.library.run_processors(tree, tree.root)
+        self.assertEqual(tree.processor_data['toc_generation'], generation)
+        self.assertIs(tree.processor_data['toc'], toc)
@@ -1,7 +1,27 @@
 from CWTestCase import CWTestCase
 
 
-from computerwords.htmlwriter.util import find_path_between
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.cwdom.traversal import visit_tree
+from computerwords.htmlwriter import _get_subtree_html
+from computerwords.htmlwriter.util import (
+    HTMLWriterOptions,
+    HrefTable,
+    ListStream,
+    anchor_to_href,
+    doc_to_href,
+    find_path_between,
+    html_attrs_to_string,
+    open_tag_to_string,
+)
+from computerwords.htmlwriter.visitors import (
+    TagVisitor,
+    compile_tag_to_visitor,
+    get_tag_to_visitor,
+    write_tree,
+)
+from computerwords.stdlib import stdlib
 
 
 class HTMLWriterUtilTestCase(CWTestCase):
@@ -18,4 +38,139 @@ class HTMLWriterUtilTestCase(CWTestCase):
     def test_find_elsewhere(self):
         self.assertEqual(
             find_path_between(('a', 'b'), ('c', 'd')),
-            "../c/d.html")
\ No newline at end of file
+            "../c/d.html")
+
+
+class HTMLAttrsTestCase(CWTestCase):
+    def test_attrs_are_escaped(self):
+        self.assertEqual(
+            html_attrs_to_string({'title': "it's <b> & \"x\""}),
+            " title='it&#x27;s &lt;b&gt; &amp; &quot;x&quot;'")
+
+    def test_open_tag(self):
+        self.assertEqual(open_tag_to_string('li', {}), "<li>")
+        for _ in range(2):
+            self.assertEqual(
+                open_tag_to_string('a', {'href': 'x.html', 'class': 'y'}),
+                "<a href='x.html' class='y'>")
+        self.assertEqual(
+            open_tag_to_string('a', {'data-x': ['unhashable']}),
+            "<a data-x='[&#x27;unhashable&#x27;]'>")
+
+
+class HrefTableTestCase(CWTestCase):
+    def test_matches_uncached_hrefs(self):
+        document_ids = [('a',), ('b',), ('a', 'c'), ('a', 'd'), ('e', 'f')]
+        for single_page in (False, True):
+            options = HTMLWriterOptions(
+                single_page=single_page, static_dir=None, files_to_copy=[],
+                stylesheet_tag_strings=[], site_url='/', meta_description='')
+            href_table = HrefTable(options)
+            for _ in range(2):
+                for source in document_ids:
+                    link = CWLinkNode('x', document_id=source)
+                    for target in document_ids:
+                        anchor = CWAnchorNode(
+                            '-'.join(target), document_id=target)
+                        self.assertEqual(
+                            href_table.doc_to_href(source, target),
+                            doc_to_href(options, link, target))
+                        self.assertEqual(
+                            href_table.anchor_to_href(source, anchor),
+                            anchor_to_href(options, link, anchor))
+
+
+class HTMLWriterSharedNodeTestCase(CWTestCase):
+    def setUp(self):
+        super().setUp()
+        self.options = HTMLWriterOptions(
+            single_page=False, static_dir=None, files_to_copy=[],
+            stylesheet_tag_strings=[], site_url='/', meta_description='')
+
+    def test_shared_links_are_relative_to_embedding_document(self):
+        anchor = CWAnchorNode('x', document_id=('a', 'b'))
+        shared = [CWTagNode('p', {}, [
+            CWLinkNode('x', [CWTextNode('link')]),
+        ])]
+        tree = CWTree(CWRootNode([]))
+        tree.processor_data = {'ref_id_to_anchor': {'x': anchor}}
+
+        def write_in(document_id):
+            return _get_subtree_html(
+                {}, self.options, stdlib, tree,
+                CWSharedNode(shared, document_id=document_id))
+
+        self.assertEqual(
+            write_in(('a', 'b')), "<p><a href=\"#x\">link</a></p>")
+        self.assertEqual(
+            write_in(('c',)), "<p><a href=\"a/b.html#x\">link</a></p>")
+
+    def test_fragment_cache_matches_uncached_output(self):
+        def make_document(document_id):
+            document = CWDocumentNode('/'.join(document_id), [
+                CWTagNode('table-of-contents', {}),
+                CWTagNode('h1', {}, [CWTextNode(' '.join(document_id))]),
+            ])
+            document.deep_set_document_id(document_id)
+            return document
+
+        tree = CWTree(CWRootNode([
+            make_document(('a',)),
+            make_document(('b',)),
+            make_document(('sub', 'c')),
+            make_document(('sub', 'd')),
+        ]))
+        tree.apply_library(stdlib, {'config': {}})
+
+        fragment_cache = {}
+        for document in tree.root.children:
+            self.assertEqual(
+                _get_subtree_html(
+                    {}, self.options, stdlib, tree, document,
+                    fragment_cache=fragment_cache),
+                _get_subtree_html({}, self.options, stdlib, tree, document))
+        # one TOC, two directories
+        self.assertEqual(len(fragment_cache), 2)
+
+
+class WriteTreeTestCase(CWTestCase):
+    def test_matches_visit_tree(self):
+        options = HTMLWriterOptions(
+            single_page=False, static_dir=None, files_to_copy=[],
+            stylesheet_tag_strings=[], site_url='/', meta_description='')
+
+        class UpperTagVisitor(TagVisitor):
+            def before_children(self, tree, node):
+                self.output_stream.write('<P>')
+
+        document = CWDocumentNode('a', [
+            CWTagNode('p', {'class': 'x'}, [
+                CWTextNode('<b>'),
+                CWTextNode('<i>', escape=False),
+                CWTagNode('unknown', {}, [CWTextNode('y')]),
+            ]),
+            CWEmptyNode(),
+        ])
+        tree = CWTree(CWRootNode([document]))
+
+        def write(writer, tag_to_visitor):
+            tag_to_visitor['p'] = UpperTagVisitor(
+                options, tag_to_visitor['p'].output_stream, 'p')
+            writer(tree, tag_to_visitor, document,
+                   handle_error=lambda node: errors.append(node.name))
+
+        errors = []
+        stream = ListStream()
+        write(visit_tree, get_tag_to_visitor(stdlib, stream, options))
+        expected = stream.getvalue()
+        self.assertEqual(
+            expected, "<article><P>&lt;b&gt;<i>y</p></article>")
+
+        stream = ListStream()
+        write(
+            lambda tree, tag_to_visitor, *args, **kwargs: write_tree(
+                tree, compile_tag_to_visitor(tag_to_visitor), *args,
+                **kwargs),
+            get_tag_to_visitor(stdlib, stream, options))
+        self.assertEqual(stream.getvalue(), expected)
+        self.assertEqual(errors, ['unknown', 'unknown'])
@@ -0,0 +1,130 @@
+from tests.CWTestCase import CWTestCase
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.library import Library, ProcessorDependencyError
+from computerwords.stdlib.basics import add_basics
+
+
+class LibraryPhasesTestCase(CWTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.library = Library()
+        add_basics(self.library)
+        self.calls = []
+
+    def get_tree(self, *extra_nodes):
+        return CWTree(CWRootNode([
+            CWDocumentNode('doc', [
+                CWTagNode('h1', {}, [CWTextNode('One')]),
+                CWTagNode('h1', {}, [CWTextNode('Two')]),
+            ] + list(extra_nodes)),
+        ]))
+
+    def test_phases(self):
+        p1 = self.library.processor('a', lambda t, n: None, produces=['x'])
+        p2 = self.library.processor(
+            'b', lambda t, n: None, consumes=['x'], produces=['y'])
+        p3 = self.library.processor('c', lambda t, n: None, consumes=['y'])
+        p4 = self.library.processor('d', lambda t, n: None)
+        self.assertEqual(self.library.get_phase(p1), 0)
+        self.assertEqual(self.library.get_phase(p2), 1)
+        self.assertEqual(self.library.get_phase(p3), 2)
+        self.assertEqual(self.library.get_phase(p4), 0)
+        self.assertEqual(self.library.get_max_phase(), 2)
+
+    def test_cycle(self):
+        self.library.processor(
+            'a', lambda t, n: None, consumes=['y'], produces=['x'])
+        self.library.processor(
+            'b', lambda t, n: None, consumes=['x'], produces=['y'])
+        with self.assertRaises(ProcessorDependencyError):
+            self.library.get_max_phase()
+
+    def test_consumer_runs_once_after_all_producers(self):
+        @self.library.processor('h1', produces=['title'])
+        def process_h1(tree, node):
+            self.calls.append('h1')
+            node.data['title'] = node.children[0].text
+
+        @self.library.processor('Document', consumes=['title'])
+        def process_document(tree, node):
+            self.calls.append('Document')
+            node.data['titles'] = [
+                child.data['title'] for child in node.children]
+
+        tree = self.get_tree()
+        tree.apply_library(self.library)
+        self.assertEqual(self.calls, ['h1', 'h1', 'Document'])
+        self.assertEqual(
+            tree.root.children[0].data['titles'], ['One', 'Two'])
+        self.assertEqual(tree.rounds_per_phase, [1, 1])
+
+    def test_late_producer_dirties_consumer(self):
+        @self.library.processor('h1', produces=['title'])
+        def process_h1(tree, node):
+            node.data['title'] = node.children[0].text
+            tree.mark_consumers_dirty(node, 'title')
+
+        @self.library.processor(
+            'Document', consumes=['title'], produces=['titles'])
+        def process_document(tree, node):
+            self.calls.append('Document')
+            node.data['titles'] = [
+                child.data['title'] for child in node.children
+                if 'title' in child.data]
+
+        # runs in the last phase and adds a heading that was never seen
+        @self.library.processor('toc', consumes=['titles'])
+        def process_toc(tree, node):
+            tree.replace_subtree(
+                node, CWTagNode('h1', {}, [CWTextNode('Three')]))
+
+        tree = self.get_tree(CWTagNode('toc', {}))
+        tree.apply_library(self.library)
+        self.assertEqual(self.calls, ['Document', 'Document'])
+        self.assertEqual(
+            tree.root.children[0].data['titles'], ['One', 'Two', 'Three'])
+
+
+class DocumentLocalProcessorsTestCase(CWTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.library = Library()
+        add_basics(self.library)
+        self.calls = []
+
+    def test_scopes(self):
+        @self.library.processor('h1', document_local=True)
+        def process_h1_locally(tree, node):
+            self.calls.append('local')
+
+        @self.library.processor('h1')
+        def process_h1_globally(tree, node):
+            self.calls.append('global')
+            if node.children:
+                tree.replace_subtree(node, CWTagNode('h1', {}))
+
+        self.assertEqual(self.library.get_global_tag_names(), {'h1'})
+        root = CWRootNode([CWDocumentNode('doc', [
+            CWTagNode('h1', {}, [CWTextNode('One')])])])
+
+        CWTree(root).apply_library(self.library, scope='document_local')
+        self.assertEqual(self.calls, ['local'])
+
+        # the replacement is new, so it gets both processors
+        self.calls = []
+        CWTree(root).apply_library(self.library, scope='global')
+        self.assertEqual(self.calls, ['global', 'local', 'global'])
+
+    def test_local_consumer_of_global_producer(self):
+        self.library.processor('a', lambda t, n: None, produces=['x'])
+        self.library.processor(
+            'b', lambda t, n: None, consumes=['x'], document_local=True)
+        with self.assertRaises(ProcessorDependencyError):
+            self.library.get_max_phase()
+
+    def test_universal_global_processor(self):
+        self.library.processor('*', lambda t, n: None)
+        self.assertIsNone(self.library.get_global_tag_names())
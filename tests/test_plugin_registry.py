@@ -0,0 +1,79 @@
+from tests.CWTestCase import CWTestCase
+from computerwords.library import Library
+from computerwords.plugin_registry import (
+    BUILTIN_PLUGIN_SPECS,
+    PluginLoader,
+    get_plugin_spec,
+)
+
+
+class LazyLibraryTestCase(CWTestCase):
+    def setUp(self):
+        super().setUp()
+        self.library = Library()
+        self.calls = []
+
+    def test_lazy_tags_are_allowed(self):
+        self.library.add_lazy_processors({'x'}, lambda: None)
+        self.assertEqual(self.library.get_allowed_tags(), {'x'})
+
+    def test_loads_on_first_use(self):
+        def load():
+            self.calls.append('load')
+            self.library.processor('x', lambda tree, node: None)
+        self.library.add_lazy_processors({'x', 'y'}, load)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(len(list(self.library.get_processors('x'))), 1)
+        self.assertEqual(self.calls, ['load'])
+        self.assertEqual(len(list(self.library.get_processors('x'))), 1)
+        self.assertEqual(self.calls, ['load'])
+
+    def test_lazy_processors_keep_declaration_order(self):
+        def first(tree, node): pass
+        def second(tree, node): pass
+        self.library.add_lazy_processors(
+            {'x'}, lambda: self.library.processor('x', first))
+        # registering directly forces earlier lazy processors to load first
+        self.library.processor('x', second)
+        self.assertEqual(
+            list(self.library.get_processors('x')), [first, second])
+
+
+class PluginLoaderTestCase(CWTestCase):
+    def test_builtin_specs_are_lazy(self):
+        spec = get_plugin_spec('computerwords.plugins.callouts')
+        self.assertEqual(spec.tags, {'note', 'warning'})
+
+    def test_class_path_is_eager(self):
+        spec = get_plugin_spec('my_module:MyPlugin')
+        self.assertEqual(spec.class_path, 'my_module:MyPlugin')
+        self.assertIsNone(spec.tags)
+
+    def test_dict_is_lazy(self):
+        spec = get_plugin_spec({'class': 'm:P', 'tags': ['a'], 'writer': 'w'})
+        self.assertEqual(spec.tags, {'a'})
+        self.assertEqual(spec.writer_name, 'w')
+
+    def test_duplicates_ignored(self):
+        loader = PluginLoader([
+            'computerwords.plugins.callouts',
+            'computerwords.plugins.callouts',
+        ])
+        self.assertEqual(len(loader.specs), 1)
+
+    def test_loads_plugin_when_tag_is_used(self):
+        loader = PluginLoader(['computerwords.plugins.callouts'])
+        self.assertEqual(loader.load_eager_plugins(), [])
+        library = Library()
+        loader.configure({}, library)
+        self.assertEqual(loader.plugins, [])
+        list(library.get_processors('note'))
+        self.assertEqual(
+            [type(p).__name__ for p in loader.plugins], ['CalloutsPlugin'])
+
+    def test_get_writer(self):
+        loader = PluginLoader(list(BUILTIN_PLUGIN_SPECS.keys()))
+        loader.configure({'html': {'site_url': 'x'}}, Library())
+        writer = loader.get_writer('html')
+        self.assertEqual(writer.WRITER_NAME, 'html')
+        self.assertIsNone(loader.get_writer('nope'))
@@ -0,0 +1,102 @@
+import gzip
+import json
+import pathlib
+import tempfile
+
+from CWTestCase import CWTestCase
+
+
+from computerwords.cwdom.CWTree import CWTree
+from computerwords.cwdom.nodes import *
+from computerwords.searchwriter import (
+    iterate_sections,
+    read_postings,
+    tokenize,
+    write_index,
+)
+from computerwords.stdlib import stdlib
+
+
+class SearchWriterTestCase(CWTestCase):
+    def setUp(self):
+        super().setUp()
+        documents = []
+        for document_id, words in [
+                (('a',), 'apple banana'),
+                (('sub', 'b'), 'banana cherry')]:
+            document = CWDocumentNode('/'.join(document_id), [
+                CWTagNode('table-of-contents', {}),
+                CWTextNode('intro ' + words),
+                CWTagNode('h1', {}, [CWTextNode('Title ' + words)]),
+                CWTagNode('p', {}, [
+                    CWTextNode(words + ' banana'),
+                    CWTextNode('<b>raw</b>&amp;html', escape=False),
+                ]),
+                CWTagNode('h2', {}, [CWTextNode('Second')]),
+                CWTextNode(words),
+            ])
+            document.deep_set_document_id(document_id)
+            documents.append(document)
+        self.tree = CWTree(CWRootNode(documents))
+        self.tree.apply_library(stdlib, {'config': {}})
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize("Hello, CWTree_node x 42!"),
+            ['hello', 'cwtree_node', '42'])
+
+    def test_sections(self):
+        self.assertEqual(
+            [(url, title)
+             for url, title, _ in iterate_sections(self.tree)],
+            [
+                ('a.html', 'a'),
+                ('a.html#Title-apple-banana', 'Title apple banana'),
+                ('a.html#Second', 'Second'),
+                ('sub/b.html', 'sub/b'),
+                ('sub/b.html#Title-banana-cherry', 'Title banana cherry'),
+                ('sub/b.html#Second-1', 'Second'),
+            ])
+
+    def test_postings(self):
+        index_dir = pathlib.Path(self.temp_dir.name) / 'search'
+        write_index(self.tree, index_dir)
+        self.assertEqual(
+            read_postings(index_dir, 'banana'),
+            [(0, 1), (1, 3), (2, 1), (3, 1), (4, 3), (5, 1)])
+        self.assertEqual(read_postings(index_dir, 'cherry'),
+                         [(3, 1), (4, 2), (5, 1)])
+        self.assertEqual(read_postings(index_dir, 'raw'), [(1, 1), (4, 1)])
+        self.assertEqual(read_postings(index_dir, 'html'), [(1, 1), (4, 1)])
+        # the table of contents isn't indexed
+        self.assertEqual(read_postings(index_dir, 'contents'), [])
+        self.assertEqual(read_postings(index_dir, 'nothing'), [])
+
+        with (index_dir / 'manifest.json').open() as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['num_sections'], 6)
+        self.assertEqual(manifest['shards']['ba'], 'ba.json.gz')
+        with gzip.open(str(index_dir / 'ba.json.gz')) as f:
+            self.assertEqual(
+                json.loads(f.read().decode('utf-8'))['banana'],
+                [0, 1, 1, 3, 1, 1, 1, 1, 1, 3, 1, 1])
+
+    def test_spilling_gives_same_index(self):
+        def read_files(index_dir):
+            return {
+                path.name: path.read_bytes() for path in index_dir.iterdir()}
+
+        in_memory_dir = pathlib.Path(self.temp_dir.name) / 'in_memory'
+        write_index(self.tree, in_memory_dir)
+        spilled_dir = pathlib.Path(self.temp_dir.name) / 'spilled'
+        write_index(self.tree, spilled_dir, max_postings_in_memory=2)
+        self.assertEqual(read_files(spilled_dir), read_files(in_memory_dir))
+
+        # rewriting removes shards that no longer exist
+        (in_memory_dir / 'unrelated.txt').write_text('x')
+        write_index(CWTree(CWRootNode([])), in_memory_dir)
+        self.assertEqual(
+            sorted(path.name for path in in_memory_dir.iterdir()),
+            ['manifest.json', 'sections.json.gz', 'unrelated.txt'])